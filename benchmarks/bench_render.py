@@ -0,0 +1,66 @@
+"""
+Measures renderer throughput against the previous string-concatenation markdown table.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_render
+"""
+import time
+import random
+
+from utils.columnar import ColumnarResult
+from utils.render import render
+
+
+def legacy_markdown(json_data):
+    # the json_to_markdown_table implementation this renderer replaced
+    headers = json_data[0].keys()
+    markdown_table = "| " + " | ".join(headers) + " |\n"
+    markdown_table += "| " + " | ".join(['---'] * len(headers)) + " |\n"
+    for entry in json_data:
+        row = "| " + " | ".join(str(entry[header]) for header in headers) + " |"
+        markdown_table += row + "\n"
+    return markdown_table
+
+
+def make_rows(n_rows: int):
+    rng = random.Random(7)
+    return [
+        {
+            "Region": f"Region {rng.randrange(10)}",
+            "Customer": f"Customer {rng.randrange(5000)}",
+            "Order Date": f"2024-{rng.randrange(1, 13):02d}-01",
+            "SUM(Sales)": rng.random() * 10000,
+            "SUM(Profit)": rng.random() * 2000 - 500,
+            "COUNT(Orders)": rng.randrange(100),
+        }
+        for _ in range(n_rows)
+    ]
+
+
+def timed(fn, repeat: int = 3):
+    best, output = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+
+if __name__ == "__main__":
+    for n_rows in (1_000, 100_000):
+        rows = make_rows(n_rows)
+        columnar = ColumnarResult.from_rows(rows)
+        cases = {
+            "legacy markdown": lambda: legacy_markdown(rows),
+            "markdown (all rows)": lambda: render(columnar, "markdown", max_rows=None),
+            "markdown (500 rows)": lambda: render(columnar, "markdown", max_rows=500),
+            "csv (all rows)": lambda: render(columnar, "csv", max_rows=None),
+            "json (all rows)": lambda: render(columnar, "json", max_rows=None),
+        }
+        print(f"\n{n_rows} rows x {len(columnar.columns)} columns")
+        print(f"{'case':<22} {'seconds':>9} {'rows/s':>12} {'chars':>12}")
+        for label, fn in cases.items():
+            seconds, output = timed(fn)
+            rendered = n_rows if "500" not in label else min(500, n_rows)
+            print(f"{label:<22} {seconds:>9.3f} {rendered / seconds:>12,.0f} {len(output):>12,}")
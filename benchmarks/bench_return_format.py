@@ -0,0 +1,68 @@
+"""
+Compares the VDS OBJECTS and ARRAYS return formats on payload size and decode time.
+
+Synthetic responses are decoded the way the client does it (RowStream into a ColumnarResult),
+next to a plain `json.loads` of the whole body for reference. Run from the repository root:
+
+    python -m benchmarks.bench_return_format
+"""
+import json
+import time
+import random
+
+from utils.columnar import ColumnarResult
+from utils.vizql_data_service import RowStream, VDS_STREAM_CHUNK_BYTES
+
+
+def make_rows(n_rows: int, n_dimensions: int, n_measures: int):
+    names = [f"Dimension {i}" for i in range(n_dimensions)] + [f"SUM(Measure {i})" for i in range(n_measures)]
+    rng = random.Random(7)
+    rows = [
+        [f"member {rng.randrange(200)}" for _ in range(n_dimensions)] + [round(rng.random() * 1000, 2) for _ in range(n_measures)]
+        for _ in range(n_rows)
+    ]
+    return names, rows
+
+
+def chunks(body: bytes):
+    for i in range(0, len(body), VDS_STREAM_CHUNK_BYTES):
+        yield body[i:i + VDS_STREAM_CHUNK_BYTES]
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(label: str, n_rows: int, n_dimensions: int, n_measures: int):
+    names, rows = make_rows(n_rows, n_dimensions, n_measures)
+    objects_body = json.dumps({"data": [dict(zip(names, row)) for row in rows]}).encode()
+    arrays_body = json.dumps({"data": rows}).encode()
+
+    results = {
+        "OBJECTS": (
+            len(objects_body),
+            timed(lambda: ColumnarResult.from_rows(RowStream(chunks(objects_body)))),
+            timed(lambda: json.loads(objects_body)),
+        ),
+        "ARRAYS": (
+            len(arrays_body),
+            timed(lambda: ColumnarResult.from_rows(RowStream(chunks(arrays_body)), names=names)),
+            timed(lambda: json.loads(arrays_body)),
+        ),
+    }
+    print(f"\n{label}: {n_rows} rows x {len(names)} columns")
+    print(f"{'format':<8} {'bytes':>12} {'stream->columnar s':>20} {'json.loads s':>14}")
+    for fmt, (size, stream_s, loads_s) in results.items():
+        print(f"{fmt:<8} {size:>12,} {stream_s:>20.3f} {loads_s:>14.3f}")
+    ratio = results["ARRAYS"][0] / results["OBJECTS"][0]
+    print(f"ARRAYS payload is {ratio:.0%} of OBJECTS")
+
+
+if __name__ == "__main__":
+    run("wide", 2_000, 20, 30)
+    run("long", 200_000, 3, 2)
@@ -1,6 +1,9 @@
 import contextlib
 from fastapi import FastAPI
-from tools import mcp as tab_mcp
+from tools import mcp as tab_mcp, tableau_credentials
+from utils.member_index import MemberIndexer
+from utils.result_store import ResultStore
+from utils.rollups import RollupStore, ROLLUPS_PATH
 #from tools_new import mcp as tab_mcp_new
 
 import os
@@ -13,6 +16,12 @@ async def lifespan(app: FastAPI):
     async with contextlib.AsyncExitStack() as stack:
         await stack.enter_async_context(tab_mcp.session_manager.run())
         #await stack.enter_async_context(new_mcp.session_manager.run())
+        if os.environ.get("MEMBER_INDEX_ENABLED", "false").lower() in ("1", "true", "yes"):
+            MemberIndexer.start(tableau_credentials)
+            stack.callback(MemberIndexer.stop)
+        if ROLLUPS_PATH:
+            RollupStore.start(tableau_credentials, on_source_change=ResultStore.invalidate)
+            stack.callback(RollupStore.stop)
         yield
 
 
@@ -0,0 +1,40 @@
+from datetime import date
+
+from utils.comparison import prior_period_query, shift_date
+
+
+def _range_query(min_date: str, max_date: str):
+    return {
+        'fields': [{'fieldCaption': 'Sales', 'function': 'SUM'}],
+        'filters': [{
+            'field': {'fieldCaption': 'Order Date'},
+            'filterType': 'QUANTITATIVE_DATE',
+            'quantitativeFilterType': 'RANGE',
+            'minDate': min_date,
+            'maxDate': max_date
+        }]
+    }
+
+
+def _prior_range(query, period):
+    prior = prior_period_query(query, 'Order Date', period)['filters'][0]
+    return prior['minDate'], prior['maxDate']
+
+
+def test_quarter_end_maps_to_quarter_end():
+    assert _prior_range(_range_query('2024-04-01', '2024-06-30'), 'QUARTER') == ('2024-01-01', '2024-03-31')
+
+
+def test_february_maps_to_whole_january():
+    assert _prior_range(_range_query('2024-02-01', '2024-02-29'), 'MONTH') == ('2024-01-01', '2024-01-31')
+
+
+def test_month_end_into_february():
+    assert _prior_range(_range_query('2024-03-01', '2024-03-31'), 'MONTH') == ('2024-02-01', '2024-02-29')
+    assert _prior_range(_range_query('2024-01-01', '2024-12-31'), 'YEAR') == ('2023-01-01', '2023-12-31')
+
+
+def test_mid_month_days_are_kept_or_clamped():
+    assert shift_date(date(2024, 5, 15), 'MONTH', 1) == date(2024, 4, 15)
+    assert shift_date(date(2024, 3, 30), 'MONTH', 1) == date(2024, 2, 29)
+    assert shift_date(date(2024, 2, 29), 'YEAR', 1) == date(2023, 2, 28)
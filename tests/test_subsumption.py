@@ -0,0 +1,72 @@
+from utils.columnar import ColumnarResult
+from utils.subsumption import derive_result
+
+
+SALES_FILTER = {
+    'field': {'fieldCaption': 'Sales', 'function': 'SUM'},
+    'filterType': 'QUANTITATIVE_NUMERICAL',
+    'quantitativeFilterType': 'MIN',
+    'min': 100
+}
+
+CACHED_QUERY = {
+    'fields': [
+        {'fieldCaption': 'Category'},
+        {'fieldCaption': 'Region'},
+        {'fieldCaption': 'Sales', 'function': 'SUM'}
+    ],
+    'filters': [SALES_FILTER]
+}
+
+# rows that passed SUM(Sales) >= 100 at the Category x Region level
+CACHED = ColumnarResult.from_rows([
+    {'Category': 'A', 'Region': 'East', 'SUM(Sales)': 150},
+    {'Category': 'B', 'Region': 'East', 'SUM(Sales)': 200},
+])
+
+
+def test_rollup_with_finer_dimensions():
+    query = {
+        'fields': [{'fieldCaption': 'Category'}, {'fieldCaption': 'Sales', 'function': 'SUM'}]
+    }
+    derived = derive_result(query, {'fields': CACHED_QUERY['fields']}, CACHED)
+    assert derived.to_records() == [
+        {'Category': 'A', 'SUM(Sales)': 150},
+        {'Category': 'B', 'SUM(Sales)': 200},
+    ]
+
+
+def test_measure_filter_is_not_rolled_up():
+    # at the Category level SUM(Sales) >= 100 must see rows the cached query dropped
+    query = {
+        'fields': [{'fieldCaption': 'Category'}, {'fieldCaption': 'Sales', 'function': 'SUM'}],
+        'filters': [SALES_FILTER]
+    }
+    assert derive_result(query, CACHED_QUERY, CACHED) is None
+
+
+def test_measure_filter_with_same_dimensions():
+    query = {
+        'fields': [{'fieldCaption': 'Region'}, {'fieldCaption': 'Category'}, {'fieldCaption': 'Sales', 'function': 'SUM'}],
+        'filters': [SALES_FILTER, {'field': {'fieldCaption': 'Category'}, 'filterType': 'SET', 'values': ['B']}]
+    }
+    derived = derive_result(query, CACHED_QUERY, CACHED)
+    assert derived.to_records() == [{'Region': 'East', 'Category': 'B', 'SUM(Sales)': 200}]
+
+
+def test_set_filter_with_string_exclude_flag():
+    # the sample queries send exclude as a string; "false" must keep the listed members
+    cached_query = {'fields': CACHED_QUERY['fields']}
+    fields = [{'fieldCaption': 'Category'}, {'fieldCaption': 'Sales', 'function': 'SUM'}]
+    kept = derive_result(
+        {'fields': fields, 'filters': [{'field': {'fieldCaption': 'Category'}, 'filterType': 'SET', 'values': ['A'], 'exclude': 'false'}]},
+        cached_query,
+        CACHED
+    )
+    assert kept.to_records() == [{'Category': 'A', 'SUM(Sales)': 150}]
+    dropped = derive_result(
+        {'fields': fields, 'filters': [{'field': {'fieldCaption': 'Category'}, 'filterType': 'SET', 'values': ['A'], 'exclude': 'true'}]},
+        cached_query,
+        CACHED
+    )
+    assert dropped.to_records() == [{'Category': 'B', 'SUM(Sales)': 200}]
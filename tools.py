@@ -1,16 +1,30 @@
 # tools.py (with async version)
 
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 from utils.auth import jwt_connected_app
 from utils.metadata import get_data_dictionary, get_datasources
 from utils.prompts import vds_prompt_data, vds_schema, sample_queries, error_queries
-from utils.vizql_data_service import query_vds, query_vds_metadata
+from utils.vizql_data_service import query_vds_metadata, resolve_column
+from utils.query_memory import QueryMemory
+from utils.member_index import MemberIndexer, correct_filter_values, resolve_filter_values
+from utils.query_guard import guard_query
+from utils.prefetch import Prefetcher
+from utils.bulkhead import DatasourceBulkhead
+from utils.scheduler import UpstreamScheduler
+from utils.local_ops import apply_operations, hash_join
+from utils.comparison import compare_results, prior_period_query
+from utils.render import RENDER_MAX_ROWS, render
+from utils.rollups import RollupStore
+from utils.result_store import ResultStore, RESULT_PAGE_SIZE, fetch_result, query_key, result_page
 from utils.simple_datasource_qa import (
     get_headlessbi_data,
     get_values,
-    augment_datasource_metadata
+    get_values_batch,
+    render_datasource_prompt
 )
 from mcp.server.fastmcp import FastMCP
 import json
@@ -18,6 +32,10 @@ import json
 
 mcp = FastMCP(name="TableauTools", stateless_http=True) # FastMCP instance to register tools
 
+QUERY_BATCH_MAX_ITEMS = int(os.getenv("QUERY_BATCH_MAX_ITEMS", "20"))
+QUERY_BATCH_MAX_WORKERS = int(os.getenv("QUERY_BATCH_MAX_WORKERS", "4"))
+JOIN_MAX_ROWS = int(os.getenv("JOIN_MAX_ROWS", "200000"))
+
 class EnvManager:
     @staticmethod
     def get(key: str) -> str:
@@ -157,38 +175,458 @@ def query_vds_metadata_tool(datasource_luid: str) -> Dict[str, Any]:
 
     return query_vds_metadata(api_key=token, datasource_luid=datasource_luid, url=domain)
 
+def prepare_query(datasource_luid: str, query: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Applies the local pre-query steps before a query is sent to VDS.
+
+    Guessed filter values are corrected against the member index and the result size is checked
+    against cached field profiles, rewriting oversized queries.
+
+    Args:
+        datasource_luid (str): LUID of the Tableau datasource
+        query (Dict): The query written by the agent
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, Any]]: The query to run and notes for the agent
+        ("filter_corrections", "size_guard").
+    """
+    MemberIndexer.touch(datasource_luid)
+    Prefetcher.touch(datasource_luid)
+    for query_filter in query.get('filters') or [] if isinstance(query, dict) else []:
+        if query_filter.get('filterType') in ('SET', 'MATCH'):
+            caption = (query_filter.get('field') or {}).get('fieldCaption')
+            Prefetcher.consume(datasource_luid, "members", caption)
+            Prefetcher.consume(datasource_luid, "values", caption)
+    notes: Dict[str, Any] = {}
+    query, corrections = correct_filter_values(datasource_luid, query)
+    if corrections:
+        notes['filter_corrections'] = corrections
+    query, size_report = guard_query(datasource_luid, query)
+    if size_report:
+        notes['size_guard'] = size_report
+        Prefetcher.consume(datasource_luid, "profiles")
+    return query, notes
+
+def format_notes(notes: Dict[str, Any]) -> str:
+    """
+    Renders pre-query notes as short lines to put above a markdown result.
+    """
+    lines = []
+    for c in notes.get('filter_corrections', []):
+        if 'to' in c:
+            lines.append(f"Filter value corrected: {c['field']}: '{c['from']}' -> '{c['to']}'")
+        else:
+            lines.append(f"No {c['field']} member matches '{c['from']}'; closest members: {', '.join(c['suggestions'])}")
+    size_report = notes.get('size_guard')
+    if size_report and size_report['action'] != 'allowed':
+        lines.append(f"Query rewritten to limit result size: {json.dumps(size_report)}")
+    return "\n".join(lines) + "\n\n" if lines else ""
+
 @mcp.tool(description="Tool to Return a data query of a published datasource.")
-def query_vds_tool(datasource_luid: str, query: Dict[str, Any]) -> Dict[str, Any]:
+def query_vds_tool(
+    datasource_luid: str,
+    query: Dict[str, Any],
+    task: Optional[str] = None,
+    partitions: Optional[int] = None
+) -> Dict[str, Any]:
     """
     Authenticates with Tableau and runs a data query via VizQL Data Service.
 
     Args:
         datasource_luid (str): LUID of the Tableau datasource
         query (Dict): The query to run against the datasource
+        task (Optional[str]): The user task the query answers; successful queries are remembered for reuse.
+        partitions (Optional[int]): Split a large query over a date range or set filter into this many parallel requests.
+
+    Returns:
+        Dict[str, Any]: The result handle, schema, row count and the first page of rows under "data",
+        with "filter_corrections" and "size_guard" when they apply, and "derived_from" when the result was
+        re-aggregated from a cached finer result. Use get_result_page_tool for more rows.
+    """
+    token = TokenManager.get_or_refresh()
+    domain = EnvManager.get("TABLEAU_DOMAIN")
+
+    return run_query(token, domain, datasource_luid, query, task=task, partitions=partitions)
+
+def run_query(
+    token: str,
+    domain: str,
+    datasource_luid: str,
+    query: Dict[str, Any],
+    task: Optional[str] = None,
+    partitions: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Prepares and runs one query through the result cache and returns its summary and first page.
+    """
+    query, notes = prepare_query(datasource_luid, query)
+    stored, cached = fetch_result(
+        api_key=token,
+        url=domain,
+        datasource_luid=datasource_luid,
+        query=query,
+        max_rows=notes.get('size_guard', {}).get('row_cap'),
+        partitions=partitions
+    )
+    if task and len(stored.result):
+        QueryMemory.record(datasource_luid, task, query, row_count=len(stored.result))
+
+    result = stored.summary()
+    result['data'] = result_page(stored, 0, RESULT_PAGE_SIZE).to_records()
+    result['has_more'] = len(stored.result) > RESULT_PAGE_SIZE
+    result['cached'] = cached
+    result.update(notes)
+    return result
+
+def validate_batch_item(item: Any) -> Optional[str]:
+    """
+    Returns why a batch item is invalid, or None if it is well formed.
+    """
+    if not isinstance(item, dict):
+        return "Item must be an object with 'datasource_luid' and 'query'."
+    if not isinstance(item.get('datasource_luid'), str) or not item['datasource_luid'].strip():
+        return "Missing 'datasource_luid'."
+    query = item.get('query')
+    if not isinstance(query, dict) or not isinstance(query.get('fields'), list) or not query['fields']:
+        return "'query' must be an object with a non-empty 'fields' list."
+    if any(not isinstance(f, dict) or not (f.get('fieldCaption') or f.get('calculation')) for f in query['fields']):
+        return "Every query field needs a 'fieldCaption' or 'calculation'."
+    return None
+
+@mcp.tool(description="Tool to Run several data queries in one call, concurrently. Use it instead of repeated query_vds_tool calls when several breakdowns are needed.")
+def query_vds_batch_tool(items: list[Dict[str, Any]]) -> list[Dict[str, Any]]:
+    """
+    Validates, deduplicates and runs a batch of VDS queries concurrently.
+
+    Args:
+        items (list[Dict[str, Any]]): Up to QUERY_BATCH_MAX_ITEMS items of
+            {"datasource_luid": ..., "query": {...}, "task": optional}.
 
     Returns:
-        Dict[str, Any]: Query result
+        list[Dict[str, Any]]: One entry per item, in order, with "index", "status" ("ok", "invalid"
+        or "error") and "elapsed_ms". Successful entries hold the same fields as query_vds_tool;
+        failed ones hold "error". Repeated items are run once; their entries only carry the status,
+        the handle and "duplicate_of", the index of the entry holding the data.
     """
+    if len(items) > QUERY_BATCH_MAX_ITEMS:
+        raise ValueError(f"A batch holds at most {QUERY_BATCH_MAX_ITEMS} items, got {len(items)}.")
     token = TokenManager.get_or_refresh()
     domain = EnvManager.get("TABLEAU_DOMAIN")
 
-    return query_vds(api_key=token, datasource_luid=datasource_luid, url=domain, query=query)
+    responses: list[Dict[str, Any]] = [{"index": i} for i in range(len(items))]
+    first_of: Dict[str, int] = {}
+    unique = []
+    for i, item in enumerate(items):
+        problem = validate_batch_item(item)
+        if problem:
+            responses[i].update(status="invalid", error=problem, elapsed_ms=0)
+            continue
+        key = query_key(item['datasource_luid'], item['query'])
+        if key in first_of:
+            responses[i]['duplicate_of'] = first_of[key]
+            continue
+        first_of[key] = i
+        unique.append(i)
+
+    def run(i: int) -> Dict[str, Any]:
+        item = items[i]
+        started = time.perf_counter()
+        try:
+            response = run_query(token, domain, item['datasource_luid'], item['query'], task=item.get('task'))
+            response['status'] = "ok"
+        except Exception as e:
+            response = {"status": "error", "error": str(e)}
+        response['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return response
+
+    if unique:
+        with ThreadPoolExecutor(max_workers=min(QUERY_BATCH_MAX_WORKERS, len(unique))) as pool:
+            for i, response in zip(unique, pool.map(run, unique)):
+                responses[i].update(response)
+    for response in responses:
+        if 'duplicate_of' in response:
+            original = responses[response['duplicate_of']]
+            response.update({k: original[k] for k in ('status', 'handle', 'error') if k in original}, elapsed_ms=0)
+    return responses
 
 @mcp.tool(description="Tool to Return a markdown of a published datasource, ready for llm to use.")
-def get_headlessbi_data_tool(payload: Dict[str, Any], datasource_luid: str) -> str:
+def get_headlessbi_data_tool(
+    payload: Dict[str, Any],
+    datasource_luid: str,
+    task: Optional[str] = None,
+    output_format: str = "markdown",
+    max_rows: Optional[int] = None
+) -> str:
     """
     Queries Tableau using a JSON string payload and returns results as markdown.
 
     Args:
         payload (str): A JSON-formatted string containing the query.
         datasource_luid (str): The LUID of the Tableau datasource.
+        task (Optional[str]): The user task the query answers; successful queries are remembered for reuse.
+        output_format (str): "markdown" (default), "csv", "tsv" or "json"; csv and json cost fewer tokens.
+        max_rows (Optional[int]): Maximum rows to render; defaults to RENDER_MAX_ROWS.
 
     Returns:
         str: Markdown table of query results.
     """
     token = TokenManager.get_or_refresh()
     domain = EnvManager.get("TABLEAU_DOMAIN")
-    return get_headlessbi_data(payload=payload, url=domain, api_key=token, datasource_luid=datasource_luid)
+    payload, notes = prepare_query(datasource_luid, payload)
+    markdown_table = get_headlessbi_data(
+        payload=payload,
+        url=domain,
+        api_key=token,
+        datasource_luid=datasource_luid,
+        max_rows=notes.get('size_guard', {}).get('row_cap'),
+        output_format=output_format,
+        render_max_rows=max_rows or RENDER_MAX_ROWS
+    )
+    if task:
+        QueryMemory.record(datasource_luid, task, payload)
+    return format_notes(notes) + markdown_table
+
+@mcp.tool(description="Tool to Return more rows of a stored query result by handle: pages, selected columns or sorted slices.")
+def get_result_page_tool(
+    handle: str,
+    offset: int = 0,
+    limit: int = RESULT_PAGE_SIZE,
+    columns: Optional[list[str]] = None,
+    sort_by: Optional[list[str]] = None,
+    descending: bool = False,
+    output_format: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Reads a page of a result previously returned by query_vds_tool or get_headlessbi_data_tool.
+
+    Args:
+        handle (str): The result handle.
+        offset (int): First row to return.
+        limit (int): Number of rows to return.
+        columns (Optional[list[str]]): Columns to return, all by default.
+        sort_by (Optional[list[str]]): Columns to sort the whole result by before paging.
+        descending (bool): Sort in descending order.
+        output_format (Optional[str]): Return the page rendered as "markdown", "csv", "tsv" or "json"
+            under "table" instead of records under "data".
+
+    Returns:
+        Dict[str, Any]: The page with the handle, offset, row count and whether more rows follow.
+    """
+    stored = ResultStore.get(handle)
+    page = result_page(stored, offset, limit, columns=columns, sort_by=sort_by, descending=descending)
+    response = {
+        "handle": handle,
+        "offset": offset,
+        "row_count": len(stored.result),
+        "has_more": offset + len(page) < len(stored.result)
+    }
+    if output_format:
+        response["table"] = render(page, output_format=output_format, max_rows=None)
+    else:
+        response["data"] = page.to_records()
+    return response
+
+@mcp.tool(description="Tool to Transform a stored query result locally without querying Tableau: filter, sort, top N, group by / re-aggregate, percent of total and pivot.")
+def transform_result_tool(
+    handle: str,
+    operations: list[Dict[str, Any]],
+    output_format: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Applies a pipeline of operations to a stored result and stores the output under a new handle.
+
+    Operations run in order, each a dict with an "op" key:
+      {"op": "filter", "column": "Region", "operator": "in", "value": ["East", "West"]}
+      {"op": "sort", "by": ["SUM(Sales)"], "descending": true}
+      {"op": "top", "n": 10, "by": "SUM(Sales)"}
+      {"op": "group_by", "by": ["Region"], "aggregations": [{"column": "SUM(Sales)", "function": "SUM", "as": "Sales"}]}
+      {"op": "percent_of_total", "column": "Sales", "within": ["Region"]}
+      {"op": "pivot", "index": ["Region"], "columns": "YEAR(Order Date)", "values": "Sales"}
+      {"op": "select", "columns": [...]}, {"op": "limit", "n": 20}
+
+    Args:
+        handle (str): Handle of a result returned by query_vds_tool or a previous transform.
+        operations (list[Dict[str, Any]]): The operations to apply.
+        output_format (Optional[str]): Return the first page rendered as "markdown", "csv", "tsv"
+            or "json" under "table" instead of records under "data".
+
+    Returns:
+        Dict[str, Any]: The new handle, schema, row count and first page of the transformed result.
+    """
+    source = ResultStore.get(handle)
+    derived_query = {"derived_from": handle, "operations": operations}
+    stored = ResultStore.lookup(source.datasource_luid, derived_query)
+    if stored is None:
+        result = apply_operations(source.result, operations)
+        result.truncated = source.result.truncated
+        stored = ResultStore.put(source.datasource_luid, derived_query, result)
+
+    response = stored.summary()
+    page = result_page(stored, 0, RESULT_PAGE_SIZE)
+    if output_format:
+        response["table"] = render(page, output_format=output_format, max_rows=None)
+    else:
+        response["data"] = page.to_records()
+    response["has_more"] = len(stored.result) > RESULT_PAGE_SIZE
+    return response
+
+@mcp.tool(description="Tool to Compare a query across periods (YoY, QoQ, MoM, WoW): runs the current and prior period and returns values, changes and growth rates in one table.")
+def compare_periods_tool(
+    datasource_luid: str,
+    query: Dict[str, Any],
+    date_field: str,
+    period: str = "YEAR",
+    offset: int = 1,
+    output_format: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Runs a query for the current and a prior period concurrently and joins them on the dimensions.
+
+    The prior period query is the given query with its date filters on `date_field` moved back by
+    `offset` periods. Both go through the result cache.
+
+    Args:
+        datasource_luid (str): LUID of the Tableau datasource
+        query (Dict): The current-period query; it needs a date filter on `date_field`.
+        date_field (str): Caption of the date field defining the periods, e.g. "Order Date".
+        period (str): "YEAR", "QUARTER", "MONTH", "WEEK" or "DAY".
+        offset (int): Number of periods back to compare with; 1 compares with the previous period.
+        output_format (Optional[str]): Return the first page rendered as "markdown", "csv", "tsv"
+            or "json" under "table" instead of records under "data".
+
+    Returns:
+        Dict[str, Any]: The comparison handle, schema, row count and first page. Every measure M gets
+        the columns "M", "M (prior)", "M change" and "M change %". The handles of both period results
+        are under "current_handle" and "prior_handle".
+    """
+    token = TokenManager.get_or_refresh()
+    domain = EnvManager.get("TABLEAU_DOMAIN")
+
+    query, notes = prepare_query(datasource_luid, query)
+    prior = prior_period_query(query, date_field, period, offset)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [
+            pool.submit(fetch_result, api_key=token, url=domain, datasource_luid=datasource_luid, query=q,
+                        max_rows=notes.get('size_guard', {}).get('row_cap'))
+            for q in (query, prior)
+        ]
+        (current_stored, _), (prior_stored, _) = [f.result() for f in futures]
+
+    comparison_query = {"compare": [current_stored.handle, prior_stored.handle], "date_field": date_field, "period": period, "offset": offset}
+    result = compare_results(query, current_stored.result, prior_stored.result, date_field, period, offset)
+    result.truncated = current_stored.result.truncated or prior_stored.result.truncated
+    stored = ResultStore.put(datasource_luid, comparison_query, result)
+
+    response = stored.summary()
+    page = result_page(stored, 0, RESULT_PAGE_SIZE)
+    if output_format:
+        response["table"] = render(page, output_format=output_format, max_rows=None)
+    else:
+        response["data"] = page.to_records()
+    response["has_more"] = len(stored.result) > RESULT_PAGE_SIZE
+    response["current_handle"] = current_stored.handle
+    response["prior_handle"] = prior_stored.handle
+    response.update(notes)
+    return response
+
+def join_key_column(query: Dict[str, Any], columns: list[str], key: str) -> str:
+    """
+    Returns the result column of a join key given as a field caption, alias or column name.
+    """
+    if key in columns:
+        return key
+    field = next((f for f in query.get('fields', []) if key in (f.get('fieldCaption'), f.get('fieldAlias'))), None)
+    return resolve_column(field, columns) if field else key
+
+@mcp.tool(description="Tool to Join the results of queries on two different datasources (e.g. sales vs targets) on key fields, locally.")
+def join_datasources_tool(
+    left: Dict[str, Any],
+    right: Dict[str, Any],
+    on: list[Any],
+    how: str = "inner",
+    output_format: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Runs one aggregated query per datasource in parallel and hash-joins the results.
+
+    Both queries go through the result cache. Aggregate each side to the join keys' level so the
+    inputs stay small; the output is capped at JOIN_MAX_ROWS rows.
+
+    Args:
+        left (Dict[str, Any]): {"datasource_luid": ..., "query": {...}} of the left side.
+        right (Dict[str, Any]): The same for the right side.
+        on (list): Join keys, each a field caption present on both sides or {"left": ..., "right": ...}.
+        how (str): "inner", "left" or "full".
+        output_format (Optional[str]): Return the first page rendered as "markdown", "csv", "tsv"
+            or "json" under "table" instead of records under "data".
+
+    Returns:
+        Dict[str, Any]: The joined result's handle, schema, row count and first page, plus the
+        handles of both inputs.
+    """
+    for side in (left, right):
+        problem = validate_batch_item(side)
+        if problem:
+            raise ValueError(problem)
+    token = TokenManager.get_or_refresh()
+    domain = EnvManager.get("TABLEAU_DOMAIN")
+
+    def run(side: Dict[str, Any]):
+        query, notes = prepare_query(side['datasource_luid'], side['query'])
+        stored, _ = fetch_result(api_key=token, url=domain, datasource_luid=side['datasource_luid'], query=query,
+                                 max_rows=notes.get('size_guard', {}).get('row_cap'))
+        return stored
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        left_stored, right_stored = pool.map(run, (left, right))
+
+    pairs = [(k, k) if isinstance(k, str) else (k['left'], k['right']) for k in on]
+    left_on = [join_key_column(left_stored.query, left_stored.result.names, l) for l, _ in pairs]
+    right_on = [join_key_column(right_stored.query, right_stored.result.names, r) for _, r in pairs]
+    join_query = {"join": [left_stored.handle, right_stored.handle], "on": pairs, "how": how}
+    stored = ResultStore.lookup(left['datasource_luid'], join_query)
+    if stored is None:
+        result = hash_join(left_stored.result, right_stored.result, left_on, right_on, how=how, max_rows=JOIN_MAX_ROWS)
+        stored = ResultStore.put(left['datasource_luid'], join_query, result)
+
+    response = stored.summary()
+    page = result_page(stored, 0, RESULT_PAGE_SIZE)
+    if output_format:
+        response["table"] = render(page, output_format=output_format, max_rows=None)
+    else:
+        response["data"] = page.to_records()
+    response["has_more"] = len(stored.result) > RESULT_PAGE_SIZE
+    response["left_handle"] = left_stored.handle
+    response["right_handle"] = right_stored.handle
+    return response
+
+@mcp.tool(description="Tool to Return the status of the materialized rollups configured for datasources.")
+def get_rollups_status_tool(datasource_luid: Optional[str] = None) -> list:
+    """
+    Lists the operator-declared rollups with their size, last refresh and hit count.
+
+    Args:
+        datasource_luid (Optional[str]): Only list rollups of this datasource.
+
+    Returns:
+        list: One status dict per rollup.
+    """
+    return [rollup.status() for rollup in RollupStore.rollups(datasource_luid)]
+
+@mcp.tool(description="Tool to Return a previously successful VDS query for a task. Call it before augment_datasource_metadata_tool: an exact match can be run directly, similar matches are examples.")
+def lookup_vds_query_tool(task: str, datasource_luid: str) -> Dict[str, Any]:
+    """
+    Looks up queries that answered the same or similar tasks on a datasource before.
+
+    Args:
+        task (str): The user task.
+        datasource_luid (str): The LUID of the Tableau datasource.
+
+    Returns:
+        Dict[str, Any]: {"match": "exact", "query": ...} with a ready query, {"match": "similar",
+        "examples": [...]} with the closest past tasks and queries, or {"match": "none"}.
+    """
+    return QueryMemory.lookup(datasource_luid, task)
 
 @mcp.tool(description="Tool to Return a sample values of a published datasource.")
 def get_values_tool(datasource_luid: str, caption: str) -> list:
@@ -204,8 +642,48 @@ def get_values_tool(datasource_luid: str, caption: str) -> list:
     """
     token = TokenManager.get_or_refresh()
     domain = EnvManager.get("TABLEAU_DOMAIN")
+    Prefetcher.touch(datasource_luid)
+    Prefetcher.consume(datasource_luid, "values", caption)
     return get_values(api_key=token, url=domain, datasource_luid=datasource_luid, caption=caption)
 
+@mcp.tool(description="Tool to Return sample values for many fields of a published datasource in one call.")
+def get_values_batch_tool(datasource_luid: str, captions: list[str]) -> Dict[str, Any]:
+    """
+    Retrieves sample values (max 4) for several field captions from a datasource.
+
+    Args:
+        datasource_luid (str): The LUID of the datasource.
+        captions (list[str]): The field captions (labels) to look up.
+
+    Returns:
+        Dict[str, Any]: Up to 4 sample values per caption.
+    """
+    token = TokenManager.get_or_refresh()
+    domain = EnvManager.get("TABLEAU_DOMAIN")
+    Prefetcher.touch(datasource_luid)
+    for caption in captions:
+        Prefetcher.consume(datasource_luid, "values", caption)
+    return get_values_batch(api_key=token, url=domain, datasource_luid=datasource_luid, captions=captions)
+
+@mcp.tool(description="Tool to Return the exact members of a STRING field that best match fuzzy user terms, use it to pick SetFilter/MatchFilter values.")
+def resolve_filter_values_tool(datasource_luid: str, caption: str, terms: list[str]) -> Dict[str, Any]:
+    """
+    Resolves fuzzy user terms to exact members of a dimension using the local member index.
+
+    Args:
+        datasource_luid (str): The LUID of the datasource.
+        caption (str): The field caption (label) to resolve against.
+        terms (list[str]): The user terms, e.g. ["west", "furnitur"].
+
+    Returns:
+        Dict[str, Any]: Candidate members with similarity scores per term.
+    """
+    token = TokenManager.get_or_refresh()
+    domain = EnvManager.get("TABLEAU_DOMAIN")
+    Prefetcher.touch(datasource_luid)
+    Prefetcher.consume(datasource_luid, "members", caption)
+    return resolve_filter_values(api_key=token, url=domain, datasource_luid=datasource_luid, caption=caption, terms=terms)
+
 @mcp.tool(description="Tool to Return a augmented metadata of a published datasource.")
 def augment_datasource_metadata_tool(
     task: str,
@@ -213,7 +691,7 @@ def augment_datasource_metadata_tool(
     prompt: Dict[str, Any],
     previous_errors: Optional[str] = None,
     previous_vds_payload: Optional[str] = None
-) -> Dict[str, Any]:
+) -> str:
     """
     Gathers all metadata and augments it into a prompt dictionary.
 
@@ -225,17 +703,19 @@ def augment_datasource_metadata_tool(
         previous_vds_payload (Optional[str]): Previous failed VDS query (JSON).
 
     Returns:
-        Dict[str, Any]: Prompt with metadata, dictionary, and optional debug info.
+        str: Prompt with metadata, dictionary, and optional debug info, as JSON text. The
+        datasource part comes pre-rendered from the prompt cache.
     """
     token = TokenManager.get_or_refresh()
     domain = EnvManager.get("TABLEAU_DOMAIN")
+    MemberIndexer.touch(datasource_luid)
    
     vds_prompt_data['vds_schema'] = vds_schema
     vds_prompt_data['sample_queries'] = sample_queries
     vds_prompt_data['error_queries'] = error_queries
     prompt = vds_prompt_data
 
-    return augment_datasource_metadata(
+    augmented = render_datasource_prompt(
         task=task,
         api_key=token,
         url=domain,
@@ -244,3 +724,49 @@ def augment_datasource_metadata_tool(
         previous_errors=previous_errors,
         previous_vds_payload=previous_vds_payload
     )
+    # warm the lookups the agent usually makes next (no-op unless PREFETCH_ENABLED)
+    Prefetcher.schedule(tableau_credentials, datasource_luid, task)
+    return augmented
+
+@mcp.tool(description="Tool to Return the speculative prefetch counters: prefetched, cancelled, hit and waste ratios.")
+def get_prefetch_stats_tool() -> Dict[str, Any]:
+    """
+    Returns the prefetcher's counters.
+
+    Returns:
+        Dict[str, Any]: Scheduled, prefetched, cancelled, failed, hits and wasted counts with the
+        hit and waste ratios of prefetches that have been used or expired.
+    """
+    return Prefetcher.stats()
+
+@mcp.tool(description="Tool to Return the upstream request scheduler state: in-flight and queued requests per priority class.")
+def get_scheduler_stats_tool() -> Dict[str, Any]:
+    """
+    Returns the state of the scheduler all Tableau requests go through.
+
+    Returns:
+        Dict[str, Any]: Capacity, in-flight and queued requests per class, the recent interactive
+        latency, whether lower classes are throttled, and request, drop and wait totals per class.
+    """
+    return UpstreamScheduler.stats()
+
+@mcp.tool(description="Tool to Return per-datasource query health: in-flight queries, concurrency limit, p50/p95 latency and whether the source is throttled as slow.")
+def get_datasource_health_tool(datasource_luid: Optional[str] = None) -> list:
+    """
+    Lists the bulkhead state of every datasource queried so far.
+
+    Args:
+        datasource_luid (Optional[str]): Only report this datasource.
+
+    Returns:
+        list: One dict per datasource with in-flight count, limit, slow flag, sample count,
+        p50/p95 latency in seconds, failure ratio and the number of rejected queries.
+    """
+    return DatasourceBulkhead.stats(datasource_luid)
+
+
+def tableau_credentials() -> Tuple[str, str]:
+    """
+    Returns a valid (token, domain) pair for background jobs.
+    """
+    return TokenManager.get_or_refresh(), EnvManager.get("TABLEAU_DOMAIN")
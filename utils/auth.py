@@ -5,6 +5,7 @@ import jwt
 from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 from utils.utils import http_post
+from utils.scheduler import UpstreamScheduler, INTERACTIVE
 
 def jwt_connected_app(
         tableau_domain: str,
@@ -73,7 +74,9 @@ def jwt_connected_app(
         }
     }
 
-    response = requests.post(endpoint, headers=headers, json=payload)
+    # sign-in gates every other request, so it always runs as interactive
+    with UpstreamScheduler.slot(INTERACTIVE):
+        response = requests.post(endpoint, headers=headers, json=payload)
 
     # Check if the request was successful (status code 200)
     if response.status_code == 200:
@@ -152,7 +155,8 @@ async def jwt_connected_app_async(
         }
     }
 
-    response = await http_post(endpoint=endpoint, headers=headers, payload=payload)
+    async with UpstreamScheduler.aslot(INTERACTIVE):
+        response = await http_post(endpoint=endpoint, headers=headers, payload=payload)
      # Check if the request was successful (status code 200)
     if response['status'] == 200:
         return response['data']
@@ -0,0 +1,197 @@
+import os
+import time
+import threading
+import contextlib
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from utils.scheduler import UpstreamBusyError
+
+
+BULKHEAD_MAX_IN_FLIGHT = int(os.getenv("BULKHEAD_MAX_IN_FLIGHT", "4"))
+BULKHEAD_SLOW_MAX_IN_FLIGHT = int(os.getenv("BULKHEAD_SLOW_MAX_IN_FLIGHT", "1"))
+BULKHEAD_SLOW_P95_SECONDS = float(os.getenv("BULKHEAD_SLOW_P95_SECONDS", "20"))
+BULKHEAD_FAILURE_RATIO = float(os.getenv("BULKHEAD_FAILURE_RATIO", "0.5"))
+BULKHEAD_MAX_WAIT_SECONDS = float(os.getenv("BULKHEAD_MAX_WAIT_SECONDS", "10"))
+BULKHEAD_WINDOW_SECONDS = float(os.getenv("BULKHEAD_WINDOW_SECONDS", "300"))
+BULKHEAD_WINDOW_SIZE = 50
+BULKHEAD_MIN_SAMPLES = 5
+
+
+class DatasourceBusyError(UpstreamBusyError):
+    """
+    Raised when a datasource already has as many queries in flight as its bulkhead allows.
+    """
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of `values`; None when there are none.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+class _Call:
+    __slots__ = ("ok", "started")
+
+    def __init__(self):
+        self.ok = True
+        self.started: Optional[float] = None
+
+    def begin(self):
+        """
+        Marks the moment the request is sent; only calls that got this far are sampled.
+        """
+        self.started = time.monotonic()
+
+
+class _Compartment:
+    __slots__ = ("in_flight", "samples", "rejected", "slow_since")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.samples: Deque[Tuple[float, float, bool]] = deque(maxlen=BULKHEAD_WINDOW_SIZE)
+        self.rejected = 0
+        self.slow_since: Optional[float] = None
+
+    def recent(self, now: float) -> List[Tuple[float, float, bool]]:
+        return [s for s in self.samples if now - s[0] <= BULKHEAD_WINDOW_SECONDS]
+
+
+class DatasourceBulkhead:
+    """
+    Per-datasource concurrency limit in front of the VDS client.
+
+    Each datasource LUID may have at most BULKHEAD_MAX_IN_FLIGHT requests in flight, so one source
+    cannot take all of the upstream scheduler's capacity. The latency of the last
+    BULKHEAD_WINDOW_SIZE requests within BULKHEAD_WINDOW_SECONDS is tracked per LUID; once at least
+    BULKHEAD_MIN_SAMPLES are known and their p95 exceeds BULKHEAD_SLOW_P95_SECONDS, or at least
+    BULKHEAD_FAILURE_RATIO of them failed, the source is slow and its limit drops to
+    BULKHEAD_SLOW_MAX_IN_FLIGHT. It recovers when the faster requests, or the passing of time,
+    push the old samples out of the window.
+
+    A request that finds its compartment full waits up to BULKHEAD_MAX_WAIT_SECONDS and then fails
+    with DatasourceBusyError instead of queuing behind a source that is not keeping up. Like the
+    scheduler slot, a bulkhead slot ends when the response headers arrive.
+    """
+    _cond = threading.Condition()
+    _compartments: Dict[str, _Compartment] = {}
+
+    @classmethod
+    def _compartment(cls, datasource_luid: str) -> _Compartment:
+        compartment = cls._compartments.get(datasource_luid)
+        if compartment is None:
+            compartment = cls._compartments[datasource_luid] = _Compartment()
+        return compartment
+
+    @staticmethod
+    def _is_slow(samples: List[Tuple[float, float, bool]]) -> bool:
+        if len(samples) < BULKHEAD_MIN_SAMPLES:
+            return False
+        failures = sum(1 for _, _, ok in samples if not ok)
+        if failures / len(samples) >= BULKHEAD_FAILURE_RATIO:
+            return True
+        return percentile([elapsed for _, elapsed, _ in samples], 95) > BULKHEAD_SLOW_P95_SECONDS
+
+    @staticmethod
+    def _limit(slow: bool) -> int:
+        return min(BULKHEAD_SLOW_MAX_IN_FLIGHT, BULKHEAD_MAX_IN_FLIGHT) if slow else BULKHEAD_MAX_IN_FLIGHT
+
+    @classmethod
+    def acquire(cls, datasource_luid: str):
+        """
+        Blocks until the datasource has a free slot.
+
+        Raises:
+            DatasourceBusyError: If no slot became free within BULKHEAD_MAX_WAIT_SECONDS.
+        """
+        deadline = time.monotonic() + BULKHEAD_MAX_WAIT_SECONDS
+        with cls._cond:
+            compartment = cls._compartment(datasource_luid)
+            while True:
+                now = time.monotonic()
+                slow = cls._is_slow(compartment.recent(now))
+                if slow and compartment.slow_since is None:
+                    compartment.slow_since = now
+                    print(f"[Bulkhead] Datasource {datasource_luid} is slow, limiting it to {cls._limit(True)} in-flight queries")
+                elif not slow:
+                    compartment.slow_since = None
+                limit = cls._limit(slow)
+                if compartment.in_flight < limit:
+                    compartment.in_flight += 1
+                    return
+                if now >= deadline:
+                    compartment.rejected += 1
+                    state = "slow and " if slow else ""
+                    raise DatasourceBusyError(
+                        f"Datasource {datasource_luid} is {state}at its limit of {limit} concurrent queries; "
+                        f"retry once the running queries have finished."
+                    )
+                cls._cond.wait(timeout=min(1.0, deadline - now))
+
+    @classmethod
+    def release(cls, datasource_luid: str, elapsed: Optional[float] = None, ok: bool = True):
+        """
+        Frees a slot; `elapsed` is None for requests that were never sent and are not sampled.
+        """
+        with cls._cond:
+            compartment = cls._compartment(datasource_luid)
+            compartment.in_flight -= 1
+            if elapsed is not None:
+                compartment.samples.append((time.monotonic(), elapsed, ok))
+            cls._cond.notify_all()
+
+    @classmethod
+    @contextlib.contextmanager
+    def slot(cls, datasource_luid: str) -> Iterator[_Call]:
+        """
+        Holds a slot of the datasource's bulkhead around a blocking HTTP call.
+
+        Callers enter the scheduler slot inside this block and call `call.begin()` right before
+        sending, so a request that waits for or is dropped by the scheduler is not sampled: global
+        contention says nothing about the datasource. A sent call counts as failed if the block
+        raises or sets `call.ok = False`; callers do that for server errors, not for rejected
+        queries. Its latency runs from `call.begin()`.
+        """
+        cls.acquire(datasource_luid)
+        call = _Call()
+        try:
+            yield call
+        except BaseException:
+            call.ok = False
+            raise
+        finally:
+            elapsed = None if call.started is None else time.monotonic() - call.started
+            cls.release(datasource_luid, elapsed, call.ok)
+
+    @classmethod
+    def stats(cls, datasource_luid: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Per-datasource in-flight count, limit, latency percentiles and failure ratio.
+        """
+        now = time.monotonic()
+        report = []
+        with cls._cond:
+            for luid, compartment in cls._compartments.items():
+                if datasource_luid and luid != datasource_luid:
+                    continue
+                samples = compartment.recent(now)
+                latencies = [elapsed for _, elapsed, _ in samples]
+                slow = cls._is_slow(samples)
+                p50, p95 = percentile(latencies, 50), percentile(latencies, 95)
+                report.append({
+                    "datasource_luid": luid,
+                    "in_flight": compartment.in_flight,
+                    "limit": cls._limit(slow),
+                    "slow": slow,
+                    "samples": len(samples),
+                    "p50_seconds": None if p50 is None else round(p50, 3),
+                    "p95_seconds": None if p95 is None else round(p95, 3),
+                    "failure_ratio": round(sum(1 for _, _, ok in samples if not ok) / len(samples), 3) if samples else None,
+                    "rejected": compartment.rejected
+                })
+        return report
@@ -0,0 +1,282 @@
+import io
+import csv
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; columns stay plain arrays without it
+    np = None
+
+
+class Column:
+    """
+    One typed column of a ColumnarResult.
+
+    Storage depends on the values seen while building:
+      - "int" / "float": a compact `array` ('q' / 'd'), nulls tracked in a byte mask
+      - "str": dictionary-encoded, an `array('i')` of codes into a list of interned strings (-1 is null)
+      - "object": a plain list, used for booleans and mixed types
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.kind: Optional[str] = None
+        self.values: Any = []
+        self.nulls = bytearray()
+        self.dictionary: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+    def _become(self, kind: str):
+        previous = [self.get(i) for i in range(len(self))] if self.kind else [None] * len(self)
+        self.kind = kind
+        self.dictionary, self._codes = [], {}
+        if kind == "int":
+            self.values = array("q", (0 if v is None else v for v in previous))
+        elif kind == "float":
+            self.values = array("d", (0.0 if v is None else float(v) for v in previous))
+        elif kind == "str":
+            self.values = array("i", (self._encode(v) for v in previous))
+        else:
+            self.values = previous
+
+    def _encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.dictionary)
+            self._codes[value] = code
+            self.dictionary.append(sys.intern(value))
+        return code
+
+    def append(self, value: Any):
+        if value is not None:
+            if isinstance(value, bool):
+                wanted = "object"
+            elif isinstance(value, int):
+                wanted = "float" if self.kind == "float" else "int"
+            elif isinstance(value, float):
+                wanted = "float"
+            elif isinstance(value, str):
+                wanted = "str"
+            else:
+                wanted = "object"
+            if self.kind is None or (self.kind != wanted and self.kind != "object"):
+                if self.kind == "int" and wanted == "float":
+                    self._become("float")
+                elif self.kind is None:
+                    self._become(wanted)
+                else:
+                    self._become("object")
+            if self.kind == "int" and not -2 ** 63 <= value < 2 ** 63:
+                self._become("object")
+
+        self.nulls.append(value is None)
+        if self.kind == "str":
+            self.values.append(self._encode(value))
+        elif self.kind == "int":
+            self.values.append(0 if value is None else value)
+        elif self.kind == "float":
+            self.values.append(0.0 if value is None else float(value))
+        else:
+            self.values.append(value)
+
+    def get(self, i: int) -> Any:
+        if self.nulls[i]:
+            return None
+        if self.kind == "str":
+            return self.dictionary[self.values[i]]
+        return self.values[i]
+
+    def to_list(self, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        stop = len(self) if stop is None else stop
+        if self.kind == "str":
+            dictionary = self.dictionary
+            return [None if code < 0 else dictionary[code] for code in self.values[start:stop]]
+        values = self.values[start:stop]
+        if any(self.nulls[start:stop]):
+            return [None if null else v for v, null in zip(values, self.nulls[start:stop])]
+        return list(values)
+
+    @property
+    def is_numeric(self) -> bool:
+        return self.kind in ("int", "float")
+
+    @property
+    def nbytes(self) -> int:
+        if isinstance(self.values, array):
+            size = self.values.itemsize * len(self.values)
+        else:
+            size = 8 * len(self.values)
+        return size + len(self.nulls) + sum(len(s) + 49 for s in self.dictionary)
+
+
+class ColumnarResult:
+    """
+    Compact, column-oriented query result.
+
+    Column names are stored once and values in typed columns. Slicing and projection return
+    views that share the column buffers, so they cost no copy; rows are only materialized when
+    converting to records, markdown or CSV.
+
+    Args:
+        columns (List[Column]): The columns, all of the same length.
+        start (int): First row of the view.
+        stop (Optional[int]): End (exclusive) of the view; defaults to the column length.
+    """
+
+    def __init__(self, columns: List[Column], start: int = 0, stop: Optional[int] = None):
+        self.columns = columns
+        self._by_name = {column.name: column for column in columns}
+        length = len(columns[0]) if columns else 0
+        self.start = start
+        self.stop = length if stop is None else min(stop, length)
+        self.truncated = False
+
+    # construction -----------------------------------------------------------------------
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any], names: Optional[Sequence[str]] = None) -> "ColumnarResult":
+        """
+        Builds a result from an iterable of rows, consuming it once.
+
+        Rows may be dicts (VDS OBJECTS format) or lists (VDS ARRAYS format, which needs `names`).
+        Column names default to the keys of the first row; keys appearing later are added as new
+        columns padded with nulls.
+        """
+        columns: List[Column] = [Column(name) for name in names] if names else []
+        by_name = {column.name: column for column in columns}
+        count = 0
+        for row in rows:
+            if isinstance(row, dict):
+                for key in row:
+                    if key not in by_name:
+                        column = Column(key)
+                        for _ in range(count):
+                            column.append(None)
+                        columns.append(column)
+                        by_name[key] = column
+                for column in columns:
+                    column.append(row.get(column.name))
+            else:
+                for column, value in zip(columns, row):
+                    column.append(value)
+                for column in columns[len(row):]:
+                    column.append(None)
+            count += 1
+        return cls(columns)
+
+    @classmethod
+    def from_columns(cls, data: Dict[str, Sequence[Any]]) -> "ColumnarResult":
+        columns = []
+        for name, values in data.items():
+            column = Column(name)
+            for value in values:
+                column.append(value)
+            columns.append(column)
+        return cls(columns)
+
+    # shape ------------------------------------------------------------------------------
+
+    @property
+    def names(self) -> List[str]:
+        return [column.name for column in self.columns]
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns)
+
+    def schema(self) -> List[Dict[str, str]]:
+        return [{"name": column.name, "type": column.kind or "null"} for column in self.columns]
+
+    def column(self, name: str) -> Column:
+        return self._by_name[name]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("ColumnarResult slices do not support a step")
+            return ColumnarResult(self.columns, self.start + start, self.start + stop)
+        return self.column_values(key)
+
+    def select(self, names: Sequence[str]) -> "ColumnarResult":
+        """
+        Returns a view with only the given columns, in the given order.
+        """
+        return ColumnarResult([self._by_name[name] for name in names], self.start, self.stop)
+
+    def take(self, indices: Sequence[int]) -> "ColumnarResult":
+        """
+        Returns a new result with the given rows (view-relative positions), in the given order.
+        """
+        columns = []
+        for source in self.columns:
+            column = Column(source.name)
+            for i in indices:
+                column.append(source.get(self.start + i))
+            columns.append(column)
+        return ColumnarResult(columns)
+
+    def sort_indices(self, by: Sequence[str], descending: Union[bool, Sequence[bool]] = False) -> List[int]:
+        """
+        Row positions ordered by one or more columns; nulls sort last in either direction.
+        """
+        if isinstance(descending, bool):
+            descending = [descending] * len(by)
+        order = list(range(len(self)))
+        # stable sorts from the least to the most significant key
+        for name, desc in reversed(list(zip(by, descending))):
+            values = self.column_values(name)
+            present = [i for i in order if values[i] is not None]
+            missing = [i for i in order if values[i] is None]
+            present.sort(key=values.__getitem__, reverse=desc)
+            order = present + missing
+        return order
+
+    def column_values(self, name: str) -> List[Any]:
+        return self._by_name[name].to_list(self.start, self.stop)
+
+    def to_numpy(self, name: str):
+        """
+        Returns a numeric column as a NumPy array without copying (null slots hold 0).
+
+        Raises:
+            ImportError: If NumPy is not installed.
+            ValueError: If the column is not numeric.
+        """
+        if np is None:
+            raise ImportError("NumPy is required for to_numpy")
+        column = self._by_name[name]
+        if not column.is_numeric:
+            raise ValueError(f"Column '{name}' is not numeric")
+        return np.frombuffer(column.values, dtype=np.int64 if column.kind == "int" else np.float64)[self.start:self.stop]
+
+    # conversion -------------------------------------------------------------------------
+
+    def iter_rows(self) -> Iterator[tuple]:
+        return zip(*(column.to_list(self.start, self.stop) for column in self.columns))
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        names = self.names
+        return [dict(zip(names, row)) for row in self.iter_rows()]
+
+    def to_markdown(self) -> str:
+        lines = ["| " + " | ".join(self.names) + " |", "| " + " | ".join(["---"] * len(self.columns)) + " |"]
+        lines.extend("| " + " | ".join(str(value) for value in row) + " |" for row in self.iter_rows())
+        return "\n".join(lines) + "\n"
+
+    def to_csv(self, delimiter: str = ",") -> str:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+        writer.writerow(self.names)
+        writer.writerows(self.iter_rows())
+        return buffer.getvalue()
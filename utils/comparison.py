@@ -0,0 +1,205 @@
+import copy
+import calendar
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from utils.columnar import ColumnarResult
+from utils.subsumption import AGGREGATIONS
+from utils.vizql_data_service import resolve_column
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the arithmetic falls back to list comprehensions
+    np = None
+
+
+PERIODS = ("YEAR", "QUARTER", "MONTH", "WEEK", "DAY")
+_PERIOD_MONTHS = {"YEAR": 12, "QUARTER": 3, "MONTH": 1}
+_TRUNCATED = (None, "TRUNC_YEAR", "TRUNC_QUARTER", "TRUNC_MONTH", "TRUNC_WEEK", "TRUNC_DAY")
+# How a date part moves when its date is shifted by one period: (part steps, cycle length).
+# Combinations missing here (e.g. YEAR(date) compared MONTH over MONTH) have no fixed mapping.
+_DATE_PARTS = {
+    ("YEAR", "YEAR"): (1, None),
+    ("QUARTER", "YEAR"): (0, None),
+    ("MONTH", "YEAR"): (0, None),
+    ("WEEK", "YEAR"): (0, None),
+    ("DAY", "YEAR"): (0, None),
+    ("QUARTER", "QUARTER"): (1, 4),
+    ("MONTH", "QUARTER"): (3, 12),
+    ("MONTH", "MONTH"): (1, 12),
+    ("DAY", "MONTH"): (0, None),
+}
+_DATE_PART_FUNCTIONS = ("YEAR", "QUARTER", "MONTH", "WEEK", "DAY")
+
+
+def shift_date(day: date, period: str, offset: int) -> date:
+    """
+    Moves a date back by `offset` periods. Month-based shifts keep the day of the month, clamped
+    to shorter months; the last day of a month maps to the last day of the target month, so
+    ranges ending on a month end keep covering whole months.
+    """
+    if period == "WEEK":
+        return day - timedelta(weeks=offset)
+    if period == "DAY":
+        return day - timedelta(days=offset)
+    month = day.month - 1 - offset * _PERIOD_MONTHS[period]
+    year, month = day.year + month // 12, month % 12 + 1
+    last_day = calendar.monthrange(year, month)[1]
+    if day.day == calendar.monthrange(day.year, day.month)[1]:
+        return date(year, month, last_day)
+    return date(year, month, min(day.day, last_day))
+
+
+def _shift_text(value: str, period: str, offset: int) -> str:
+    return shift_date(date.fromisoformat(value[:10]), period, offset).isoformat() + value[10:]
+
+
+def prior_period_query(query: Dict[str, Any], date_field: str, period: str = "YEAR", offset: int = 1) -> Dict[str, Any]:
+    """
+    Returns the query for the comparison period: the date filters on `date_field` moved back by
+    `offset` periods. Absolute ranges are shifted; relative filters get an earlier anchorDate.
+
+    Raises:
+        ValueError: If the period is unknown, the query has no date filter on `date_field`, or
+            groups `date_field` by a date part that does not map between the periods.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}', expected one of {PERIODS}")
+    for field in query.get('fields') or []:
+        function = field.get('function')
+        if field.get('fieldCaption') == date_field and function in _DATE_PART_FUNCTIONS and (function, period) not in _DATE_PARTS:
+            raise ValueError(
+                f"Rows grouped by {function}({date_field}) cannot be matched {period} over {period}; "
+                f"group by a truncated date such as TRUNC_{period} instead."
+            )
+    prior = copy.deepcopy(query)
+    shifted = 0
+    for query_filter in prior.get('filters') or []:
+        if (query_filter.get('field') or {}).get('fieldCaption') != date_field:
+            continue
+        if query_filter.get('filterType') == 'QUANTITATIVE_DATE':
+            for key in ('minDate', 'maxDate'):
+                if query_filter.get(key):
+                    query_filter[key] = _shift_text(query_filter[key], period, offset)
+            shifted += 1
+        elif query_filter.get('filterType') == 'DATE':
+            anchor = query_filter.get('anchorDate') or date.today().isoformat()
+            query_filter['anchorDate'] = _shift_text(anchor, period, offset)
+            shifted += 1
+    if not shifted:
+        raise ValueError(
+            f"The query has no date filter on '{date_field}' to compare against; add a QUANTITATIVE_DATE or DATE filter."
+        )
+    return prior
+
+
+def _align_prior(field: Dict[str, Any], values: List[Any], period: str, offset: int) -> List[Any]:
+    """
+    Moves the prior period's values of a grouped date field forward so they join the current ones.
+    Date parts step and wrap as listed in _DATE_PARTS; values keep their type (VDS may return
+    numbers or numeric strings).
+    """
+    function = field.get('function')
+    if function in _DATE_PART_FUNCTIONS:
+        step, cycle = _DATE_PARTS[(function, period)]
+        if not step:
+            return values
+        aligned = []
+        for value in values:
+            try:
+                number = int(value) + step * offset
+            except (TypeError, ValueError):
+                aligned.append(value)
+                continue
+            if cycle:
+                number = (number - 1) % cycle + 1
+            aligned.append(str(number) if isinstance(value, str) else number)
+        return aligned
+    if function not in _TRUNCATED:
+        return values
+    aligned = []
+    for value in values:
+        try:
+            aligned.append(_shift_text(value, period, -offset))
+        except (TypeError, ValueError):
+            aligned.append(value)
+    return aligned
+
+
+def _delta_and_growth(current: List[Any], prior: List[Any]):
+    if not all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in current + prior):
+        return [None] * len(current), [None] * len(current)
+    if np is not None:
+        a = np.array([np.nan if v is None else v for v in current], dtype=float)
+        b = np.array([np.nan if v is None else v for v in prior], dtype=float)
+        delta = a - b
+        with np.errstate(divide="ignore", invalid="ignore"):
+            growth = np.where(b != 0, delta / np.abs(b) * 100.0, np.nan)
+        to_list = lambda x: [None if np.isnan(v) else float(v) for v in x]
+        return to_list(delta), [None if v is None else round(v, 4) for v in to_list(growth)]
+    delta = [None if a is None or b is None else a - b for a, b in zip(current, prior)]
+    growth = [None if d is None or not b else round(d / abs(b) * 100.0, 4) for d, b in zip(delta, prior)]
+    return delta, growth
+
+
+def compare_results(
+    query: Dict[str, Any],
+    current: ColumnarResult,
+    prior: ColumnarResult,
+    date_field: str,
+    period: str = "YEAR",
+    offset: int = 1
+) -> ColumnarResult:
+    """
+    Joins the current and prior period results on the query dimensions and computes changes.
+
+    Rows are full-outer joined; for every measure the output holds the current value, the prior
+    value, the absolute change and the change in percent of the prior value.
+
+    Args:
+        query (Dict[str, Any]): The current-period VDS query.
+        current (ColumnarResult): Its result.
+        prior (ColumnarResult): The result of the prior-period query.
+        date_field (str): Caption of the date field the periods are defined on.
+        period (str): One of PERIODS.
+        offset (int): How many periods back the prior period is.
+
+    Returns:
+        ColumnarResult: The dimensions followed by four columns per measure.
+    """
+    fields = query.get('fields', [])
+    dimensions = [f for f in fields if f.get('function') not in AGGREGATIONS and not f.get('calculation')]
+    measures = [f for f in fields if f not in dimensions]
+
+    def keys(result: ColumnarResult, align: bool) -> List[tuple]:
+        if not len(result):
+            return []
+        columns = []
+        for field in dimensions:
+            values = result.column_values(resolve_column(field, result.names))
+            if align and field.get('fieldCaption') == date_field:
+                values = _align_prior(field, values, period, offset)
+            columns.append(values)
+        return list(zip(*columns)) if columns else [()] * len(result)
+
+    current_keys, prior_keys = keys(current, False), keys(prior, True)
+    prior_index = {key: i for i, key in enumerate(prior_keys)}
+    current_index = {key: i for i, key in enumerate(current_keys)}
+    joined = current_keys + [key for key in prior_keys if key not in current_index]
+
+    data: Dict[str, List[Any]] = {}
+    for position, field in enumerate(dimensions):
+        name = resolve_column(field, current.names if len(current) else prior.names)
+        data[name] = [key[position] for key in joined]
+    for field in measures:
+        name = resolve_column(field, current.names if len(current) else prior.names)
+        current_values = current.column_values(name) if len(current) else []
+        prior_values = prior.column_values(resolve_column(field, prior.names)) if len(prior) else []
+        now = [current_values[current_index[k]] if k in current_index else None for k in joined]
+        before = [prior_values[prior_index[k]] if k in prior_index else None for k in joined]
+        delta, growth = _delta_and_growth(now, before)
+        data[name] = now
+        data[f"{name} (prior)"] = before
+        data[f"{name} change"] = delta
+        data[f"{name} change %"] = growth
+    return ColumnarResult.from_columns(data)
@@ -0,0 +1,106 @@
+import os
+import json
+from typing import Dict, Any, Iterable, List, Optional
+
+from utils.prompts import sample_queries, error_queries
+from utils.text_index import BM25Index, tokenize
+
+
+PROMPT_SAMPLE_QUERIES_K = int(os.getenv("PROMPT_SAMPLE_QUERIES_K", "4"))
+PROMPT_ERROR_QUERIES_K = int(os.getenv("PROMPT_ERROR_QUERIES_K", "3"))
+
+
+def load_extra_examples(path: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Loads administrator-provided examples from a JSON file shaped like
+    {"sample_queries": [...], "error_queries": [...]}, using the same entry format as `utils.prompts`.
+
+    Args:
+        path (Optional[str]): File to read; defaults to the VDS_EXAMPLES_PATH environment variable.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: The extra examples, empty lists if none are configured.
+    """
+    path = path or os.getenv("VDS_EXAMPLES_PATH")
+    if not path:
+        return {"sample_queries": [], "error_queries": []}
+    with open(path, "r", encoding="utf-8") as f:
+        extra = json.load(f)
+    return {
+        "sample_queries": extra.get("sample_queries", []),
+        "error_queries": extra.get("error_queries", [])
+    }
+
+
+def _query_patterns(node: Any) -> Iterable[str]:
+    # field captions, functions and filter types are what makes two queries look alike
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ("fieldCaption", "function", "filterType", "periodType", "dateRangeType",
+                       "quantitativeFilterType", "calculation") and isinstance(value, str):
+                yield value
+            else:
+                yield from _query_patterns(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _query_patterns(item)
+
+
+def example_tokens(example: Dict[str, Any]) -> List[str]:
+    """
+    Tokens describing an example: its description (or observation and error) and query patterns.
+    """
+    text = " ".join(str(example.get(key, "")) for key in ("example", "observation", "error"))
+    patterns = " ".join(_query_patterns({k: v for k, v in example.items() if k not in ("example", "observation", "error")}))
+    return tokenize(f"{text} {patterns}")
+
+
+class ExampleIndex:
+    """
+    BM25 retrieval over few-shot examples, so the prompt carries only the k most similar ones.
+    """
+
+    def __init__(self, examples: List[Dict[str, Any]]):
+        self.examples = examples
+        self.index = BM25Index(example_tokens(example) for example in examples)
+
+    def select(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """
+        Returns the top-k examples for the query, in their original order.
+
+        When fewer than k examples match, the remainder is filled with the first examples so the
+        prompt always shows the basic query shapes.
+        """
+        if k <= 0:
+            return []
+        if len(self.examples) <= k:
+            return self.examples
+        chosen = [doc_id for doc_id, _ in self.index.top_k(tokenize(query), k)]
+        for doc_id in range(len(self.examples)):
+            if len(chosen) >= k:
+                break
+            if doc_id not in chosen:
+                chosen.append(doc_id)
+        return [self.examples[doc_id] for doc_id in sorted(chosen)]
+
+
+_EXTRA_EXAMPLES = load_extra_examples()
+
+SAMPLE_QUERY_INDEX = ExampleIndex(sample_queries + _EXTRA_EXAMPLES["sample_queries"])
+ERROR_QUERY_INDEX = ExampleIndex(error_queries + _EXTRA_EXAMPLES["error_queries"])
+
+
+def select_examples(query: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Picks the sample and error queries most similar to the task.
+
+    Args:
+        query (str): The task, optionally followed by detected schema feature names.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: {"sample_queries": [...], "error_queries": [...]}.
+    """
+    return {
+        "sample_queries": SAMPLE_QUERY_INDEX.select(query, PROMPT_SAMPLE_QUERIES_K),
+        "error_queries": ERROR_QUERY_INDEX.select(query, PROMPT_ERROR_QUERIES_K)
+    }
@@ -0,0 +1,295 @@
+import os
+import copy
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime
+from typing import Callable, Dict, Any, Optional
+
+from utils.vizql_data_service import is_query_rejected, query_vds, query_vds_metadata
+from utils.scheduler import BACKGROUND, UpstreamBusyError, request_priority
+from utils.prompt_cache import metadata_version
+from utils.utils import TTLCache
+
+
+PROFILE_MAX_WORKERS = int(os.getenv("PROFILE_MAX_WORKERS", "4"))
+PROFILE_TIMEOUT_SECONDS = float(os.getenv("PROFILE_TIMEOUT_SECONDS", "30"))
+FIELD_PROFILES_IN_PROMPT = os.getenv("FIELD_PROFILES_IN_PROMPT", "true").lower() in ("1", "true", "yes")
+
+# Profiles per (datasource LUID, read-metadata version); the latest version per LUID is kept too
+profile_cache = TTLCache(max_entries=256, ttl_seconds=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "86400")))
+_latest_profiles = TTLCache(max_entries=256, ttl_seconds=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "86400")))
+
+_PROFILED_TYPES = ("INTEGER", "REAL", "STRING", "DATE", "DATETIME", "BOOLEAN")
+
+# Distinct values produced by date-part functions, independent of the date range
+_DATE_PART_CARDINALITY = {"QUARTER": 4, "MONTH": 12, "WEEK": 53, "DAY": 31}
+# Days covered by one bucket of a truncating date function
+_DATE_TRUNC_DAYS = {"YEAR": 365.25, "TRUNC_YEAR": 365.25, "TRUNC_QUARTER": 91.3, "TRUNC_MONTH": 30.4, "TRUNC_WEEK": 7, "TRUNC_DAY": 1}
+_PERIOD_DAYS = {"MINUTES": 1 / 1440, "HOURS": 1 / 24, "DAYS": 1, "WEEKS": 7, "MONTHS": 30.4, "QUARTERS": 91.3, "YEARS": 365.25}
+
+
+def _escape_caption(caption: str) -> str:
+    return caption.replace("]", "]]")
+
+
+def profile_query(caption: str) -> Dict[str, Any]:
+    """
+    Builds the VDS query profiling one field: distinct count, min, max, null count and row count.
+    """
+    field = _escape_caption(caption)
+    return {
+        'fields': [
+            {'fieldCaption': caption, 'function': 'COUNTD', 'fieldAlias': 'countd'},
+            {'fieldCaption': caption, 'function': 'MIN', 'fieldAlias': 'min'},
+            {'fieldCaption': caption, 'function': 'MAX', 'fieldAlias': 'max'},
+            {'fieldCaption': 'nulls', 'calculation': f'SUM(IIF(ISNULL([{field}]), 1, 0))'},
+            {'fieldCaption': 'rows', 'calculation': 'SUM(1)'}
+        ]
+    }
+
+
+def profile_field(api_key: str, url: str, datasource_luid: str, caption: str) -> Dict[str, Any]:
+    """
+    Profiles one field with a single aggregate VDS query.
+
+    If the combined query is rejected (e.g. calculations are not allowed on the datasource),
+    only the distinct count is fetched.
+
+    Returns:
+        Dict[str, Any]: {"cardinality", "min", "max", "null_rate", "rows"}; unknown values are None.
+    """
+    try:
+        output = query_vds(api_key=api_key, datasource_luid=datasource_luid, url=url, query=profile_query(caption))
+        row = (output.get('data') or [{}])[0]
+        cardinality, minimum, maximum, nulls, rows = (row.get(key) for key in ('countd', 'min', 'max', 'nulls', 'rows'))
+    except RuntimeError as e:
+        if not is_query_rejected(e):
+            raise
+        output = query_vds(
+            api_key=api_key,
+            datasource_luid=datasource_luid,
+            url=url,
+            query={'fields': [{'fieldCaption': caption, 'function': 'COUNTD'}]}
+        )
+        row = (output.get('data') or [{}])[0]
+        cardinality, minimum, maximum, nulls, rows = next(iter(row.values()), None), None, None, None, None
+    return {
+        "cardinality": cardinality,
+        "min": minimum,
+        "max": maximum,
+        "null_rate": round(nulls / rows, 4) if nulls is not None and rows else None,
+        "rows": rows
+    }
+
+
+def get_field_profiles(
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    datasource_metadata: Optional[Dict[str, Any]] = None,
+    timeout: float = PROFILE_TIMEOUT_SECONDS
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns cardinality, range and null-rate profiles for every field of a datasource.
+
+    Fields are profiled in parallel, at most PROFILE_MAX_WORKERS queries at a time. Profiles are
+    cached per datasource metadata version; fields that did not finish within `timeout` are
+    missing from the result and are retried on the next call.
+
+    Args:
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        datasource_luid (str): The unique identifier of the datasource.
+        datasource_metadata (Optional[Dict[str, Any]]): A `query_vds_metadata` response, fetched if omitted.
+        timeout (float): Seconds to wait for the profiling queries.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Profile per field caption.
+    """
+    if datasource_metadata is None:
+        datasource_metadata = query_vds_metadata(api_key=api_key, datasource_luid=datasource_luid, url=url)
+    fields = [f for f in datasource_metadata.get('data', []) if f.get('dataType') in _PROFILED_TYPES]
+    version = metadata_version([(f.get('fieldCaption'), f.get('dataType')) for f in fields])
+
+    cache_key = (datasource_luid, version)
+    profiles: Dict[str, Dict[str, Any]] = dict(profile_cache.get(cache_key) or {})
+    pending = [f for f in fields if f['fieldCaption'] not in profiles]
+
+    if pending:
+        executor = ThreadPoolExecutor(max_workers=min(PROFILE_MAX_WORKERS, len(pending)))
+        futures = {
+            # run in a copy of the caller's context so the upstream priority class carries over
+            executor.submit(contextvars.copy_context().run, profile_field, api_key, url, datasource_luid, f['fieldCaption']): f
+            for f in pending
+        }
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in done:
+            field = futures[future]
+            try:
+                profile = future.result()
+            except UpstreamBusyError:
+                continue  # dropped or cancelled by the scheduler; retried on the next call
+            except Exception as e:
+                logging.warning(f"[Profile] Failed to profile '{field['fieldCaption']}': {str(e)}")
+                continue
+            profile['dataType'] = field.get('dataType')
+            profiles[field['fieldCaption']] = profile
+        profile_cache.set(cache_key, profiles)
+
+    _latest_profiles.set(datasource_luid, profiles)
+    return profiles
+
+
+_background: Optional[ThreadPoolExecutor] = None
+_background_lock = threading.Lock()
+_profiling: set = set()
+
+
+def profile_in_background(
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    datasource_metadata: Dict[str, Any],
+    on_done: Optional[Callable[[str], None]] = None
+) -> bool:
+    """
+    Profiles a datasource on a background thread in the scheduler's background class.
+
+    At most one run per datasource is queued at a time. `on_done(datasource_luid)` is called
+    when the run added profiles, so callers can drop anything built from the earlier ones.
+
+    Returns:
+        bool: True if a run was queued, False if one is already pending for the datasource.
+    """
+    global _background
+    with _background_lock:
+        if datasource_luid in _profiling:
+            return False
+        _profiling.add(datasource_luid)
+        if _background is None:
+            _background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile")
+    _background.submit(_profile_run, api_key, url, datasource_luid, copy.deepcopy(datasource_metadata), on_done)
+    return True
+
+
+def _profile_run(
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    datasource_metadata: Dict[str, Any],
+    on_done: Optional[Callable[[str], None]]
+):
+    known = len(cached_field_profiles(datasource_luid))
+    try:
+        with request_priority(BACKGROUND):
+            profiles = get_field_profiles(
+                api_key=api_key,
+                url=url,
+                datasource_luid=datasource_luid,
+                datasource_metadata=datasource_metadata
+            )
+    except Exception as e:
+        logging.warning(f"[Profile] Background profiling of {datasource_luid} failed: {str(e)}")
+        return
+    finally:
+        with _background_lock:
+            _profiling.discard(datasource_luid)
+    if on_done and len(profiles) > known:
+        on_done(datasource_luid)
+
+
+def cached_field_profiles(datasource_luid: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the most recent profiles of a datasource without any upstream call (empty if none).
+    """
+    return _latest_profiles.get(datasource_luid) or {}
+
+
+def _parse_date(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return None
+
+
+def _date_span_days(profile: Dict[str, Any], query_filter: Optional[Dict[str, Any]]) -> Optional[float]:
+    start, end = _parse_date(profile.get('min')), _parse_date(profile.get('max'))
+    if query_filter:
+        if query_filter.get('filterType') == 'QUANTITATIVE_DATE':
+            start = _parse_date(query_filter.get('minDate')) or start
+            end = _parse_date(query_filter.get('maxDate')) or end
+        elif query_filter.get('filterType') == 'DATE':
+            period = _PERIOD_DAYS.get(query_filter.get('periodType'), 1)
+            count = query_filter.get('rangeN') if query_filter.get('dateRangeType') in ('LASTN', 'NEXTN') else 1
+            return max(period * (count or 1), 1)
+    if start is None or end is None:
+        return None
+    return max((end - start).days + 1, 1)
+
+
+def estimate_result_rows(profiles: Dict[str, Dict[str, Any]], query: Dict[str, Any]) -> Optional[int]:
+    """
+    Estimates how many rows a VDS query will return from cached field profiles.
+
+    Every non-aggregated field (a dimension, or a date with a date function) multiplies the
+    estimate by its expected distinct values after filters; aggregated measures do not. The
+    result is capped by the datasource row count when it is known.
+
+    Args:
+        profiles (Dict[str, Dict[str, Any]]): Field profiles as returned by `get_field_profiles`.
+        query (Dict[str, Any]): A VDS query.
+
+    Returns:
+        Optional[int]: The estimated row count, or None if a dimension has no profile.
+    """
+    filters = {}
+    top_n = {}
+    for query_filter in query.get('filters') or []:
+        caption = (query_filter.get('field') or {}).get('fieldCaption')
+        if query_filter.get('filterType') == 'TOP':
+            top_n[caption] = query_filter.get('howMany')
+        elif caption:
+            filters[caption] = query_filter
+
+    estimate = 1
+    max_rows = None
+    for field in query.get('fields') or []:
+        caption = field.get('fieldCaption')
+        function = field.get('function')
+        if field.get('calculation') or (function and function not in _DATE_PART_CARDINALITY and function not in _DATE_TRUNC_DAYS):
+            continue  # aggregated measure or calculation
+        profile = profiles.get(caption)
+        if profile is None:
+            return None
+        max_rows = profile.get('rows') or max_rows
+        distinct = profile.get('cardinality') or 1
+        query_filter = filters.get(caption)
+
+        if function in _DATE_PART_CARDINALITY:
+            distinct = min(distinct, _DATE_PART_CARDINALITY[function])
+        elif function in _DATE_TRUNC_DAYS or profile.get('dataType') in ('DATE', 'DATETIME'):
+            span = _date_span_days(profile, query_filter)
+            if span is not None:
+                distinct = min(distinct, max(int(span / _DATE_TRUNC_DAYS.get(function, 1)) + 1, 1))
+        elif query_filter and query_filter.get('filterType') == 'SET':
+            values = len(query_filter.get('values') or [])
+            distinct = max(distinct - values, 1) if query_filter.get('exclude') in (True, 'true') else min(distinct, values)
+
+        if caption in top_n and top_n[caption]:
+            distinct = min(distinct, top_n[caption])
+        estimate *= max(distinct, 1)
+
+    if max_rows:
+        estimate = min(estimate, max_rows)
+    return int(estimate)
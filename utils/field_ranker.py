@@ -0,0 +1,143 @@
+import os
+import json
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.text_index import BM25Index, tokenize, estimate_tokens
+
+
+# Token budget for data_dictionary + data_model in the prompt; 0 disables pruning.
+PROMPT_FIELD_TOKEN_BUDGET = int(os.getenv("PROMPT_FIELD_TOKEN_BUDGET", "6000"))
+
+_CAPTION_RE = re.compile(r'"fieldCaption"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def load_field_synonyms(path: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Loads administrator-maintained field synonyms, a JSON object of {caption: [synonym, ...]}.
+
+    Args:
+        path (Optional[str]): File to read; defaults to the FIELD_SYNONYMS_PATH environment variable.
+
+    Returns:
+        Dict[str, List[str]]: Synonyms per field caption, empty if no file is configured.
+    """
+    path = path or os.getenv("FIELD_SYNONYMS_PATH")
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+FIELD_SYNONYMS = load_field_synonyms()
+
+
+def referenced_captions(payload: Any) -> set:
+    """
+    Extracts every fieldCaption used in a VDS query, given as a dict or as JSON text.
+    """
+    if not payload:
+        return set()
+    text = payload if isinstance(payload, str) else json.dumps(payload)
+    return {json.loads(f'"{caption}"') for caption in _CAPTION_RE.findall(text)}
+
+
+class FieldIndex:
+    """
+    Relevance index over the fields of one datasource.
+
+    Each field is the union of its data dictionary entry (name, description) and its VDS data
+    model entry (caption, data type, sample values) plus any configured synonyms. The index and
+    the token cost of every entry are computed once per cached datasource.
+    """
+
+    def __init__(
+        self,
+        data_dictionary: List[Dict[str, Any]],
+        data_model: List[Dict[str, Any]],
+        synonyms: Optional[Dict[str, List[str]]] = None
+    ):
+        synonyms = FIELD_SYNONYMS if synonyms is None else synonyms
+        self.data_dictionary = data_dictionary
+        self.data_model = data_model
+
+        self.captions: List[str] = []
+        positions: Dict[str, int] = {}
+
+        def position(caption: str) -> int:
+            if caption not in positions:
+                positions[caption] = len(self.captions)
+                self.captions.append(caption)
+            return positions[caption]
+
+        self.dictionary_of = [position(item.get("name", "")) for item in data_dictionary]
+        self.model_of = [position(item.get("fieldCaption", "")) for item in data_model]
+
+        texts: List[List[str]] = [[] for _ in self.captions]
+        self.costs = [0] * len(self.captions)
+        for items, owners in ((data_dictionary, self.dictionary_of), (data_model, self.model_of)):
+            for item, field_id in zip(items, owners):
+                texts[field_id].extend(tokenize(" ".join(str(v) for v in item.values() if v is not None)))
+                self.costs[field_id] += estimate_tokens(json.dumps(item))
+        for field_id, caption in enumerate(self.captions):
+            # captions are weighted twice so a direct name hit outranks a description mention
+            texts[field_id].extend(tokenize(caption))
+            for synonym in synonyms.get(caption, []):
+                texts[field_id].extend(tokenize(synonym))
+
+        self.index = BM25Index(texts)
+        self.total_cost = sum(self.costs)
+
+    def prune(
+        self,
+        task: str,
+        token_budget: int = PROMPT_FIELD_TOKEN_BUDGET,
+        keep: Optional[set] = None
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Keeps the fields most relevant to the task within the token budget.
+
+        Fields named in `keep` (e.g. those referenced by the previous VDS payload) are always
+        retained; the rest are taken by descending relevance until the budget is spent. Both
+        lists keep their original order.
+
+        Args:
+            task (str): The user task to rank fields against.
+            token_budget (int): Maximum estimated tokens for dictionary + data model entries.
+            keep (Optional[set]): Field captions that must not be dropped.
+
+        Returns:
+            Tuple: (data_dictionary, data_model, report) where the report holds the number of
+            fields and estimated tokens that were dropped.
+        """
+        if token_budget <= 0 or self.total_cost <= token_budget:
+            return self.data_dictionary, self.data_model, _report(len(self.captions), 0, 0)
+
+        keep = keep or set()
+        scores = self.index.scores(tokenize(task))
+        order = sorted(
+            range(len(self.captions)),
+            key=lambda i: (self.captions[i] not in keep, -scores[i], i)
+        )
+
+        kept = set()
+        spent = 0
+        for field_id in order:
+            pinned = self.captions[field_id] in keep
+            if not pinned and spent + self.costs[field_id] > token_budget:
+                continue
+            kept.add(field_id)
+            spent += self.costs[field_id]
+
+        data_dictionary = [item for item, i in zip(self.data_dictionary, self.dictionary_of) if i in kept]
+        data_model = [item for item, i in zip(self.data_model, self.model_of) if i in kept]
+        dropped = len(self.captions) - len(kept)
+        return data_dictionary, data_model, _report(len(kept), dropped, self.total_cost - spent)
+
+
+def _report(kept: int, dropped: int, tokens_dropped: int) -> Dict[str, Any]:
+    return {
+        "fields_kept": kept,
+        "fields_dropped": dropped,
+        "tokens_dropped": tokens_dropped
+    }
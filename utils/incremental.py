@@ -0,0 +1,228 @@
+import os
+import copy
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.columnar import ColumnarResult
+from utils.vizql_data_service import _add_months, query_vds_columnar, resolve_column, VDS_STREAM_MAX_ROWS
+
+
+INCREMENTAL_LOOKBACK_PERIODS = int(os.getenv("INCREMENTAL_LOOKBACK_PERIODS", "1"))
+
+# Grain of a date field by its function; an untruncated date groups by day
+_GRAIN = {None: "DAYS", "TRUNC_DAY": "DAYS", "TRUNC_WEEK": "WEEKS", "TRUNC_MONTH": "MONTHS", "TRUNC_QUARTER": "QUARTERS", "TRUNC_YEAR": "YEARS"}
+_STEP_MONTHS = {"MONTHS": 1, "QUARTERS": 3, "YEARS": 12}
+# Relative filter period types whose window starts on a boundary of the given grain
+_ALIGNED = {
+    "DAYS": {"DAYS", "WEEKS", "MONTHS", "QUARTERS", "YEARS"},
+    "WEEKS": {"WEEKS"},
+    "MONTHS": {"MONTHS", "QUARTERS", "YEARS"},
+    "QUARTERS": {"QUARTERS", "YEARS"},
+    "YEARS": {"YEARS"},
+}
+
+
+def _parse_date(value: Any) -> Optional[date]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+def _period_start(day: date, period: str, week_start: int) -> date:
+    if period == "DAYS":
+        return day
+    if period == "WEEKS":
+        return day - timedelta(days=(day.weekday() - week_start) % 7)
+    step = _STEP_MONTHS[period]
+    return date(day.year, ((day.month - 1) // step) * step + 1, 1)
+
+
+def _shift(day: date, period: str, n: int) -> date:
+    if period == "DAYS":
+        return day + timedelta(days=n)
+    if period == "WEEKS":
+        return day + timedelta(weeks=n)
+    return _add_months(day, n * _STEP_MONTHS[period])
+
+
+def relative_window(date_filter: Dict[str, Any], week_start: int, today: date) -> Optional[Tuple[date, date]]:
+    """
+    Absolute [start, end] dates of a relative DATE filter; "last N" periods include the current one.
+    Returns None for future windows (NEXT, NEXTN) and unknown period types.
+    """
+    period = date_filter.get('periodType')
+    if period not in _ALIGNED:
+        return None
+    anchor = _parse_date(date_filter.get('anchorDate')) or today
+    current = _period_start(anchor, period, week_start)
+    current_end = _shift(current, period, 1) - timedelta(days=1)
+    kind = date_filter.get('dateRangeType')
+    if kind == 'CURRENT':
+        return current, current_end
+    if kind == 'LAST':
+        return _shift(current, period, -1), current - timedelta(days=1)
+    if kind == 'LASTN':
+        return _shift(current, period, -(int(date_filter.get('rangeN') or 1) - 1)), current_end
+    if kind == 'TODATE':
+        return current, anchor
+    return None
+
+
+def plan_trailing_refresh(
+    query: Dict[str, Any],
+    cached: ColumnarResult,
+    today: Optional[date] = None,
+    lookback: int = INCREMENTAL_LOOKBACK_PERIODS
+) -> Optional[Tuple[Dict[str, Any], str, date, Optional[date]]]:
+    """
+    Plans the re-query of only the trailing periods of a cached time series.
+
+    The query must group by a date field, untruncated or truncated with TRUNC_DAY ... TRUNC_YEAR,
+    so every row belongs to one period. The latest cached period and `lookback` periods before
+    it may still change; the returned query fetches just those (and any newer ones) by narrowing
+    the date filter on that field: a QUANTITATIVE_DATE RANGE/MIN filter gets a later minDate, a
+    relative DATE filter becomes the equivalent absolute range, and without a filter a MIN filter
+    is added. Relative windows must start on a period boundary of the grouping, so the first
+    period is never partial.
+
+    Args:
+        query (Dict[str, Any]): The cached VDS query.
+        cached (ColumnarResult): Its cached result.
+        today (Optional[date]): Anchor for relative filters; defaults to the current date.
+        lookback (int): Closed periods to re-query besides the latest one, for late-arriving data.
+
+    Returns:
+        Optional[Tuple]: (trailing query, date column, cutoff, window start) where cached rows from
+        `window start` (if any) up to `cutoff` are kept, or None if the query is not eligible.
+    """
+    filters = query.get('filters') or []
+    if cached.truncated or any(f.get('filterType') == 'TOP' for f in filters):
+        return None
+    today = today or date.today()
+
+    for field in query.get('fields', []):
+        if field.get('calculation') or field.get('function') not in _GRAIN:
+            continue
+        caption = field['fieldCaption']
+        date_filters = [f for f in filters if (f.get('field') or {}).get('fieldCaption') == caption]
+        if len(date_filters) > 1 or (field.get('function') is None and not date_filters):
+            continue
+        column = resolve_column(field, cached.names)
+        if column not in cached.names:
+            continue
+        values = cached.column_values(column)
+        parsed = [_parse_date(v) for v in values]
+        if any(d is None and v is not None for d, v in zip(parsed, values)):
+            continue
+        periods = sorted({d for d in parsed if d is not None})
+        if len(periods) < lookback + 2:
+            return None
+        cutoff = periods[-(lookback + 1)]
+        grain = _GRAIN[field.get('function')]
+        week_start = periods[-1].weekday() if grain == "WEEKS" else 6
+
+        trailing = copy.deepcopy(query)
+        window_start = None
+        if not date_filters:
+            if any(d is None for d in parsed):
+                return None
+            trailing.setdefault('filters', []).append({
+                'field': {'fieldCaption': caption},
+                'filterType': 'QUANTITATIVE_DATE',
+                'quantitativeFilterType': 'MIN',
+                'minDate': cutoff.isoformat()
+            })
+            return trailing, column, cutoff, window_start
+
+        position = filters.index(date_filters[0])
+        date_filter = trailing['filters'][position]
+        if date_filter.get('includeNulls'):
+            return None
+        if date_filter.get('filterType') == 'QUANTITATIVE_DATE' and date_filter.get('quantitativeFilterType') in ('RANGE', 'MIN'):
+            lower = _parse_date(date_filter.get('minDate'))
+            date_filter['minDate'] = max(lower, cutoff).isoformat() if lower else cutoff.isoformat()
+            return trailing, column, cutoff, window_start
+        if date_filter.get('filterType') == 'DATE' and date_filter.get('periodType') in _ALIGNED[grain]:
+            window = relative_window(date_filter, week_start, today)
+            if window is None:
+                return None
+            window_start, window_end = window
+            trailing['filters'][position] = {
+                'field': date_filter['field'],
+                'filterType': 'QUANTITATIVE_DATE',
+                'quantitativeFilterType': 'RANGE',
+                'minDate': max(window_start, cutoff).isoformat(),
+                'maxDate': window_end.isoformat()
+            }
+            return trailing, column, cutoff, window_start
+        return None
+    return None
+
+
+def splice_trailing(
+    query: Dict[str, Any],
+    cached: ColumnarResult,
+    fresh: ColumnarResult,
+    column: str,
+    cutoff: date,
+    window_start: Optional[date] = None
+) -> Optional[ColumnarResult]:
+    """
+    Replaces the trailing periods of a cached result with freshly fetched rows.
+
+    Returns:
+        Optional[ColumnarResult]: The spliced result, or None if the fresh rows have other columns.
+    """
+    if len(fresh) and fresh.names != cached.names:
+        return None
+    kept: List[int] = []
+    for i, value in enumerate(cached.column_values(column)):
+        day = _parse_date(value)
+        if day is not None and day < cutoff and (window_start is None or day >= window_start):
+            kept.append(i)
+    head = cached.take(kept)
+    data = {
+        name: head.column_values(name) + (fresh.column_values(name) if len(fresh) else [])
+        for name in cached.names
+    }
+    result = ColumnarResult.from_columns(data)
+
+    sort_fields = sorted((f for f in query.get('fields', []) if f.get('sortPriority') is not None), key=lambda f: f['sortPriority'])
+    if sort_fields:
+        result = result.take(result.sort_indices(
+            [resolve_column(f, result.names) for f in sort_fields],
+            [f.get('sortDirection', 'ASC') == 'DESC' for f in sort_fields]
+        ))
+    return result
+
+
+def refresh_trailing(
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    query: Dict[str, Any],
+    cached: ColumnarResult
+) -> Optional[ColumnarResult]:
+    """
+    Refreshes an expired time-series result by re-querying only its trailing periods.
+
+    Returns:
+        Optional[ColumnarResult]: The refreshed result, or None if the query has to be re-run in full.
+    """
+    plan = plan_trailing_refresh(query, cached)
+    if plan is None:
+        return None
+    trailing, column, cutoff, window_start = plan
+    fresh = query_vds_columnar(
+        api_key=api_key,
+        datasource_luid=datasource_luid,
+        url=url,
+        query=trailing,
+        max_rows=VDS_STREAM_MAX_ROWS
+    )
+    if fresh.truncated:
+        return None
+    return splice_trailing(query, cached, fresh, column, cutoff, window_start)
@@ -0,0 +1,292 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from utils.columnar import ColumnarResult
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the pure Python column loops are used without it
+    np = None
+
+
+_COMPARATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    "in": lambda a, b: a in b,
+    "not_in": lambda a, b: a not in b,
+    "contains": lambda a, b: a is not None and str(b).lower() in str(a).lower(),
+    "starts_with": lambda a, b: a is not None and str(a).lower().startswith(str(b).lower()),
+    "is_null": lambda a, b: a is None,
+    "not_null": lambda a, b: a is not None,
+}
+
+
+def _require(result: ColumnarResult, names: Sequence[str]):
+    for name in names:
+        if name not in result.names:
+            raise ValueError(f"Unknown column '{name}'. Available columns: {result.names}")
+
+
+def filter_rows(result: ColumnarResult, column: str, operator: str, value: Any = None) -> ColumnarResult:
+    _require(result, [column])
+    if operator not in _COMPARATORS:
+        raise ValueError(f"Unknown operator '{operator}', expected one of {list(_COMPARATORS)}")
+    source = result.column(column)
+    if np is not None and source.is_numeric and operator in ("==", "!=", ">", ">=", "<", "<=") \
+            and isinstance(value, (int, float)) and not isinstance(value, bool):
+        values = result.to_numpy(column)
+        mask = {"==": values == value, "!=": values != value, ">": values > value,
+                ">=": values >= value, "<": values < value, "<=": values <= value}[operator]
+        nulls = np.frombuffer(bytes(source.nulls[result.start:result.stop]), dtype=np.uint8).astype(bool)
+        mask &= ~nulls if operator != "!=" else True
+        return result.take(np.flatnonzero(mask).tolist())
+    test = _COMPARATORS[operator]
+    if operator in ("in", "not_in"):
+        value = set(value if isinstance(value, (list, tuple, set)) else [value])
+    return result.take([i for i, v in enumerate(result.column_values(column)) if test(v, value)])
+
+
+def sort_rows(result: ColumnarResult, by: Sequence[str], descending=False) -> ColumnarResult:
+    _require(result, by)
+    return result.take(result.sort_indices(by, descending))
+
+
+def top_rows(result: ColumnarResult, n: int, by: Optional[str] = None, descending: bool = True) -> ColumnarResult:
+    if by is None:
+        return result[:n]
+    _require(result, [by])
+    return result.take(result.sort_indices([by], descending)[:n])
+
+
+def _aggregate_values(function: str, values: List[Any]) -> Any:
+    present = [v for v in values if v is not None]
+    if function == "COUNT":
+        return len(present)
+    if function == "COUNTD":
+        return len(set(present))
+    if not present:
+        return None
+    if function == "SUM":
+        return sum(present)
+    if function == "MIN":
+        return min(present)
+    if function == "MAX":
+        return max(present)
+    if function == "AVG":
+        return sum(present) / len(present)
+    if function == "MEDIAN":
+        ordered = sorted(present)
+        middle = len(ordered) // 2
+        return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+    raise ValueError(f"Unsupported aggregation '{function}'")
+
+
+def group_by(result: ColumnarResult, by: Sequence[str], aggregations: Sequence[Dict[str, str]]) -> ColumnarResult:
+    """
+    Groups rows by the `by` columns and aggregates other columns per group.
+
+    Args:
+        result (ColumnarResult): The input rows.
+        by (Sequence[str]): Grouping columns; may be empty to aggregate everything into one row.
+        aggregations (Sequence[Dict[str, str]]): Items of {"column", "function", "as"}; functions are
+            SUM, MIN, MAX, COUNT, COUNTD, AVG and MEDIAN.
+
+    Returns:
+        ColumnarResult: One row per group, in order of first appearance.
+    """
+    _require(result, list(by) + [a["column"] for a in aggregations])
+    keys = list(zip(*(result.column_values(name) for name in by))) if by else [()] * len(result)
+    group_of: Dict[tuple, int] = {}
+    ids = [group_of.setdefault(key, len(group_of)) for key in keys]
+    groups = list(group_of)
+
+    output: Dict[str, List[Any]] = {name: [key[i] for key in groups] for i, name in enumerate(by)}
+    for aggregation in aggregations:
+        function = aggregation["function"].upper()
+        name = aggregation.get("as") or f"{function}({aggregation['column']})"
+        source = result.column(aggregation["column"])
+        if np is not None and function in ("SUM", "COUNT") and source.is_numeric and groups:
+            values = result.to_numpy(aggregation["column"])
+            nulls = np.frombuffer(bytes(source.nulls[result.start:result.stop]), dtype=np.uint8).astype(bool)
+            weights = np.where(nulls, 0, values if function == "SUM" else 1)
+            group_ids = np.asarray(ids, dtype=np.int64)
+            totals = np.bincount(group_ids, weights=weights, minlength=len(groups))
+            present = np.bincount(group_ids, weights=~nulls, minlength=len(groups))
+            output[name] = [
+                None if function == "SUM" and not n else int(t) if source.kind == "int" or function == "COUNT" else float(t)
+                for t, n in zip(totals, present)
+            ]
+            continue
+        buckets: List[List[Any]] = [[] for _ in groups]
+        for group_id, value in zip(ids, result.column_values(aggregation["column"])):
+            buckets[group_id].append(value)
+        output[name] = [_aggregate_values(function, bucket) for bucket in buckets]
+    return ColumnarResult.from_columns(output)
+
+
+def percent_of_total(result: ColumnarResult, column: str, name: Optional[str] = None, within: Sequence[str] = ()) -> ColumnarResult:
+    """
+    Adds a column with each row's share of the column total, overall or within groups.
+    """
+    _require(result, [column, *within])
+    values = result.column_values(column)
+    keys = list(zip(*(result.column_values(c) for c in within))) if within else [()] * len(values)
+    totals: Dict[tuple, float] = {}
+    for key, value in zip(keys, values):
+        totals[key] = totals.get(key, 0) + (value or 0)
+    shares = [
+        None if value is None or not totals[key] else round(100.0 * value / totals[key], 4)
+        for key, value in zip(keys, values)
+    ]
+    data = {n: result.column_values(n) for n in result.names}
+    data[name or f"% of total {column}"] = shares
+    return ColumnarResult.from_columns(data)
+
+
+def pivot(result: ColumnarResult, index: Sequence[str], columns: str, values: str, function: str = "SUM") -> ColumnarResult:
+    """
+    Spreads the members of `columns` into separate columns holding the aggregated `values`.
+    """
+    _require(result, [*index, columns, values])
+    members = list(dict.fromkeys(result.column_values(columns)))
+    keys = list(zip(*(result.column_values(c) for c in index))) if index else [()] * len(result)
+    cells: Dict[tuple, Dict[Any, List[Any]]] = {}
+    for key, member, value in zip(keys, result.column_values(columns), result.column_values(values)):
+        cells.setdefault(key, {}).setdefault(member, []).append(value)
+    output: Dict[str, List[Any]] = {name: [key[i] for key in cells] for i, name in enumerate(index)}
+    for member in members:
+        output[str(member)] = [
+            _aggregate_values(function.upper(), row[member]) if member in row else None for row in cells.values()
+        ]
+    return ColumnarResult.from_columns(output)
+
+
+def apply_operations(result: ColumnarResult, operations: Sequence[Dict[str, Any]]) -> ColumnarResult:
+    """
+    Applies a pipeline of local operations to a result, never calling Tableau.
+
+    Each operation is a dict with an "op" key:
+      - {"op": "filter", "column", "operator", "value"}; operators: ==, !=, >, >=, <, <=, in, not_in,
+        contains, starts_with, is_null, not_null
+      - {"op": "sort", "by": [...], "descending": bool}
+      - {"op": "top", "n", "by", "descending": bool}
+      - {"op": "group_by", "by": [...], "aggregations": [{"column", "function", "as"}]}
+      - {"op": "percent_of_total", "column", "as", "within": [...]}
+      - {"op": "pivot", "index": [...], "columns", "values", "function"}
+      - {"op": "select", "columns": [...]} and {"op": "limit", "n"}
+
+    Raises:
+        ValueError: For unknown operations, columns or operators.
+    """
+    for operation in operations:
+        op = operation.get("op")
+        if op == "filter":
+            result = filter_rows(result, operation["column"], operation.get("operator", "=="), operation.get("value"))
+        elif op == "sort":
+            result = sort_rows(result, operation["by"], operation.get("descending", False))
+        elif op == "top":
+            result = top_rows(result, int(operation["n"]), operation.get("by"), operation.get("descending", True))
+        elif op == "group_by":
+            result = group_by(result, operation.get("by", []), operation["aggregations"])
+        elif op == "percent_of_total":
+            result = percent_of_total(result, operation["column"], operation.get("as"), operation.get("within", ()))
+        elif op == "pivot":
+            result = pivot(result, operation.get("index", []), operation["columns"], operation["values"], operation.get("function", "SUM"))
+        elif op == "select":
+            _require(result, operation["columns"])
+            result = result.select(operation["columns"])
+        elif op == "limit":
+            result = result[:int(operation["n"])]
+        else:
+            raise ValueError(f"Unknown operation '{op}'")
+    return result
+
+
+def hash_join(
+    left: ColumnarResult,
+    right: ColumnarResult,
+    left_on: Sequence[str],
+    right_on: Sequence[str],
+    how: str = "inner",
+    max_rows: Optional[int] = None
+) -> ColumnarResult:
+    """
+    Joins two results on key columns with a hash table built on the smaller side.
+
+    Keys are compared by their text form, so an integer year from one datasource matches the same
+    year returned as a string by another. The output holds the left columns, then the right
+    columns except its keys; clashing right column names get a " (right)" suffix. Output stops at
+    `max_rows` rows and is then marked truncated.
+
+    Args:
+        left (ColumnarResult): The left input.
+        right (ColumnarResult): The right input.
+        left_on (Sequence[str]): Key columns of the left input.
+        right_on (Sequence[str]): Matching key columns of the right input.
+        how (str): "inner", "left" or "full".
+        max_rows (Optional[int]): Largest number of output rows.
+
+    Returns:
+        ColumnarResult: The joined rows.
+
+    Raises:
+        ValueError: For unknown join types or columns, or key lists of different length.
+    """
+    if how not in ("inner", "left", "full"):
+        raise ValueError(f"Unknown join type '{how}', expected 'inner', 'left' or 'full'")
+    if not left_on or len(left_on) != len(right_on):
+        raise ValueError("left_on and right_on must name the same, non-zero number of key columns")
+    _require(left, left_on)
+    _require(right, right_on)
+
+    def keys(result: ColumnarResult, on: Sequence[str]) -> List[Optional[tuple]]:
+        columns = [result.column_values(name) for name in on]
+        return [None if None in key else tuple(str(v) for v in key) for key in zip(*columns)]
+
+    left_keys, right_keys = keys(left, left_on), keys(right, right_on)
+    build_left = len(left_keys) < len(right_keys) and how == "inner"
+    build, probe = (left_keys, right_keys) if build_left else (right_keys, left_keys)
+    table: Dict[tuple, List[int]] = {}
+    for i, key in enumerate(build):
+        if key is not None:
+            table.setdefault(key, []).append(i)
+
+    pairs: List[tuple] = []
+    matched_right = bytearray(len(right_keys))
+    limit = max_rows if max_rows else float("inf")
+    truncated = False
+    for j, key in enumerate(probe):
+        for i in table.get(key, ()) if key is not None else ():
+            pairs.append((i, j) if build_left else (j, i))
+            matched_right[j if build_left else i] = 1
+        if not build_left and how in ("left", "full") and (key is None or key not in table):
+            pairs.append((j, None))
+        if len(pairs) >= limit:
+            truncated = True
+            break
+    if how == "full" and not truncated:
+        pairs.extend((None, i) for i in range(len(right_keys)) if not matched_right[i])
+        truncated = len(pairs) > limit
+    if truncated:
+        pairs = pairs[:int(limit)]
+
+    data: Dict[str, List[Any]] = {}
+    right_keys_set = set(right_on)
+    for name in left.names:
+        values = left.column_values(name)
+        data[name] = [None if i is None else values[i] for i, _ in pairs]
+    for position, name in enumerate(left_on):
+        # rows only on the right still carry their key values
+        values = right.column_values(right_on[position])
+        data[name] = [v if i is not None or j is None else values[j] for v, (i, j) in zip(data[name], pairs)]
+    for name in right.names:
+        if name in right_keys_set:
+            continue
+        values = right.column_values(name)
+        data[name if name not in data else f"{name} (right)"] = [None if j is None else values[j] for _, j in pairs]
+    joined = ColumnarResult.from_columns(data)
+    joined.truncated = truncated or left.truncated or right.truncated
+    return joined
@@ -0,0 +1,321 @@
+import os
+import sys
+import copy
+import bisect
+import logging
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from utils.vizql_data_service import query_vds, query_vds_metadata
+from utils.simple_datasource_qa import sample_values_query
+from utils.scheduler import BACKGROUND, request_priority
+
+
+MEMBER_INDEX_MAX_MEMBERS = int(os.getenv("MEMBER_INDEX_MAX_MEMBERS", "20000"))
+MEMBER_INDEX_REFRESH_SECONDS = float(os.getenv("MEMBER_INDEX_REFRESH_SECONDS", "3600"))
+MEMBER_INDEX_HOT_THRESHOLD = int(os.getenv("MEMBER_INDEX_HOT_THRESHOLD", "3"))
+MEMBER_INDEX_MIN_SCORE = float(os.getenv("MEMBER_INDEX_MIN_SCORE", "0.45"))
+MEMBER_INDEX_CORRECT_FILTERS = os.getenv("MEMBER_INDEX_CORRECT_FILTERS", "true").lower() in ("1", "true", "yes")
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FieldMembers:
+    """
+    Distinct members of one dimension, stored compactly for fuzzy lookup.
+
+    Members are interned and sorted once; a parallel sorted list of lowercase keys serves exact
+    and prefix lookups by bisection, and a trigram index (member ids packed in arrays) serves
+    fuzzy matching.
+    """
+
+    def __init__(self, members: List[Any]):
+        unique = sorted({sys.intern(str(m)) for m in members if m is not None}, key=str.lower)
+        self.members: Tuple[str, ...] = tuple(unique)
+        self.keys: List[str] = [m.lower() for m in self.members]
+        postings: Dict[str, array] = {}
+        for member_id, key in enumerate(self.keys):
+            for gram in _trigrams(key):
+                postings.setdefault(gram, array("I")).append(member_id)
+        self.trigrams = postings
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __contains__(self, value: Any) -> bool:
+        key = str(value).lower()
+        i = bisect.bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def canonical(self, value: Any) -> Optional[str]:
+        """
+        Returns `value` if it is a member, else its only case variant among the members, else None.
+        """
+        value = str(value)
+        key = value.lower()
+        i = bisect.bisect_left(self.keys, key)
+        variants = []
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.members[i] == value:
+                return value
+            variants.append(self.members[i])
+            i += 1
+        return variants[0] if len(variants) == 1 else None
+
+    def resolve(self, term: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Maps a user term to the closest exact members.
+
+        Exact (case-insensitive) matches score 1.0, prefix matches 0.9, everything else the
+        trigram Jaccard similarity.
+
+        Args:
+            term (str): A user-supplied value such as "west coast" or "furnitur".
+            k (int): Maximum number of candidates.
+
+        Returns:
+            List[Dict[str, Any]]: [{"value": member, "score": float}, ...], best first.
+        """
+        key = str(term).lower().strip()
+        if not key:
+            return []
+        scores: Dict[int, float] = {}
+
+        i = bisect.bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i].startswith(key) and len(scores) < k:
+            scores[i] = 1.0 if self.keys[i] == key else 0.9
+            i += 1
+
+        grams = _trigrams(key)
+        overlap: Counter = Counter()
+        for gram in grams:
+            overlap.update(self.trigrams.get(gram, ()))
+        for member_id, shared in overlap.items():
+            if member_id in scores:
+                continue
+            union = len(grams) + len(_trigrams(self.keys[member_id])) - shared
+            scores[member_id] = shared / union
+
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [{"value": self.members[member_id], "score": round(score, 3)} for member_id, score in best]
+
+
+class MemberIndex:
+    """
+    Process-wide store of FieldMembers per (datasource LUID, field caption).
+
+    Fields whose cardinality exceeds MEMBER_INDEX_MAX_MEMBERS are remembered as too wide so they
+    are not fetched again until the next refresh.
+    """
+    _fields: Dict[Tuple[str, str], Optional[FieldMembers]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, datasource_luid: str, caption: str) -> Optional[FieldMembers]:
+        return cls._fields.get((datasource_luid, caption))
+
+    @classmethod
+    def has(cls, datasource_luid: str, caption: str) -> bool:
+        return (datasource_luid, caption) in cls._fields
+
+    @classmethod
+    def build(cls, api_key: str, url: str, datasource_luid: str, caption: str) -> Optional[FieldMembers]:
+        """
+        Fetches the distinct members of a field through VDS and indexes them.
+
+        At most MEMBER_INDEX_MAX_MEMBERS + 1 members are requested; a field that returns more is
+        treated as high cardinality and not indexed.
+        """
+        output = query_vds(
+            api_key=api_key,
+            datasource_luid=datasource_luid,
+            url=url,
+            query=sample_values_query(caption, MEMBER_INDEX_MAX_MEMBERS + 1)
+        )
+        values = [next(iter(row.values()), None) for row in (output or {}).get('data', [])]
+        members = FieldMembers(values) if len(values) <= MEMBER_INDEX_MAX_MEMBERS else None
+        with cls._lock:
+            cls._fields[(datasource_luid, caption)] = members
+        return members
+
+    @classmethod
+    def get_or_build(cls, api_key: str, url: str, datasource_luid: str, caption: str) -> Optional[FieldMembers]:
+        if cls.has(datasource_luid, caption):
+            return cls.get(datasource_luid, caption)
+        return cls.build(api_key, url, datasource_luid, caption)
+
+    @classmethod
+    def invalidate(cls, datasource_luid: str):
+        with cls._lock:
+            for key in [key for key in cls._fields if key[0] == datasource_luid]:
+                del cls._fields[key]
+
+
+def resolve_filter_values(
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    caption: str,
+    terms: List[str],
+    k: int = 5
+) -> Dict[str, Any]:
+    """
+    Resolves fuzzy user terms to exact members of a dimension.
+
+    Args:
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        datasource_luid (str): The unique identifier of the datasource.
+        caption (str): Caption of the dimension.
+        terms (List[str]): User terms to resolve.
+        k (int): Candidates per term.
+
+    Returns:
+        Dict[str, Any]: Candidates per term, or an "error" key if the field cannot be indexed.
+    """
+    members = MemberIndex.get_or_build(api_key, url, datasource_luid, caption)
+    if members is None:
+        return {"error": f"'{caption}' has more than {MEMBER_INDEX_MAX_MEMBERS} members and is not indexed"}
+    return {term: members.resolve(term, k) for term in terms}
+
+
+def correct_filter_values(datasource_luid: str, query: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Replaces guessed SET filter values with the closest indexed members, and suggests members
+    for MATCH filter patterns that match none.
+
+    SET values that are members are kept as they are; a value differing only in case becomes
+    the member when that is unambiguous. MATCH patterns are compared case-insensitively and are
+    never rewritten, since replacing a pattern by one member would narrow the filter.
+
+    Only already indexed fields are considered, so this never calls upstream. The input query is
+    left untouched.
+
+    Args:
+        datasource_luid (str): The unique identifier of the datasource.
+        query (Dict[str, Any]): A VDS query.
+
+    Returns:
+        Tuple: (possibly corrected query, list of {"field", "from", "to"} corrections and
+        {"field", "from", "suggestions"} entries for MATCH patterns).
+    """
+    corrections: List[Dict[str, Any]] = []
+    filters = query.get('filters') if isinstance(query, dict) else None
+    if not MEMBER_INDEX_CORRECT_FILTERS or not filters:
+        return query, corrections
+
+    corrected = copy.deepcopy(query)
+    changed = False
+    for query_filter in corrected['filters']:
+        caption = (query_filter.get('field') or {}).get('fieldCaption')
+        members = MemberIndex.get(datasource_luid, caption) if caption else None
+        if not members:
+            continue
+
+        if query_filter.get('filterType') == 'SET':
+            values = []
+            for value in query_filter.get('values', []):
+                if isinstance(value, str):
+                    member = members.canonical(value)
+                    if member is None and value not in members:
+                        best = members.resolve(value, 1)
+                        if best and best[0]['score'] >= MEMBER_INDEX_MIN_SCORE:
+                            member = best[0]['value']
+                    if member is not None and member != value:
+                        corrections.append({"field": caption, "from": value, "to": member})
+                        value = member
+                        changed = True
+                values.append(value)
+            query_filter['values'] = values
+
+        elif query_filter.get('filterType') == 'MATCH':
+            for key, test in (('contains', str.__contains__), ('startsWith', str.startswith), ('endsWith', str.endswith)):
+                pattern = query_filter.get(key)
+                if not isinstance(pattern, str) or any(test(k, pattern.lower()) for k in members.keys):
+                    continue
+                best = [c['value'] for c in members.resolve(pattern, 3) if c['score'] >= MEMBER_INDEX_MIN_SCORE]
+                if best:
+                    corrections.append({"field": caption, "from": pattern, "suggestions": best})
+
+    return (corrected if changed else query), corrections
+
+
+class MemberIndexer:
+    """
+    Background job keeping member indexes warm for hot datasources.
+
+    A datasource is hot when it is listed in MEMBER_INDEX_DATASOURCES or has been touched at
+    least MEMBER_INDEX_HOT_THRESHOLD times. Every MEMBER_INDEX_REFRESH_SECONDS the job reads the
+    datasource metadata and (re)indexes its STRING fields.
+    """
+    _hits: Counter = Counter()
+    _thread: Optional[threading.Thread] = None
+    _stop = threading.Event()
+    _credentials: Optional[Callable[[], Tuple[str, str]]] = None
+
+    @classmethod
+    def touch(cls, datasource_luid: str):
+        cls._hits[datasource_luid] += 1
+
+    @classmethod
+    def hot_datasources(cls) -> List[str]:
+        configured = [luid.strip() for luid in os.getenv("MEMBER_INDEX_DATASOURCES", "").split(",") if luid.strip()]
+        touched = [luid for luid, hits in cls._hits.most_common() if hits >= MEMBER_INDEX_HOT_THRESHOLD]
+        return list(dict.fromkeys(configured + touched))
+
+    @classmethod
+    def refresh(cls, api_key: str, url: str, datasource_luid: str):
+        metadata = query_vds_metadata(api_key=api_key, datasource_luid=datasource_luid, url=url)
+        MemberIndex.invalidate(datasource_luid)
+        for field in metadata.get('data', []):
+            if field.get('dataType') != 'STRING' or cls._stop.is_set():
+                continue
+            try:
+                MemberIndex.build(api_key, url, datasource_luid, field['fieldCaption'])
+            except Exception as e:
+                logging.warning(f"[MemberIndex] Failed to index '{field.get('fieldCaption')}': {str(e)}")
+
+    @classmethod
+    def start(cls, credentials: Callable[[], Tuple[str, str]]):
+        """
+        Starts the background job.
+
+        Args:
+            credentials (Callable[[], Tuple[str, str]]): Returns a valid (api_key, url) pair.
+        """
+        if cls._thread and cls._thread.is_alive():
+            return
+        cls._credentials = credentials
+        cls._stop.clear()
+        cls._thread = threading.Thread(target=cls._run, name="member-indexer", daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls):
+        cls._stop.set()
+
+    @classmethod
+    def _run(cls):
+        refreshed: Dict[str, float] = {}
+        while not cls._stop.is_set():
+            for datasource_luid in cls.hot_datasources():
+                if time.monotonic() - refreshed.get(datasource_luid, float("-inf")) < MEMBER_INDEX_REFRESH_SECONDS:
+                    continue
+                try:
+                    api_key, url = cls._credentials()
+                    with request_priority(BACKGROUND):
+                        cls.refresh(api_key, url, datasource_luid)
+                    print(f"[MemberIndex] Indexed members for datasource {datasource_luid}.")
+                except Exception as e:
+                    logging.warning(f"[MemberIndex] Refresh failed for {datasource_luid}: {str(e)}")
+                refreshed[datasource_luid] = time.monotonic()
+                if cls._stop.is_set():
+                    break
+            cls._stop.wait(30)
@@ -1,7 +1,8 @@
 import json
 import requests
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from utils.utils import http_post
+from utils.scheduler import UpstreamScheduler
 
 
 def get_datasources_query():
@@ -37,6 +38,19 @@ def get_datasource_query(luid):
 
     return query
 
+def get_extract_refresh_query(luid):
+    query = f"""
+    query ExtractRefresh {{
+      publishedDatasources(filter: {{ luid: "{luid}" }}) {{
+        hasExtracts
+        extractLastRefreshTime
+        extractLastUpdateTime
+      }}
+    }}
+    """
+
+    return query
+
 
 async def get_data_dictionary_async(api_key: str, domain: str, datasource_luid: str) -> Dict[str, Any]:
     """
@@ -61,7 +75,8 @@ async def get_data_dictionary_async(api_key: str, domain: str, datasource_luid:
     print("Request Headers:", headers)
 
     payload = { "query": query }
-    response = await http_post(endpoint=full_url, headers=headers, payload=payload)
+    async with UpstreamScheduler.aslot():
+        response = await http_post(endpoint=full_url, headers=headers, payload=payload)
     if response['status'] == 200:
         return response['data']
     else:
@@ -92,7 +107,8 @@ def get_datasources(api_key: str, domain: str) -> Dict[str, Any]:
     print("Request Headers:", headers)
 
     payload = { "query": query }
-    response = requests.post(full_url, headers=headers, json=payload)
+    with UpstreamScheduler.slot():
+        response = requests.post(full_url, headers=headers, json=payload)
     response.raise_for_status()
     return response.json()
 
@@ -118,6 +134,39 @@ def get_data_dictionary(api_key: str, domain: str, datasource_luid: str) -> Dict
     print("Request Headers:", headers)
 
     payload = { "query": query }
-    response = requests.post(full_url, headers=headers, json=payload)
+    with UpstreamScheduler.slot():
+        response = requests.post(full_url, headers=headers, json=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_extract_refresh_time(api_key: str, domain: str, datasource_luid: str) -> Optional[str]:
+    """
+    Queries the Tableau Metadata API for the last extract refresh of a datasource.
+
+    Args:
+        api_key (str): The API key for authentication.
+        domain (str): The Tableau domain.
+        datasource_luid (str): The LUID of the Tableau datasource.
+
+    Returns:
+        Optional[str]: ISO timestamp of the last extract refresh or update; None for live connections.
+    """
+    full_url = f"{domain}/api/metadata/graphql"
+    query = get_extract_refresh_query(datasource_luid)
+
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'X-Tableau-Auth': api_key
+    }
+
+    payload = { "query": query }
+    with UpstreamScheduler.slot():
+        response = requests.post(full_url, headers=headers, json=payload)
     response.raise_for_status()
-    return response.json()
\ No newline at end of file
+    datasources = response.json().get('data', {}).get('publishedDatasources') or []
+    if not datasources or not datasources[0].get('hasExtracts'):
+        return None
+    times = [t for t in (datasources[0].get('extractLastRefreshTime'), datasources[0].get('extractLastUpdateTime')) if t]
+    return max(times) if times else None
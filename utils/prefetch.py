@@ -0,0 +1,154 @@
+import os
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.text_index import tokenize
+from utils.prompt_cache import PromptCache
+from utils.field_profile import cached_field_profiles, get_field_profiles
+from utils.member_index import MemberIndex
+from utils.simple_datasource_qa import get_values
+from utils.scheduler import PREFETCH, UpstreamBusyError, cancel_when, request_priority
+
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+PREFETCH_MAX_FIELDS = int(os.getenv("PREFETCH_MAX_FIELDS", "5"))
+PREFETCH_MAX_WORKERS = int(os.getenv("PREFETCH_MAX_WORKERS", "1"))
+PREFETCH_IDLE_SECONDS = float(os.getenv("PREFETCH_IDLE_SECONDS", "60"))
+PREFETCH_HIT_WINDOW_SECONDS = float(os.getenv("PREFETCH_HIT_WINDOW_SECONDS", "600"))
+
+
+def likely_filter_fields(task: str, data_model: List[Dict[str, Any]], k: int = PREFETCH_MAX_FIELDS) -> List[str]:
+    """
+    STRING fields whose caption shares words with the task, most overlapping first.
+    """
+    task_tokens = set(tokenize(task))
+    scored = []
+    for position, field in enumerate(data_model):
+        if field.get('dataType') != 'STRING' or not field.get('fieldCaption'):
+            continue
+        overlap = len(task_tokens & set(tokenize(field['fieldCaption'])))
+        if overlap:
+            scored.append((-overlap, position, field['fieldCaption']))
+    return [caption for _, _, caption in sorted(scored)[:k]]
+
+
+class Prefetcher:
+    """
+    Speculatively warms the lookups that usually follow augment_datasource_metadata_tool.
+
+    For the fields a task is likely to filter on, sample values and member indexes are built in
+    the background, and the datasource's field profiles are computed for the size guard. Jobs run
+    on a small pool (PREFETCH_MAX_WORKERS) in the scheduler's prefetch class. Once the datasource
+    has seen no activity for PREFETCH_IDLE_SECONDS, a job is cancelled before its next upstream
+    call; jobs the scheduler drops count as cancelled too.
+    Every warmed item is tracked: it is a hit when a later request uses it, and waste when it was
+    not used within PREFETCH_HIT_WINDOW_SECONDS.
+    """
+    _pool: Optional[ThreadPoolExecutor] = None
+    _lock = threading.Lock()
+    _last_activity: Dict[str, float] = {}
+    _warmed: Dict[Tuple[str, str, Optional[str]], float] = {}
+    _stats = {"scheduled": 0, "prefetched": 0, "cancelled": 0, "failed": 0, "hits": 0, "wasted": 0}
+
+    @classmethod
+    def touch(cls, datasource_luid: str):
+        cls._last_activity[datasource_luid] = time.monotonic()
+
+    @classmethod
+    def _idle(cls, datasource_luid: str) -> bool:
+        return time.monotonic() - cls._last_activity.get(datasource_luid, float("-inf")) > PREFETCH_IDLE_SECONDS
+
+    @classmethod
+    def schedule(cls, credentials: Callable[[], Tuple[str, str]], datasource_luid: str, task: str):
+        """
+        Queues prefetch jobs for a datasource and task; a no-op unless PREFETCH_ENABLED is set.
+
+        Args:
+            credentials (Callable[[], Tuple[str, str]]): Returns a valid (api_key, url) pair.
+            datasource_luid (str): The unique identifier of the datasource.
+            task (str): The user task.
+        """
+        if not PREFETCH_ENABLED:
+            return
+        cls.touch(datasource_luid)
+        entry = PromptCache.get(datasource_luid)
+        data_model = (entry.body.get('data_model') if entry else None) or []
+
+        jobs: List[Tuple[str, Optional[str]]] = []
+        if not cached_field_profiles(datasource_luid):
+            jobs.append(("profiles", None))
+        for caption in likely_filter_fields(task, data_model):
+            if not MemberIndex.has(datasource_luid, caption):
+                jobs.append(("members", caption))
+            jobs.append(("values", caption))
+
+        with cls._lock:
+            if cls._pool is None:
+                cls._pool = ThreadPoolExecutor(max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="prefetch")
+            cls._stats["scheduled"] += len(jobs)
+        for kind, caption in jobs:
+            cls._pool.submit(cls._run, credentials, datasource_luid, kind, caption)
+
+    @classmethod
+    def _run(cls, credentials: Callable[[], Tuple[str, str]], datasource_luid: str, kind: str, caption: Optional[str]):
+        key = (datasource_luid, kind, caption)
+        if cls._idle(datasource_luid) or key in cls._warmed:
+            with cls._lock:
+                cls._stats["cancelled"] += 1
+            return
+        try:
+            api_key, url = credentials()
+            # a quiet session cancels the job between its upstream calls, not only before it starts
+            with request_priority(PREFETCH), cancel_when(lambda: cls._idle(datasource_luid)):
+                if kind == "profiles":
+                    get_field_profiles(api_key=api_key, url=url, datasource_luid=datasource_luid)
+                elif kind == "members":
+                    MemberIndex.get_or_build(api_key, url, datasource_luid, caption)
+                else:
+                    get_values(api_key, url, datasource_luid, caption)
+        except UpstreamBusyError:
+            # dropped by the scheduler to keep capacity for interactive requests, or cancelled
+            with cls._lock:
+                cls._stats["cancelled"] += 1
+            return
+        except Exception as e:
+            logging.warning(f"[Prefetch] {kind} for {datasource_luid} {caption or ''} failed: {str(e)}")
+            with cls._lock:
+                cls._stats["failed"] += 1
+            return
+        if kind == "profiles" and cls._idle(datasource_luid):
+            # profiling skips the fields whose queries were cancelled, so the job did not finish
+            with cls._lock:
+                cls._stats["cancelled"] += 1
+            return
+        with cls._lock:
+            cls._warmed[key] = time.monotonic()
+            cls._stats["prefetched"] += 1
+
+    @classmethod
+    def consume(cls, datasource_luid: str, kind: str, caption: Optional[str] = None):
+        """
+        Records that a request used an item; counts a hit if it was prefetched.
+        """
+        with cls._lock:
+            if cls._warmed.pop((datasource_luid, kind, caption), None) is not None:
+                cls._stats["hits"] += 1
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """
+        Returns prefetch counters with hit and waste ratios over the finished prefetches.
+        """
+        now = time.monotonic()
+        with cls._lock:
+            for key in [k for k, at in cls._warmed.items() if now - at > PREFETCH_HIT_WINDOW_SECONDS]:
+                del cls._warmed[key]
+                cls._stats["wasted"] += 1
+            stats = dict(cls._stats, pending_use=len(cls._warmed))
+        settled = stats["hits"] + stats["wasted"]
+        stats["hit_ratio"] = round(stats["hits"] / settled, 3) if settled else None
+        stats["waste_ratio"] = round(stats["wasted"] / settled, 3) if settled else None
+        return stats
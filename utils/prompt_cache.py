@@ -0,0 +1,187 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Optional, Tuple
+
+
+# Keys of the VDS prompt that change on every request; everything else is per datasource.
+PER_REQUEST_KEYS = ("task", "previous_call_error", "previous_vds_payload")
+
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "900"))
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "64"))
+
+
+def metadata_version(*parts: Any) -> str:
+    """
+    Derives a stable version string from the upstream metadata of a datasource.
+
+    Args:
+        *parts (Any): JSON-serializable metadata responses (data dictionary, VDS metadata, ...).
+
+    Returns:
+        str: Short content hash that changes whenever any of the parts change.
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class PromptCacheEntry:
+    """
+    Assembled prompt body for one (datasource LUID, metadata version).
+
+    The body holds only the datasource-specific keys. It is kept both as a dict and as
+    pre-rendered JSON text so that binding the per-request keys costs a shallow copy or a
+    single string concatenation.
+    """
+
+    def __init__(self, datasource_luid: str, version: str, body: Dict[str, Any]):
+        self.datasource_luid = datasource_luid
+        self.version = version
+        self.body = body
+        self.body_json = json.dumps(body)
+        self.fragments = {key: json.dumps(value) for key, value in body.items()}
+        self.created_at = time.monotonic()
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.Lock()
+
+    def derived(self, name: str, factory: Callable[["PromptCacheEntry"], Any]) -> Any:
+        """
+        Memoizes a structure computed from the body (indexes, rankers) for the entry's lifetime.
+        """
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = factory(self)
+            return self._derived[name]
+
+    def bind(
+        self,
+        task: str,
+        previous_errors: Optional[str] = None,
+        previous_vds_payload: Optional[str] = None,
+        overrides: Optional[Dict[str, Any]] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Returns a new prompt dict with the per-request keys appended at the end.
+
+        `overrides` replaces body keys in place (e.g. task-pruned field lists) and `extra`
+        is appended after the per-request keys.
+        """
+        prompt = dict(self.body)
+        if overrides:
+            prompt.update(overrides)
+        prompt.update(_request_fields(task, previous_errors, previous_vds_payload))
+        if extra:
+            prompt.update(extra)
+        return prompt
+
+    def render(
+        self,
+        task: str,
+        previous_errors: Optional[str] = None,
+        previous_vds_payload: Optional[str] = None,
+        overrides: Optional[Dict[str, Any]] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Returns the bound prompt as JSON text, reusing the pre-rendered body.
+
+        Only overridden keys and the per-request keys are serialized; all other keys come from
+        fragments rendered when the entry was created.
+        """
+        tail_fields = _request_fields(task, previous_errors, previous_vds_payload)
+        if extra:
+            tail_fields.update(extra)
+        tail = json.dumps(tail_fields)
+        if not overrides:
+            head = self.body_json
+        else:
+            head = "{" + ", ".join(
+                f"{json.dumps(key)}: {json.dumps(overrides[key]) if key in overrides else fragment}"
+                for key, fragment in self.fragments.items()
+            ) + "}"
+        if head == "{}":
+            return tail
+        return f"{head[:-1]}, {tail[1:]}"
+
+
+def _request_fields(
+    task: str,
+    previous_errors: Optional[str],
+    previous_vds_payload: Optional[str]
+) -> Dict[str, Any]:
+    return {
+        "task": task,
+        "previous_call_error": previous_errors or {},
+        "previous_vds_payload": previous_vds_payload or {}
+    }
+
+
+class PromptCache:
+    """
+    Process-wide cache of assembled prompt bodies keyed by (LUID, metadata version).
+
+    A LUID resolves to its current version for PROMPT_CACHE_TTL_SECONDS; within that window
+    `get` answers without any upstream call. When a datasource is re-fetched and its metadata
+    changed, the entry for the previous version is dropped.
+    """
+    _entries: "OrderedDict[Tuple[str, str], PromptCacheEntry]" = OrderedDict()
+    _current: Dict[str, Tuple[str, float]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, datasource_luid: str) -> Optional[PromptCacheEntry]:
+        with cls._lock:
+            current = cls._current.get(datasource_luid)
+            if current is None:
+                return None
+            version, resolved_at = current
+            if time.monotonic() - resolved_at > PROMPT_CACHE_TTL_SECONDS:
+                return None
+            entry = cls._entries.get((datasource_luid, version))
+            if entry is not None:
+                cls._entries.move_to_end((datasource_luid, version))
+            return entry
+
+    @classmethod
+    def put(cls, datasource_luid: str, version: str, body: Dict[str, Any]) -> PromptCacheEntry:
+        with cls._lock:
+            key = (datasource_luid, version)
+            entry = cls._entries.get(key)
+            if entry is None:
+                entry = PromptCacheEntry(datasource_luid, version, body)
+                cls._entries[key] = entry
+            previous = cls._current.get(datasource_luid)
+            if previous and previous[0] != version:
+                cls._entries.pop((datasource_luid, previous[0]), None)
+            cls._current[datasource_luid] = (version, time.monotonic())
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > PROMPT_CACHE_MAX_ENTRIES:
+                (old_luid, old_version), _ = cls._entries.popitem(last=False)
+                if cls._current.get(old_luid, (None,))[0] == old_version:
+                    cls._current.pop(old_luid, None)
+            return entry
+
+    @classmethod
+    def version(cls, datasource_luid: str) -> Optional[str]:
+        """
+        Returns the last known metadata version of a datasource, even if expired.
+        """
+        current = cls._current.get(datasource_luid)
+        return current[0] if current else None
+
+    @classmethod
+    def invalidate(cls, datasource_luid: Optional[str] = None):
+        with cls._lock:
+            if datasource_luid is None:
+                cls._entries.clear()
+                cls._current.clear()
+                return
+            cls._current.pop(datasource_luid, None)
+            for key in [k for k in cls._entries if k[0] == datasource_luid]:
+                del cls._entries[key]
@@ -0,0 +1,131 @@
+import os
+import copy
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.field_profile import cached_field_profiles, estimate_result_rows
+
+
+QUERY_GUARD_MODE = os.getenv("QUERY_GUARD_MODE", "rewrite").lower()  # rewrite | refuse | off
+QUERY_GUARD_MAX_ROWS = int(os.getenv("QUERY_GUARD_MAX_ROWS", "5000"))
+
+# Only truncations are coarsened: date parts (DAY of month, WEEK number, MONTH number) mean
+# something else at another grain, so oversized date-part groupings fall through to the row cap
+_COARSER_DATE = {
+    "TRUNC_DAY": "TRUNC_WEEK",
+    "TRUNC_WEEK": "TRUNC_MONTH",
+    "TRUNC_MONTH": "TRUNC_QUARTER",
+    "TRUNC_QUARTER": "TRUNC_YEAR",
+}
+_AGGREGATIONS = ("SUM", "AVG", "MEDIAN", "COUNT", "COUNTD", "MIN", "MAX", "STDEV", "VAR")
+
+
+class QueryTooLargeError(ValueError):
+    """
+    Raised when a query is estimated to return more rows than allowed and the guard refuses it.
+    The message carries the size report as JSON so the agent can adjust in one step.
+    """
+
+    def __init__(self, report: Dict[str, Any]):
+        self.report = report
+        super().__init__(
+            "Query refused: estimated result size exceeds the allowed number of rows. "
+            f"Aggregate further or filter the query. Size estimate: {json.dumps(report)}"
+        )
+
+
+def _coarsen_dates(query: Dict[str, Any]) -> Optional[str]:
+    for field in query.get('fields', []):
+        coarser = _COARSER_DATE.get(field.get('function'))
+        if coarser:
+            change = f"{field['fieldCaption']}: {field['function']} -> {coarser}"
+            field['function'] = coarser
+            return change
+    return None
+
+
+def _add_top_n(query: Dict[str, Any], profiles: Dict[str, Dict[str, Any]], estimate: int, max_rows: int) -> Optional[str]:
+    if any(f.get('filterType') == 'TOP' for f in query.get('filters') or []):
+        return None
+    measure = next((f for f in query.get('fields', []) if f.get('function') in _AGGREGATIONS), None)
+    filtered = {(f.get('field') or {}).get('fieldCaption') for f in query.get('filters') or []}
+    dimensions = [
+        f for f in query.get('fields', [])
+        if not f.get('function') and not f.get('calculation') and f.get('fieldCaption') not in filtered
+        and f.get('fieldCaption') in profiles
+    ]
+    if measure is None or not dimensions:
+        return None
+    widest = max(dimensions, key=lambda f: profiles[f['fieldCaption']].get('cardinality') or 0)
+    cardinality = profiles[widest['fieldCaption']].get('cardinality') or 1
+    how_many = max(1, int(max_rows / max(estimate / cardinality, 1)))
+    query.setdefault('filters', []).append({
+        'field': {'fieldCaption': widest['fieldCaption']},
+        'filterType': 'TOP',
+        'howMany': how_many,
+        'direction': 'TOP',
+        'fieldToMeasure': {'fieldCaption': measure['fieldCaption'], 'function': measure['function']}
+    })
+    return f"{widest['fieldCaption']}: top {how_many} by {measure['function']}({measure['fieldCaption']})"
+
+
+def guard_query(
+    datasource_luid: str,
+    query: Dict[str, Any],
+    max_rows: int = QUERY_GUARD_MAX_ROWS,
+    mode: str = QUERY_GUARD_MODE
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Estimates the result size of a query from cached field profiles and keeps it under a limit.
+
+    In "rewrite" mode an oversized query is made coarser step by step: date truncations are
+    coarsened first, then a TopN filter is added on the widest dimension, and finally a row cap is
+    set for the caller to apply. In "refuse" mode a QueryTooLargeError is raised instead. No
+    upstream call is made; without cached profiles the query passes unchanged.
+
+    Args:
+        datasource_luid (str): The unique identifier of the datasource.
+        query (Dict[str, Any]): The VDS query; it is not modified.
+        max_rows (int): Largest acceptable estimated row count.
+        mode (str): "rewrite", "refuse" or "off".
+
+    Returns:
+        Tuple: (query to run, size report or None when no estimate is available). The report holds
+        "estimated_rows", "max_rows", "action" and, when rewritten, "rewrites" and "row_cap".
+
+    Raises:
+        QueryTooLargeError: If the query is too large and mode is "refuse".
+    """
+    if mode == "off" or not isinstance(query, dict):
+        return query, None
+    profiles = cached_field_profiles(datasource_luid)
+    estimate = estimate_result_rows(profiles, query) if profiles else None
+    if estimate is None:
+        return query, None
+
+    report: Dict[str, Any] = {"estimated_rows": estimate, "max_rows": max_rows, "action": "allowed"}
+    if estimate <= max_rows:
+        return query, report
+
+    if mode == "refuse":
+        report["action"] = "refused"
+        raise QueryTooLargeError(report)
+
+    rewritten = copy.deepcopy(query)
+    rewrites: List[str] = []
+    while estimate > max_rows:
+        change = _coarsen_dates(rewritten)
+        if change is None:
+            break
+        rewrites.append(change)
+        estimate = estimate_result_rows(profiles, rewritten) or estimate
+    if estimate > max_rows:
+        change = _add_top_n(rewritten, profiles, estimate, max_rows)
+        if change:
+            rewrites.append(change)
+            estimate = estimate_result_rows(profiles, rewritten) or estimate
+
+    report.update({"action": "rewritten", "rewrites": rewrites, "estimated_rows_after": estimate})
+    if estimate > max_rows:
+        report["row_cap"] = max_rows
+    return (rewritten if rewrites else query), report
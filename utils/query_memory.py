@@ -0,0 +1,149 @@
+import os
+import re
+import json
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from utils.text_index import BM25Index, tokenize
+
+
+QUERY_MEMORY_PATH = os.getenv("QUERY_MEMORY_PATH")
+QUERY_MEMORY_MAX_PER_DATASOURCE = int(os.getenv("QUERY_MEMORY_MAX_PER_DATASOURCE", "500"))
+QUERY_MEMORY_EXAMPLES_K = int(os.getenv("QUERY_MEMORY_EXAMPLES_K", "3"))
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def task_key(task: str) -> str:
+    """
+    Normalized form of a task used for exact reuse: its lowercase words in order, without
+    punctuation. Every word counts ("sales per month" is not "sales this month"); stemming and
+    stopword removal are left to the similarity search.
+    """
+    return " ".join(_WORD_RE.findall(str(task or "").lower()))
+
+
+class _DatasourceMemory:
+    def __init__(self):
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._index: Optional[BM25Index] = None
+        self._keys: List[str] = []
+
+    def index(self) -> BM25Index:
+        if self._index is None:
+            self._keys = list(self.records)
+            self._index = BM25Index(tokenize(self.records[key]["task"]) for key in self._keys)
+        return self._index
+
+    def add(self, key: str, record: Dict[str, Any]):
+        self.records.pop(key, None)
+        self.records[key] = record
+        while len(self.records) > QUERY_MEMORY_MAX_PER_DATASOURCE:
+            # evict the least used, oldest record
+            victim = min(self.records, key=lambda k: (self.records[k]["hits"], self.records[k]["updated_at"]))
+            del self.records[victim]
+        self._index = None
+
+
+class QueryMemory:
+    """
+    Local memory of VDS queries that succeeded, keyed by datasource and normalized task text.
+
+    An exact task match returns a ready query so the agent can skip query generation; otherwise
+    the most similar past tasks are returned as few-shot examples. When QUERY_MEMORY_PATH is
+    set, the memory is loaded at import and written back after every change.
+    """
+    _memories: Dict[str, _DatasourceMemory] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, datasource_luid: str, task: str, query: Dict[str, Any], row_count: Optional[int] = None):
+        key = task_key(task)
+        if not key:
+            return
+        with cls._lock:
+            memory = cls._memories.setdefault(datasource_luid, _DatasourceMemory())
+            previous = memory.records.get(key)
+            memory.add(key, {
+                "task": task,
+                "query": query,
+                "row_count": row_count,
+                "hits": previous["hits"] if previous else 0,
+                "updated_at": time.time()
+            })
+            cls._save()
+
+    @classmethod
+    def lookup(cls, datasource_luid: str, task: str, k: int = QUERY_MEMORY_EXAMPLES_K) -> Dict[str, Any]:
+        """
+        Finds a reusable query for a task.
+
+        Args:
+            datasource_luid (str): LUID of the datasource.
+            task (str): The user task.
+            k (int): Number of similar past queries to return when there is no exact match.
+
+        Returns:
+            Dict[str, Any]: {"match": "exact", "query": ...}, {"match": "similar", "examples": [...]}
+            or {"match": "none"}.
+        """
+        key = task_key(task)
+        with cls._lock:
+            memory = cls._memories.get(datasource_luid)
+            if memory is None or not key:
+                return {"match": "none"}
+
+            record = memory.records.get(key)
+            if record is not None:
+                record["hits"] += 1
+                return {"match": "exact", "task": record["task"], "query": record["query"]}
+
+            index = memory.index()
+            examples = [
+                {"task": memory.records[memory._keys[doc_id]]["task"],
+                 "query": memory.records[memory._keys[doc_id]]["query"],
+                 "score": round(score, 3)}
+                for doc_id, score in index.top_k(tokenize(task), k)
+            ]
+        if not examples:
+            return {"match": "none"}
+        return {"match": "similar", "examples": examples}
+
+    @classmethod
+    def forget(cls, datasource_luid: str, task: Optional[str] = None):
+        with cls._lock:
+            if task is None:
+                cls._memories.pop(datasource_luid, None)
+            elif datasource_luid in cls._memories:
+                memory = cls._memories[datasource_luid]
+                if memory.records.pop(task_key(task), None) is not None:
+                    memory._index = None
+            cls._save()
+
+    @classmethod
+    def load(cls, path: Optional[str] = QUERY_MEMORY_PATH):
+        if not path or not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        with cls._lock:
+            for datasource_luid, records in stored.items():
+                memory = cls._memories.setdefault(datasource_luid, _DatasourceMemory())
+                for key, record in records.items():
+                    # re-key from the task text so files written with an older key format still match
+                    memory.add(task_key(record.get("task") or "") or key, record)
+
+    @classmethod
+    def _save(cls, path: Optional[str] = QUERY_MEMORY_PATH):
+        if not path:
+            return
+        snapshot = {luid: memory.records for luid, memory in cls._memories.items()}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+
+QueryMemory.load()
@@ -0,0 +1,156 @@
+import io
+import os
+import math
+import csv
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from utils.columnar import ColumnarResult
+
+
+RENDER_MAX_ROWS = int(os.getenv("RENDER_MAX_ROWS", "500"))
+RENDER_MAX_COLUMNS = int(os.getenv("RENDER_MAX_COLUMNS", "50"))
+RENDER_FLOAT_DECIMALS = int(os.getenv("RENDER_FLOAT_DECIMALS", "4"))
+RENDER_FLOAT_SIGNIFICANT = int(os.getenv("RENDER_FLOAT_SIGNIFICANT", "6"))
+
+FORMATS = ("markdown", "csv", "tsv", "json")
+
+
+def _default_float(value: float) -> str:
+    """
+    Values of magnitude 1 and up keep RENDER_FLOAT_DECIMALS places; smaller ones keep
+    RENDER_FLOAT_SIGNIFICANT significant digits, so small ratios do not round to 0.
+    """
+    if -1.0 < value < 1.0 and value:
+        return f"{value:.{RENDER_FLOAT_SIGNIFICANT}g}"
+    if not math.isfinite(value):
+        return str(value)
+    text = f"{value:.{RENDER_FLOAT_DECIMALS}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _formatter(spec: Optional[str]) -> Callable[[Any], str]:
+    """
+    Returns a cell formatter for a column; `spec` is a format spec such as ",.2f" or ".1%".
+    """
+    def cell(value: Any) -> str:
+        if value is None:
+            return ""
+        if spec and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return format(value, spec)
+        if isinstance(value, float):
+            return _default_float(value)
+        return str(value)
+    return cell
+
+
+def _needs_escape(text: str) -> bool:
+    return "|" in text or "\n" in text or "\r" in text
+
+
+def _escape_markdown(text: str) -> str:
+    if _needs_escape(text):
+        text = text.replace("|", "\\|").replace("\r", " ").replace("\n", " ")
+    return text
+
+
+def _as_columnar(data: Union[ColumnarResult, Sequence[Dict[str, Any]], str]) -> ColumnarResult:
+    if isinstance(data, ColumnarResult):
+        return data
+    if isinstance(data, str):
+        data = json.loads(data)
+    return ColumnarResult.from_rows(data)
+
+
+def render(
+    data: Union[ColumnarResult, Sequence[Dict[str, Any]], str],
+    output_format: str = "markdown",
+    max_rows: Optional[int] = RENDER_MAX_ROWS,
+    max_columns: Optional[int] = RENDER_MAX_COLUMNS,
+    number_formats: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    Renders a query result as markdown, CSV, TSV or compact JSON.
+
+    Output is written into a single buffer. At most `max_rows` rows and `max_columns` columns
+    are rendered, with a footer saying how many were left out. Cells in markdown are escaped
+    (pipes and line breaks), floats are trimmed to RENDER_FLOAT_DECIMALS places (or
+    RENDER_FLOAT_SIGNIFICANT significant digits below 1), and numeric columns listed in
+    `number_formats` use the given format spec.
+
+    Args:
+        data: A ColumnarResult, a list of row dicts or their JSON text.
+        output_format (str): One of "markdown", "csv", "tsv" or "json".
+        max_rows (Optional[int]): Row limit; None or 0 renders all rows.
+        max_columns (Optional[int]): Column limit; None or 0 renders all columns.
+        number_formats (Optional[Dict[str, str]]): Format spec per column name, e.g. {"Sales": ",.0f"}.
+
+    Returns:
+        str: The rendered table.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {FORMATS}")
+    result = _as_columnar(data)
+    total_rows, total_columns = len(result), len(result.columns)
+
+    names = result.names
+    if max_columns and total_columns > max_columns:
+        names = names[:max_columns]
+    view = result.select(names)
+    if max_rows and total_rows > max_rows:
+        view = view[:max_rows]
+    hidden_rows = total_rows - len(view)
+    hidden_columns = total_columns - len(names)
+
+    buffer = io.StringIO()
+    number_formats = number_formats or {}
+
+    if output_format == "json":
+        document: Dict[str, Any] = {"columns": names, "rows": [list(row) for row in view.iter_rows()]}
+        if hidden_rows or hidden_columns:
+            document["more_rows"] = hidden_rows
+            document["more_columns"] = hidden_columns
+        json.dump(document, buffer, separators=(",", ":"), default=str)
+        return buffer.getvalue()
+
+    formatted: List[List[str]] = []
+    for name in names:
+        values = view.column_values(name)
+        if all(type(value) is str for value in values):
+            # text columns need no formatting; escape only if some cell needs it
+            if output_format == "markdown" and _needs_escape("".join(values)):
+                values = [_escape_markdown(value) for value in values]
+            formatted.append(values)
+            continue
+        cell = _formatter(number_formats.get(name))
+        values = [cell(value) for value in values]
+        if output_format == "markdown":
+            values = [_escape_markdown(value) for value in values]
+        formatted.append(values)
+
+    if output_format == "markdown":
+        header = [_escape_markdown(name) for name in names]
+        buffer.write("| " + " | ".join(header) + " |\n")
+        buffer.write("| " + " | ".join(["---"] * len(names)) + " |\n")
+        for row in zip(*formatted):
+            buffer.write("| ")
+            buffer.write(" | ".join(row))
+            buffer.write(" |\n")
+        if hidden_rows:
+            buffer.write(f"\n... {hidden_rows} more rows\n")
+        if hidden_columns:
+            buffer.write(f"... {hidden_columns} more columns\n")
+    else:
+        writer = csv.writer(buffer, delimiter="," if output_format == "csv" else "\t", lineterminator="\n")
+        writer.writerow(names)
+        writer.writerows(zip(*formatted))
+        if hidden_rows:
+            buffer.write(f"# {hidden_rows} more rows\n")
+        if hidden_columns:
+            buffer.write(f"# {hidden_columns} more columns\n")
+    return buffer.getvalue()
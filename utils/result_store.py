@@ -0,0 +1,240 @@
+import os
+import json
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.columnar import ColumnarResult
+from utils.subsumption import find_subsuming
+from utils.rollups import RollupStore
+from utils.incremental import refresh_trailing
+from utils.vizql_data_service import query_vds_columnar, query_vds_partitioned, VDS_STREAM_MAX_ROWS
+
+
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "512"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "600"))
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "100"))
+RESULT_CACHE_SUBSUMPTION = os.getenv("RESULT_CACHE_SUBSUMPTION", "true").lower() == "true"
+RESULT_CACHE_INCREMENTAL = os.getenv("RESULT_CACHE_INCREMENTAL", "true").lower() == "true"
+
+
+def query_key(datasource_luid: str, query: Dict[str, Any]) -> str:
+    """
+    Canonical cache key of a query: a hash of the LUID and the query JSON with sorted keys.
+    """
+    text = json.dumps([datasource_luid, query], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class StoredResult:
+    """
+    A query result kept server-side under a handle.
+    """
+
+    def __init__(self, handle: str, datasource_luid: str, query: Dict[str, Any], result: ColumnarResult):
+        self.handle = handle
+        self.datasource_luid = datasource_luid
+        self.query = query
+        self.result = result
+        self.created_at = time.time()
+        self.nbytes = result.nbytes
+        self.derived_from: Optional[str] = None
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            "handle": self.handle,
+            "schema": self.result.schema(),
+            "row_count": len(self.result),
+            "truncated": self.result.truncated
+        }
+        if self.derived_from:
+            summary["derived_from"] = self.derived_from
+        return summary
+
+
+class ResultStore:
+    """
+    Bounded, evicting store of query results addressed by handle.
+
+    Results are evicted least-recently-used first once RESULT_STORE_MAX_ENTRIES or
+    RESULT_STORE_MAX_BYTES is exceeded. Each result is also indexed by its query so an identical
+    query within RESULT_CACHE_TTL_SECONDS is answered from the store.
+    """
+    _results: "OrderedDict[str, StoredResult]" = OrderedDict()
+    _by_query: Dict[str, str] = {}
+    _bytes = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def put(cls, datasource_luid: str, query: Dict[str, Any], result: ColumnarResult) -> StoredResult:
+        stored = StoredResult(f"r-{uuid.uuid4().hex[:12]}", datasource_luid, query, result)
+        with cls._lock:
+            cls._results[stored.handle] = stored
+            cls._by_query[query_key(datasource_luid, query)] = stored.handle
+            cls._bytes += stored.nbytes
+            while cls._results and (len(cls._results) > RESULT_STORE_MAX_ENTRIES or cls._bytes > RESULT_STORE_MAX_BYTES):
+                _, evicted = cls._results.popitem(last=False)
+                cls._evict(evicted)
+        return stored
+
+    @classmethod
+    def _evict(cls, stored: StoredResult):
+        cls._bytes -= stored.nbytes
+        key = query_key(stored.datasource_luid, stored.query)
+        if cls._by_query.get(key) == stored.handle:
+            del cls._by_query[key]
+
+    @classmethod
+    def get(cls, handle: str) -> StoredResult:
+        """
+        Raises:
+            KeyError: If the handle is unknown or was evicted.
+        """
+        with cls._lock:
+            stored = cls._results.get(handle)
+            if stored is None:
+                raise KeyError(f"Unknown or expired result handle '{handle}'. Run the query again.")
+            cls._results.move_to_end(handle)
+            return stored
+
+    @classmethod
+    def lookup(cls, datasource_luid: str, query: Dict[str, Any], ttl_seconds: float = RESULT_CACHE_TTL_SECONDS) -> Optional[StoredResult]:
+        """
+        Returns the stored result of an identical query if it is fresh enough.
+        """
+        with cls._lock:
+            handle = cls._by_query.get(query_key(datasource_luid, query))
+            stored = cls._results.get(handle) if handle else None
+            if stored is None or time.time() - stored.created_at > ttl_seconds:
+                return None
+            cls._results.move_to_end(handle)
+            return stored
+
+    @classmethod
+    def entries(cls, datasource_luid: Optional[str] = None) -> List[StoredResult]:
+        with cls._lock:
+            return [s for s in cls._results.values() if datasource_luid is None or s.datasource_luid == datasource_luid]
+
+    @classmethod
+    def derive(cls, datasource_luid: str, query: Dict[str, Any], ttl_seconds: float = RESULT_CACHE_TTL_SECONDS) -> Optional[StoredResult]:
+        """
+        Answers a query from a fresh cached result that contains it, e.g. SUM(Sales) by Category from
+        SUM(Sales) by Category and Region. The derived result is stored under the query itself.
+        """
+        now = time.time()
+        candidates = [
+            s for s in cls.entries(datasource_luid)
+            if 'fields' in s.query and now - s.created_at <= ttl_seconds
+        ]
+        found = find_subsuming(query, candidates)
+        if found is None:
+            return None
+        source, result = found
+        stored = cls.put(datasource_luid, query, result)
+        stored.derived_from = source.handle
+        return stored
+
+    @classmethod
+    def invalidate(cls, datasource_luid: str):
+        with cls._lock:
+            for handle in [h for h, s in cls._results.items() if s.datasource_luid == datasource_luid]:
+                cls._evict(cls._results.pop(handle))
+
+
+def fetch_result(
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    query: Dict[str, Any],
+    max_rows: Optional[int] = None,
+    partitions: Optional[int] = None
+) -> Tuple[StoredResult, bool]:
+    """
+    Returns the result of a query from the store, or runs it through VDS and stores it.
+
+    Besides identical queries, queries contained in an operator-declared rollup (see RollupStore)
+    or in a cached finer result (see ResultStore.derive) are answered by re-aggregating it locally;
+    such results carry `derived_from`. An expired time-series result is refreshed by re-querying
+    only its trailing periods (see utils.incremental).
+
+    Args:
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        datasource_luid (str): The unique identifier of the datasource.
+        query (Dict[str, Any]): The VDS query.
+        max_rows (Optional[int]): Row cap for the upstream read.
+        partitions (Optional[int]): Run the query as this many parallel partitions.
+
+    Returns:
+        Tuple[StoredResult, bool]: The stored result and whether it came from the cache.
+    """
+    stored = ResultStore.lookup(datasource_luid, query)
+    if stored is not None:
+        return stored, True
+    answered = RollupStore.answer(datasource_luid, query)
+    if answered is not None:
+        rollup, result = answered
+        stored = ResultStore.put(datasource_luid, query, result)
+        stored.derived_from = f"rollup:{rollup.name}"
+        return stored, True
+    if RESULT_CACHE_SUBSUMPTION:
+        stored = ResultStore.derive(datasource_luid, query)
+        if stored is not None:
+            return stored, True
+    if RESULT_CACHE_INCREMENTAL:
+        expired = ResultStore.lookup(datasource_luid, query, ttl_seconds=float("inf"))
+        result = refresh_trailing(api_key, url, datasource_luid, query, expired.result) if expired else None
+        if result is not None:
+            return ResultStore.put(datasource_luid, query, result), False
+
+    if partitions and partitions > 1:
+        result = query_vds_partitioned(
+            api_key=api_key,
+            datasource_luid=datasource_luid,
+            url=url,
+            query=query,
+            partitions=partitions,
+            max_rows=max_rows or VDS_STREAM_MAX_ROWS
+        )
+    else:
+        result = query_vds_columnar(
+            api_key=api_key,
+            datasource_luid=datasource_luid,
+            url=url,
+            query=query,
+            max_rows=max_rows or VDS_STREAM_MAX_ROWS
+        )
+    return ResultStore.put(datasource_luid, query, result), False
+
+
+def result_page(
+    stored: StoredResult,
+    offset: int = 0,
+    limit: int = RESULT_PAGE_SIZE,
+    columns: Optional[List[str]] = None,
+    sort_by: Optional[List[str]] = None,
+    descending: bool = False
+) -> ColumnarResult:
+    """
+    Returns one page of a stored result, optionally projected to some columns and sorted.
+
+    Unsorted pages are zero-copy views; sorting copies only the rows of the requested page.
+
+    Raises:
+        KeyError: If a requested column does not exist.
+    """
+    result = stored.result
+    for name in (columns or []) + (sort_by or []):
+        if name not in result.names:
+            raise KeyError(f"Unknown column '{name}'. Available columns: {result.names}")
+    if columns:
+        result = result.select(columns)
+    offset = max(offset, 0)
+    if sort_by:
+        order = stored.result.sort_indices(sort_by, descending)
+        return result.take(order[offset:offset + limit])
+    return result[offset:offset + limit]
@@ -0,0 +1,198 @@
+import os
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from utils.columnar import ColumnarResult
+from utils.metadata import get_extract_refresh_time
+from utils.subsumption import derive_result
+from utils.scheduler import BACKGROUND, request_priority
+from utils.vizql_data_service import query_vds_columnar, VDS_STREAM_MAX_ROWS
+
+
+ROLLUPS_PATH = os.getenv("ROLLUPS_PATH", "")
+ROLLUP_CHECK_SECONDS = float(os.getenv("ROLLUP_CHECK_SECONDS", "300"))
+ROLLUP_MAX_AGE_SECONDS = float(os.getenv("ROLLUP_MAX_AGE_SECONDS", "86400"))
+
+
+def load_rollup_definitions(path: str = ROLLUPS_PATH) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Reads operator-declared rollups from a JSON file.
+
+    The file maps datasource LUIDs to lists of rollups, each a name plus the VDS query to
+    materialize, e.g. {"<luid>": [{"name": "sales_by_region_month", "query": {"fields": [...]}}]}.
+    A rollup answers every query it contains (see utils.subsumption.derive_result), so it should
+    hold the finest dimensions and the SUM/MIN/MAX/COUNT measures its queries roll up from.
+    """
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            definitions = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"[Rollups] Could not read {path}: {str(e)}")
+        return {}
+    return {
+        luid: [r for r in rollups if r.get('name') and isinstance(r.get('query'), dict)]
+        for luid, rollups in definitions.items()
+    }
+
+
+class Rollup:
+    """
+    A materialized rollup: the declared query and its latest columnar result.
+    """
+
+    def __init__(self, name: str, datasource_luid: str, query: Dict[str, Any]):
+        self.name = name
+        self.datasource_luid = datasource_luid
+        self.query = query
+        self.result: Optional[ColumnarResult] = None
+        self.refreshed_at: Optional[float] = None
+        self.source_version: Optional[str] = None
+        self.hits = 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "datasource_luid": self.datasource_luid,
+            "rows": len(self.result) if self.result is not None else None,
+            "bytes": self.result.nbytes if self.result is not None else None,
+            "refreshed_at": self.refreshed_at,
+            "extract_refreshed_at": self.source_version,
+            "hits": self.hits
+        }
+
+
+class RollupStore:
+    """
+    Operator-declared rollups kept in memory and refreshed with the datasource's extract.
+
+    Every ROLLUP_CHECK_SECONDS a background job reads the last extract refresh time of each
+    datasource with rollups. Rollups are re-fetched when it changed, when they were never loaded,
+    or, for live connections, once they are older than ROLLUP_MAX_AGE_SECONDS. A changed extract
+    also drops the datasource's cached query results.
+    """
+    _rollups: Dict[str, List[Rollup]] = {}
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _stop = threading.Event()
+    _credentials: Optional[Callable[[], Tuple[str, str]]] = None
+    _on_source_change: Optional[Callable[[str], None]] = None
+
+    @classmethod
+    def configure(cls, definitions: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        definitions = load_rollup_definitions() if definitions is None else definitions
+        with cls._lock:
+            cls._rollups = {
+                luid: [Rollup(r['name'], luid, r['query']) for r in rollups]
+                for luid, rollups in definitions.items()
+            }
+
+    @classmethod
+    def rollups(cls, datasource_luid: Optional[str] = None) -> List[Rollup]:
+        with cls._lock:
+            if datasource_luid is not None:
+                return list(cls._rollups.get(datasource_luid, []))
+            return [r for rollups in cls._rollups.values() for r in rollups]
+
+    @classmethod
+    def refresh(cls, api_key: str, url: str, datasource_luid: str, source_version: Optional[str] = None):
+        """
+        Fetches all rollups of a datasource. A rollup keeps its previous result if its fetch fails.
+        """
+        for rollup in cls.rollups(datasource_luid):
+            if cls._stop.is_set():
+                break
+            try:
+                result = query_vds_columnar(
+                    api_key=api_key,
+                    datasource_luid=datasource_luid,
+                    url=url,
+                    query=rollup.query,
+                    max_rows=VDS_STREAM_MAX_ROWS
+                )
+            except Exception as e:
+                logging.warning(f"[Rollups] Refresh of '{rollup.name}' failed: {str(e)}")
+                continue
+            if result.truncated:
+                logging.warning(f"[Rollups] '{rollup.name}' exceeds {VDS_STREAM_MAX_ROWS} rows and will not be used.")
+            rollup.result, rollup.refreshed_at, rollup.source_version = result, time.time(), source_version
+            print(f"[Rollups] Refreshed '{rollup.name}' ({len(result)} rows) for datasource {datasource_luid}.")
+
+    @classmethod
+    def answer(cls, datasource_luid: str, query: Dict[str, Any]) -> Optional[Tuple[Rollup, ColumnarResult]]:
+        """
+        Answers a query from the smallest loaded rollup of the datasource that contains it.
+
+        Returns:
+            Optional[Tuple[Rollup, ColumnarResult]]: The rollup used and the result, or None.
+        """
+        loaded = [r for r in cls.rollups(datasource_luid) if r.result is not None]
+        for rollup in sorted(loaded, key=lambda r: len(r.result)):
+            result = derive_result(query, rollup.query, rollup.result)
+            if result is not None:
+                rollup.hits += 1
+                return rollup, result
+        return None
+
+    @classmethod
+    def start(cls, credentials: Callable[[], Tuple[str, str]], on_source_change: Optional[Callable[[str], None]] = None):
+        """
+        Loads the rollup definitions and starts the background refresh job.
+
+        Args:
+            credentials (Callable[[], Tuple[str, str]]): Returns a valid (api_key, url) pair.
+            on_source_change (Optional[Callable[[str], None]]): Called with the LUID of a datasource
+                whose extract was refreshed.
+        """
+        if cls._thread and cls._thread.is_alive():
+            return
+        cls.configure()
+        cls._credentials = credentials
+        cls._on_source_change = on_source_change
+        cls._stop.clear()
+        cls._thread = threading.Thread(target=cls._run, name="rollup-refresher", daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls):
+        cls._stop.set()
+
+    @classmethod
+    def _due(cls, rollups: List[Rollup], source_version: Optional[str]) -> bool:
+        for rollup in rollups:
+            if rollup.result is None or rollup.source_version != source_version:
+                return True
+            if source_version is None and time.time() - rollup.refreshed_at > ROLLUP_MAX_AGE_SECONDS:
+                return True
+        return False
+
+    @classmethod
+    def _run(cls):
+        with request_priority(BACKGROUND):
+            cls._refresh_loop()
+
+    @classmethod
+    def _refresh_loop(cls):
+        while not cls._stop.is_set():
+            with cls._lock:
+                datasources = list(cls._rollups)
+            for datasource_luid in datasources:
+                rollups = cls.rollups(datasource_luid)
+                try:
+                    api_key, url = cls._credentials()
+                    source_version = get_extract_refresh_time(api_key=api_key, domain=url, datasource_luid=datasource_luid)
+                    if not cls._due(rollups, source_version):
+                        continue
+                    changed = any(r.result is not None and r.source_version != source_version for r in rollups)
+                    cls.refresh(api_key, url, datasource_luid, source_version)
+                    if changed and cls._on_source_change:
+                        cls._on_source_change(datasource_luid)
+                except Exception as e:
+                    logging.warning(f"[Rollups] Refresh check failed for {datasource_luid}: {str(e)}")
+                if cls._stop.is_set():
+                    break
+            cls._stop.wait(ROLLUP_CHECK_SECONDS)
@@ -0,0 +1,230 @@
+import os
+import time
+import asyncio
+import itertools
+import threading
+import contextlib
+import contextvars
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+INTERACTIVE, PREFETCH, BACKGROUND = "interactive", "prefetch", "background"
+PRIORITIES = (INTERACTIVE, PREFETCH, BACKGROUND)
+
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "12"))
+SCHEDULER_INTERACTIVE_RESERVE = int(os.getenv("SCHEDULER_INTERACTIVE_RESERVE", "4"))
+SCHEDULER_INTERACTIVE_TARGET_SECONDS = float(os.getenv("SCHEDULER_INTERACTIVE_TARGET_SECONDS", "3"))
+SCHEDULER_PREFETCH_MAX_WAIT_SECONDS = float(os.getenv("SCHEDULER_PREFETCH_MAX_WAIT_SECONDS", "30"))
+SCHEDULER_LATENCY_WINDOW_SECONDS = 60.0
+
+
+def _parse_weights(text: str) -> Dict[str, float]:
+    weights = {INTERACTIVE: 8.0, PREFETCH: 2.0, BACKGROUND: 1.0}
+    for item in text.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() in weights and value.strip():
+            weights[name.strip()] = max(float(value), 0.01)
+    return weights
+
+
+SCHEDULER_WEIGHTS = _parse_weights(os.getenv("SCHEDULER_WEIGHTS", ""))
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+_cancel_check: contextvars.ContextVar[Optional[Callable[[], bool]]] = contextvars.ContextVar("upstream_cancel_check", default=None)
+
+
+@contextlib.contextmanager
+def request_priority(priority: str) -> Iterator[None]:
+    """
+    Runs the enclosed upstream calls of the current thread or task in the given priority class.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}', expected one of {PRIORITIES}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextlib.contextmanager
+def cancel_when(check: Callable[[], bool]) -> Iterator[None]:
+    """
+    Cancels the enclosed upstream calls of the current thread or task once `check()` is true: every
+    request checks it before it is sent and while it waits, and raises UpstreamBusyError.
+    """
+    token = _cancel_check.set(check)
+    try:
+        yield
+    finally:
+        _cancel_check.reset(token)
+
+
+class UpstreamBusyError(RuntimeError):
+    """
+    Raised when a low-priority request waited too long for an upstream slot and was dropped.
+    """
+
+
+class _Waiter:
+    __slots__ = ("priority", "tag", "granted")
+
+    def __init__(self, priority: str, tag: float):
+        self.priority = priority
+        self.tag = tag
+        self.granted = False
+
+
+class UpstreamScheduler:
+    """
+    Single admission point for every HTTP request to Tableau.
+
+    At most SCHEDULER_MAX_CONCURRENCY requests are in flight. Waiting requests are served by
+    weighted fair queuing over the priority classes (SCHEDULER_WEIGHTS, interactive=8, prefetch=2,
+    background=1 by default): each request gets a virtual finish tag and the smallest tag goes
+    next. Prefetch and background together never use more than the capacity minus
+    SCHEDULER_INTERACTIVE_RESERVE slots. When the recent interactive latency exceeds
+    SCHEDULER_INTERACTIVE_TARGET_SECONDS, prefetch is paused and background is throttled to one
+    request. Prefetch requests that wait longer than SCHEDULER_PREFETCH_MAX_WAIT_SECONDS are
+    dropped with UpstreamBusyError.
+
+    A slot covers sending the request and receiving the response headers; streamed bodies are
+    read after the slot is released.
+    """
+    _cond = threading.Condition()
+    _queue: List[tuple] = []
+    _sequence = itertools.count()
+    _in_flight: Dict[str, int] = {p: 0 for p in PRIORITIES}
+    _finish: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+    _virtual_time = 0.0
+    _interactive_latency: Optional[float] = None
+    _interactive_at = float("-inf")
+    _counters: Dict[str, Dict[str, float]] = {p: {"requests": 0, "dropped": 0, "wait_seconds": 0.0} for p in PRIORITIES}
+
+    @classmethod
+    def degraded(cls) -> bool:
+        """
+        True when recent interactive requests are slower than the target latency.
+        """
+        recent = time.monotonic() - cls._interactive_at < SCHEDULER_LATENCY_WINDOW_SECONDS
+        return recent and cls._interactive_latency is not None and cls._interactive_latency > SCHEDULER_INTERACTIVE_TARGET_SECONDS
+
+    @classmethod
+    def _limit(cls, priority: str) -> int:
+        if priority == INTERACTIVE:
+            return SCHEDULER_MAX_CONCURRENCY
+        if cls.degraded():
+            return 0 if priority == PREFETCH else 1
+        return max(1, SCHEDULER_MAX_CONCURRENCY - SCHEDULER_INTERACTIVE_RESERVE)
+
+    @classmethod
+    def _admissible(cls, priority: str) -> bool:
+        if priority == INTERACTIVE:
+            return True
+        low = cls._in_flight[PREFETCH] + cls._in_flight[BACKGROUND]
+        return low < cls._limit(priority) and cls._in_flight[priority] < cls._limit(priority)
+
+    @classmethod
+    def _dispatch(cls):
+        # called with the condition held
+        while cls._queue and sum(cls._in_flight.values()) < SCHEDULER_MAX_CONCURRENCY:
+            chosen = next((item for item in sorted(cls._queue) if cls._admissible(item[2].priority)), None)
+            if chosen is None:
+                break
+            cls._queue.remove(chosen)
+            waiter = chosen[2]
+            waiter.granted = True
+            cls._in_flight[waiter.priority] += 1
+            cls._virtual_time = max(cls._virtual_time, waiter.tag)
+        cls._cond.notify_all()
+
+    @classmethod
+    def acquire(cls, priority: Optional[str] = None) -> str:
+        """
+        Blocks until the request may be sent and returns its priority class.
+
+        Raises:
+            UpstreamBusyError: If a prefetch request waited longer than its limit, or the
+                request was cancelled (see cancel_when).
+        """
+        priority = priority or current_priority()
+        cancelled = _cancel_check.get()
+        started = time.monotonic()
+        with cls._cond:
+            if cancelled is not None and cancelled():
+                cls._counters[priority]["dropped"] += 1
+                raise UpstreamBusyError("Request cancelled before it was sent.")
+            start_tag = max(cls._virtual_time, cls._finish[priority])
+            cls._finish[priority] = start_tag + 1.0 / SCHEDULER_WEIGHTS[priority]
+            waiter = _Waiter(priority, cls._finish[priority])
+            cls._queue.append((waiter.tag, next(cls._sequence), waiter))
+            cls._dispatch()
+            while not waiter.granted:
+                waited = time.monotonic() - started
+                expired = priority == PREFETCH and waited > SCHEDULER_PREFETCH_MAX_WAIT_SECONDS
+                if expired or (cancelled is not None and cancelled()):
+                    cls._queue = [item for item in cls._queue if item[2] is not waiter]
+                    cls._counters[priority]["dropped"] += 1
+                    raise UpstreamBusyError(
+                        "Prefetch dropped: no upstream capacity available." if expired else "Request cancelled while queued."
+                    )
+                # wake up periodically: throttling lifts when the latency window expires
+                cls._cond.wait(timeout=1.0)
+                cls._dispatch()
+            counters = cls._counters[priority]
+            counters["requests"] += 1
+            counters["wait_seconds"] += time.monotonic() - started
+        return priority
+
+    @classmethod
+    def release(cls, priority: str, elapsed: float):
+        with cls._cond:
+            cls._in_flight[priority] -= 1
+            if priority == INTERACTIVE:
+                previous = cls._interactive_latency
+                cls._interactive_latency = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+                cls._interactive_at = time.monotonic()
+            cls._dispatch()
+
+    @classmethod
+    @contextlib.contextmanager
+    def slot(cls, priority: Optional[str] = None) -> Iterator[None]:
+        """
+        Holds an upstream slot around a blocking HTTP call.
+        """
+        priority = cls.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            cls.release(priority, time.monotonic() - started)
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def aslot(cls, priority: Optional[str] = None):
+        """
+        Holds an upstream slot around an awaited HTTP call; waiting does not block the event loop.
+        """
+        priority = await asyncio.to_thread(cls.acquire, priority or current_priority())
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            cls.release(priority, time.monotonic() - started)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        with cls._cond:
+            queued = {p: sum(1 for item in cls._queue if item[2].priority == p) for p in PRIORITIES}
+            return {
+                "capacity": SCHEDULER_MAX_CONCURRENCY,
+                "in_flight": dict(cls._in_flight),
+                "queued": queued,
+                "interactive_latency_seconds": cls._interactive_latency,
+                "degraded": cls.degraded(),
+                "classes": {p: dict(c) for p, c in cls._counters.items()}
+            }
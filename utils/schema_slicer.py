@@ -0,0 +1,162 @@
+import os
+import re
+import copy
+import json
+from functools import lru_cache
+from typing import Dict, Any, FrozenSet, Optional, Set, Tuple
+
+from utils.prompts import vds_schema
+
+
+PROMPT_SCHEMA_SLICING = os.getenv("PROMPT_SCHEMA_SLICING", "true").lower() in ("1", "true", "yes")
+
+_REF_PREFIX = "#/components/schemas/"
+
+# Feature names are the VDS filterType values plus the two groups of the Function enum.
+FILTER_FEATURES = ("QUANTITATIVE_DATE", "QUANTITATIVE_NUMERICAL", "SET", "MATCH", "DATE", "TOP")
+DATE_FUNCTIONS = "DATE_FUNCTIONS"
+
+_DATE_FUNCTION_NAMES = (
+    "YEAR", "QUARTER", "MONTH", "WEEK", "DAY",
+    "TRUNC_YEAR", "TRUNC_QUARTER", "TRUNC_MONTH", "TRUNC_WEEK", "TRUNC_DAY"
+)
+
+_INTENT_PATTERNS = {
+    "DATE": r"\b(last|previous|prior|past|current|this|next|recent|ytd|mtd|qtd|today|yesterday|to date)\b",
+    "QUANTITATIVE_DATE": (
+        r"\b(\d{4}-\d{2}(-\d{2})?|(19|20)\d{2}|since|before|after|between|until|"
+        r"jan(uary)?|feb(ruary)?|mar(ch)?|apr(il)?|may|june?|july?|aug(ust)?|sep(tember)?|oct(ober)?|"
+        r"nov(ember)?|dec(ember)?)\b"
+    ),
+    "QUANTITATIVE_NUMERICAL": (
+        r"(\b(greater|more|less|fewer|above|below|over|under|at least|at most|exceed\w*|between|"
+        r"minimum|maximum)\b|[<>]=?)"
+    ),
+    "SET": r"\b(only|for|in|exclud\w*|except|without|where|not)\b",
+    "MATCH": r"\b(contain\w*|starts? with|begins? with|ends? with|like|match\w*|includes?)\b",
+    "TOP": r"\b(top|bottom|best|worst|highest|lowest|most|least|largest|smallest|biggest|leading)\b",
+    DATE_FUNCTIONS: (
+        r"\b(date|dates|time|trend\w*|year\w*|quarter\w*|month\w*|week\w*|day\w*|daily|annual\w*|"
+        r"yoy|mom|qoq|seasonal\w*|over time|period\w*)\b"
+    ),
+}
+_INTENT_RES = {feature: re.compile(pattern, re.IGNORECASE) for feature, pattern in _INTENT_PATTERNS.items()}
+
+
+def _collect_refs(node: Any, refs: Set[str], mapped: Dict[str, str]):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "$ref" and isinstance(value, str):
+                refs.add(value[len(_REF_PREFIX):])
+            elif key == "discriminator" and isinstance(value, dict):
+                for discriminator_value, target in value.get("mapping", {}).items():
+                    mapped[discriminator_value] = target[len(_REF_PREFIX):]
+            else:
+                _collect_refs(value, refs, mapped)
+    elif isinstance(node, list):
+        for item in node:
+            _collect_refs(item, refs, mapped)
+
+
+def build_ref_graph(schema: Dict[str, Any]) -> Tuple[Dict[str, Set[str]], Dict[str, Dict[str, str]]]:
+    """
+    Builds the `$ref` dependency graph of a schema components map.
+
+    Discriminator mappings are kept apart from plain references, since which subtypes are
+    reachable is what the task intent decides.
+
+    Args:
+        schema (Dict[str, Any]): Schema definitions keyed by name (like `vds_schema`).
+
+    Returns:
+        Tuple: ({definition: referenced definitions}, {definition: {discriminator value: subtype}}).
+    """
+    graph: Dict[str, Set[str]] = {}
+    subtypes: Dict[str, Dict[str, str]] = {}
+    for name, definition in schema.items():
+        refs: Set[str] = set()
+        mapped: Dict[str, str] = {}
+        _collect_refs(definition, refs, mapped)
+        graph[name] = refs
+        if mapped:
+            subtypes[name] = mapped
+    return graph, subtypes
+
+
+REF_GRAPH, SUBTYPES = build_ref_graph(vds_schema)
+
+
+def detect_schema_features(task: str, previous_vds_payload: Optional[Any] = None) -> FrozenSet[str]:
+    """
+    Detects which optional parts of the VDS schema a task is likely to need.
+
+    Filter types used by the previous (failed) payload are always included so a retry can
+    still express the same query.
+
+    Args:
+        task (str): The user task.
+        previous_vds_payload (Optional[Any]): The previous VDS query as a dict or JSON text.
+
+    Returns:
+        FrozenSet[str]: Feature names from FILTER_FEATURES and DATE_FUNCTIONS.
+    """
+    features = {feature for feature, pattern in _INTENT_RES.items() if pattern.search(task or "")}
+    if previous_vds_payload:
+        text = previous_vds_payload if isinstance(previous_vds_payload, str) else json.dumps(previous_vds_payload)
+        features.update(re.findall(r'"filterType"\s*:\s*"([A-Z_]+)"', text))
+        if any(name in text for name in _DATE_FUNCTION_NAMES):
+            features.add(DATE_FUNCTIONS)
+    if features & {"DATE", "QUANTITATIVE_DATE"}:
+        features.add(DATE_FUNCTIONS)
+    return frozenset(features)
+
+
+@lru_cache(maxsize=128)
+def slice_vds_schema(features: FrozenSet[str]) -> Dict[str, Any]:
+    """
+    Returns the subset of `vds_schema` reachable from `Query` for a feature set.
+
+    Only the filter subtypes named in `features` are kept (and the filter enum and discriminator
+    are narrowed to match); without any filter feature the `filters` property and its definitions
+    are dropped entirely. Date functions are removed from `Function` unless DATE_FUNCTIONS is set.
+    Results are memoized per feature set and must not be mutated.
+
+    Args:
+        features (FrozenSet[str]): Features as returned by `detect_schema_features`.
+
+    Returns:
+        Dict[str, Any]: The sliced schema, in the original definition order.
+    """
+    filter_types = [t for t in FILTER_FEATURES if t in features]
+
+    reachable: Set[str] = set()
+    pending = ["Query"] + [SUBTYPES["Filter"][t] for t in filter_types if t in SUBTYPES.get("Filter", {})]
+    while pending:
+        name = pending.pop()
+        if name in reachable or name not in vds_schema:
+            continue
+        reachable.add(name)
+        for ref in REF_GRAPH[name]:
+            if name == "Query" and ref == "Filter" and not filter_types:
+                continue
+            pending.append(ref)
+
+    sliced = {}
+    for name, definition in vds_schema.items():
+        if name not in reachable:
+            continue
+        if name == "Query" and not filter_types:
+            definition = copy.deepcopy(definition)
+            definition["properties"].pop("filters", None)
+        elif name == "Filter":
+            definition = copy.deepcopy(definition)
+            definition["properties"]["filterType"]["enum"] = filter_types
+            definition["discriminator"]["mapping"] = {
+                t: target for t, target in definition["discriminator"]["mapping"].items() if t in filter_types
+            }
+        elif name == "Function" and DATE_FUNCTIONS not in features:
+            definition = copy.deepcopy(definition)
+            definition["enum"] = [f for f in definition["enum"] if f not in _DATE_FUNCTION_NAMES]
+        sliced[name] = definition
+    return sliced
+
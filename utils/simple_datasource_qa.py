@@ -2,29 +2,74 @@ import os
 import json
 import re
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-from utils.vizql_data_service import query_vds, query_vds_metadata
-from utils.utils import json_to_markdown_table
+from utils.vizql_data_service import is_query_rejected, query_vds, query_vds_metadata
+from utils.result_store import fetch_result
+from utils.utils import TTLCache
+from utils.render import render, RENDER_MAX_ROWS
 from utils.metadata import get_data_dictionary
+from utils.prompt_cache import PromptCache, PromptCacheEntry, PER_REQUEST_KEYS, metadata_version
+from utils.field_ranker import FieldIndex, referenced_captions, PROMPT_FIELD_TOKEN_BUDGET
+from utils.schema_slicer import PROMPT_SCHEMA_SLICING, detect_schema_features, slice_vds_schema
+from utils.example_index import select_examples
+from utils.field_profile import FIELD_PROFILES_IN_PROMPT, cached_field_profiles, profile_in_background
 
 
-def get_headlessbi_data(payload: Dict[str, Any], url: str, api_key: str, datasource_luid: str) -> str:
-    
+def get_headlessbi_data(
+    payload: Dict[str, Any],
+    url: str,
+    api_key: str,
+    datasource_luid: str,
+    max_rows: Optional[int] = None,
+    output_format: str = "markdown",
+    render_max_rows: Optional[int] = RENDER_MAX_ROWS,
+    partitions: Optional[int] = None
+) -> str:
+    """
+    Runs a VDS query and renders the result for the LLM.
+
+    The full result is kept in the result store; when more rows exist than are rendered, the
+    output starts with the result handle so further pages can be fetched without re-querying.
+
+    Args:
+        payload (Dict[str, Any]): The VDS query.
+        url (str): The base URL for the API endpoints.
+        api_key (str): The API key for authentication.
+        datasource_luid (str): The unique identifier of the datasource.
+        max_rows (Optional[int]): Maximum rows to fetch from VDS.
+        output_format (str): "markdown", "csv", "tsv" or "json".
+        render_max_rows (Optional[int]): Maximum rows to render; the rest is summarized in a footer.
+        partitions (Optional[int]): Run the query as this many parallel partitions.
+
+    Returns:
+        str: The rendered result.
+    """
     try:
-        headlessbi_data = query_vds(
+        stored, _ = fetch_result(
             api_key=api_key,
-            datasource_luid=datasource_luid,
             url=url,
-            query=payload  # Already a parsed dict
+            datasource_luid=datasource_luid,
+            query=payload,  # Already a parsed dict
+            max_rows=max_rows,
+            partitions=partitions
         )
 
-        if not headlessbi_data or 'data' not in headlessbi_data:
+        if not len(stored.result):
             raise ValueError("Invalid or empty response from query_vds")
 
-        markdown_table = json_to_markdown_table(headlessbi_data['data'])
-        return markdown_table
+        table = render(stored.result, output_format=output_format, max_rows=render_max_rows)
+        if render_max_rows and len(stored.result) > render_max_rows:
+            header = (
+                f"Result handle: {stored.handle} ({len(stored.result)} rows, first {render_max_rows} shown; "
+                f"use get_result_page_tool for more)\n\n"
+            )
+            table = header + table
+        if stored.derived_from:
+            table = f"Derived from {stored.derived_from} by local re-aggregation; no new Tableau query was run.\n\n" + table
+        return table
 
     except ValueError as ve:
         logging.error(f"Value error in get_headlessbi_data: {str(ve)}")
@@ -53,53 +98,152 @@ def get_payload(output):
         raise ValueError("No JSON payload found in the parsed output")
 
 
-def get_values(api_key: str, url: str, datasource_luid: str, caption: str):
-    column_values = {'fields': [{'fieldCaption': caption}]}
-    output = query_vds(
-        api_key=api_key,
-        datasource_luid=datasource_luid,
-        url=url,
-        query=column_values
-    )
+# Sample values per (datasource LUID, field caption)
+VALUES_SAMPLE_SIZE = 4
+VALUES_MAX_WORKERS = int(os.getenv("VALUES_MAX_WORKERS", "4"))
+values_cache = TTLCache(
+    max_entries=int(os.getenv("VALUES_CACHE_MAX_ENTRIES", "4096")),
+    ttl_seconds=float(os.getenv("VALUES_CACHE_TTL_SECONDS", "3600"))
+)
+
+# Keys under which a read-metadata field may already carry sample values
+_METADATA_SAMPLE_KEYS = ("sampleValues", "samples", "sample_values")
+
+
+def sample_values_query(caption: str, limit: int = VALUES_SAMPLE_SIZE) -> Dict[str, Any]:
+    """
+    Builds a VDS query returning at most `limit` distinct members of a field.
+
+    The limit is pushed down with a TopN filter on the field itself, measured by COUNT, so the
+    service returns the most frequent members instead of the whole column.
+    """
+    return {
+        'fields': [{'fieldCaption': caption}],
+        'filters': [{
+            'field': {'fieldCaption': caption},
+            'filterType': 'TOP',
+            'howMany': limit,
+            'direction': 'TOP',
+            'fieldToMeasure': {'fieldCaption': caption, 'function': 'COUNT'}
+        }]
+    }
+
+
+def get_values(api_key: str, url: str, datasource_luid: str, caption: str, limit: int = VALUES_SAMPLE_SIZE):
+    cache_key = (datasource_luid, caption, limit)
+    cached = values_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        output = query_vds(
+            api_key=api_key,
+            datasource_luid=datasource_luid,
+            url=url,
+            query=sample_values_query(caption, limit)
+        )
+    except RuntimeError as e:
+        # some fields (e.g. calculations) reject a TopN on themselves; fall back to the plain column,
+        # but never retry a busy or failing upstream with the most expensive query there is
+        if not is_query_rejected(e):
+            raise
+        logging.warning(f"TopN sample query failed for '{caption}', falling back to full column: {str(e)}")
+        output = query_vds(
+            api_key=api_key,
+            datasource_luid=datasource_luid,
+            url=url,
+            query={'fields': [{'fieldCaption': caption}]}
+        )
     if output is None:
         return None
-    sample_values = [list(item.values())[0] for item in output['data']][:4]
+    sample_values = [list(item.values())[0] for item in output['data']][:limit]
+    values_cache.set(cache_key, sample_values)
     return sample_values
 
 
-def augment_datasource_metadata(
-    task: str,
+def get_values_batch(
     api_key: str,
     url: str,
     datasource_luid: str,
-    prompt: Dict[str, Any],
-    previous_errors: Optional[str] = None,
-    previous_vds_payload: Optional[str] = None
-):
+    captions: List[str],
+    limit: int = VALUES_SAMPLE_SIZE,
+    datasource_metadata: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
     """
-    Augment datasource metadata with additional information and format as JSON.
+    Retrieves sample values for many fields of a datasource at once.
 
-    This function retrieves the data dictionary and sample field values for a given
-    datasource, adds them to the provided prompt dictionary, and includes any previous
-    errors or queries for debugging purposes.
+    Values already present in the cache or in the `read-metadata` output are reused; the rest
+    are fetched concurrently, at most VALUES_MAX_WORKERS at a time.
 
     Args:
         api_key (str): The API key for authentication.
         url (str): The base URL for the API endpoints.
         datasource_luid (str): The unique identifier of the datasource.
-        prompt (Dict[str, str]): Initial prompt dictionary to be augmented.
-        previous_errors (Optional[str]): Any errors from previous function calls. Defaults to None.
-        previous_vds_payload (Optional[str]): The query that caused errors in previous calls. Defaults to None.
+        captions (List[str]): Field captions to sample.
+        limit (int): Maximum number of values per field.
+        datasource_metadata (Optional[Dict[str, Any]]): A `query_vds_metadata` response to reuse samples from.
 
     Returns:
-        str: A JSON string containing the augmented prompt dictionary with datasource metadata.
+        Dict[str, Any]: Sample values per caption; a field that failed maps to {"error": message}.
+    """
+    results: Dict[str, Any] = {}
+    metadata_fields = {
+        field.get('fieldCaption'): field for field in (datasource_metadata or {}).get('data', [])
+    }
+    pending = []
+    for caption in dict.fromkeys(captions):
+        cached = values_cache.get((datasource_luid, caption, limit))
+        if cached is not None:
+            results[caption] = cached
+            continue
+        field = metadata_fields.get(caption, {})
+        samples = next((field[key] for key in _METADATA_SAMPLE_KEYS if field.get(key)), None)
+        if samples:
+            results[caption] = list(samples)[:limit]
+            values_cache.set((datasource_luid, caption, limit), results[caption])
+            continue
+        pending.append(caption)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(VALUES_MAX_WORKERS, len(pending))) as executor:
+            futures = {
+                caption: executor.submit(get_values, api_key, url, datasource_luid, caption, limit)
+                for caption in pending
+            }
+            for caption, future in futures.items():
+                try:
+                    results[caption] = future.result()
+                except Exception as e:
+                    results[caption] = {"error": str(e)}
+
+    return {caption: results[caption] for caption in dict.fromkeys(captions)}
+
+
+def get_datasource_prompt_entry(
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    prompt: Dict[str, Any]
+) -> PromptCacheEntry:
+    """
+    Returns the cached datasource-specific prompt body, fetching it upstream on a miss.
 
-    Note:
-        This function relies on external functions `get_data_dictionary` and `query_vds_metadata`
-        to retrieve the necessary datasource information.
+    The body holds every key of `prompt` except the per-request ones, with the data dictionary,
+    datasource meta and VDS data model filled in. It is cached per (LUID, metadata version) so
+    that repeated calls for the same datasource cost no upstream requests.
+
+    Args:
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        datasource_luid (str): The unique identifier of the datasource.
+        prompt (Dict[str, Any]): Prompt template providing the static keys (schema, examples, ...).
+
+    Returns:
+        PromptCacheEntry: The cached prompt body for the datasource.
     """
-    # insert the user input as a task
-    prompt['task'] = task
+    entry = PromptCache.get(datasource_luid)
+    if entry is not None:
+        return entry
 
     # get dictionary for the data source from the Metadata API
     data_dictionary = get_data_dictionary(
@@ -108,6 +252,16 @@ def augment_datasource_metadata(
         datasource_luid=datasource_luid
     )
 
+    #  get sample values for fields from VDS metadata endpoint
+    datasource_metadata = query_vds_metadata(
+        api_key=api_key,
+        url=url,
+        datasource_luid=datasource_luid
+    )
+    version = metadata_version(data_dictionary, datasource_metadata)
+
+    body = {key: value for key, value in prompt.items() if key not in PER_REQUEST_KEYS}
+
     # Step 1: Extract fields
     try:
         published = data_dictionary["data"]["publishedDatasources"]
@@ -116,37 +270,153 @@ def augment_datasource_metadata(
 
         fields = published[0].get("fields", [])
         # insert data dictionary from Tableau's Data Catalog
-        prompt['data_dictionary'] = fields
+        body['data_dictionary'] = fields
 
         # Step 2: Remove 'fields' key from the original dictionary
         published[0].pop("fields", None)
         # insert data source name, description and owner into 'meta' key
-        prompt['meta'] = data_dictionary
+        body['meta'] = data_dictionary
 
     except (KeyError, IndexError, TypeError) as e:
         raise ValueError("Failed to extract and clean up fields from data_dictionary") from e 
 
-    #  get sample values for fields from VDS metadata endpoint
-    datasource_metadata = query_vds_metadata(
-        api_key=api_key,
-        url=url,
-        datasource_luid=datasource_luid
-    )
+    profiles = {}
+    if FIELD_PROFILES_IN_PROMPT:
+        # never block the prompt on profiling: use what is cached and profile the rest in the
+        # background; the cached body is dropped once new profiles arrive so the next call has them
+        profiles = cached_field_profiles(datasource_luid)
+        if any(field.get('fieldCaption') not in profiles for field in datasource_metadata['data']):
+            profile_in_background(api_key, url, datasource_luid, datasource_metadata, on_done=PromptCache.invalidate)
 
     for field in datasource_metadata['data']:
-        del field['fieldName']
-        del field['logicalTableId']
+        field.pop('fieldName', None)
+        field.pop('logicalTableId', None)
+        profile = profiles.get(field.get('fieldCaption'))
+        if profile:
+            # cardinality and ranges help the LLM avoid row-level results
+            field['profile'] = {
+                key: profile[key] for key in ('cardinality', 'min', 'max', 'null_rate') if profile.get(key) is not None
+            }
 
     # insert the data model with sample values from Tableau's VDS metadata API
-    prompt['data_model'] = datasource_metadata['data']
+    body['data_model'] = datasource_metadata['data']
+
+    return PromptCache.put(datasource_luid, version, body)
+
+
+def task_prompt_overrides(
+    entry: PromptCacheEntry,
+    task: str,
+    previous_vds_payload: Optional[str] = None,
+    token_budget: int = PROMPT_FIELD_TOKEN_BUDGET
+):
+    """
+    Computes the task-dependent parts of a cached prompt body.
+
+    Prunes `data_dictionary` and `data_model` to the fields most relevant to the task within the
+    token budget, always keeping fields referenced by the previous VDS payload, narrows
+    `vds_schema` to the definitions the task's intent needs and retrieves the most similar
+    sample and error queries.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, Any]]: Body keys to override and keys to append.
+    """
+    overrides: Dict[str, Any] = {}
+    extra: Dict[str, Any] = {}
+
+    field_index = entry.derived(
+        "field_index",
+        lambda e: FieldIndex(e.body.get('data_dictionary') or [], e.body.get('data_model') or [])
+    )
+    data_dictionary, data_model, report = field_index.prune(
+        task,
+        token_budget=token_budget,
+        keep=referenced_captions(previous_vds_payload)
+    )
+    if report['fields_dropped']:
+        overrides['data_dictionary'] = data_dictionary
+        overrides['data_model'] = data_model
+        extra['field_pruning'] = report
+
+    features = detect_schema_features(task, previous_vds_payload)
+    if PROMPT_SCHEMA_SLICING and 'vds_schema' in entry.body:
+        overrides['vds_schema'] = slice_vds_schema(features)
+
+    examples = select_examples(" ".join([task, *sorted(features)]))
+    for key, selected in examples.items():
+        if key in entry.body and selected != entry.body[key]:
+            overrides[key] = selected
+
+    return overrides, extra
+
+
+def augment_datasource_metadata(
+    task: str,
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    prompt: Dict[str, Any],
+    previous_errors: Optional[str] = None,
+    previous_vds_payload: Optional[str] = None
+):
+    """
+    Augment datasource metadata with additional information and format as JSON.
 
-    # include previous error and query to debug in current run
-    if previous_errors:
-        prompt['previous_call_error'] = previous_errors
-    if previous_vds_payload:
-        prompt['previous_vds_payload'] = previous_vds_payload
+    This function retrieves the data dictionary and sample field values for a given
+    datasource, adds them to the provided prompt dictionary, and includes any previous
+    errors or queries for debugging purposes.
 
-    return prompt
+    The datasource-specific part of the prompt is cached per (LUID, metadata version), so
+    retries for the same datasource only bind the task and debug fields to a cached body.
+
+    Args:
+        task (str): The user input to insert as the task.
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        datasource_luid (str): The unique identifier of the datasource.
+        prompt (Dict[str, str]): Initial prompt dictionary to be augmented.
+        previous_errors (Optional[str]): Any errors from previous function calls. Defaults to None.
+        previous_vds_payload (Optional[str]): The query that caused errors in previous calls. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: A new prompt dictionary augmented with datasource metadata; the
+        per-request keys are added last.
+
+    Note:
+        This function relies on external functions `get_data_dictionary` and `query_vds_metadata`
+        to retrieve the necessary datasource information.
+    """
+    entry = get_datasource_prompt_entry(
+        api_key=api_key,
+        url=url,
+        datasource_luid=datasource_luid,
+        prompt=prompt
+    )
+    overrides, extra = task_prompt_overrides(entry, task, previous_vds_payload)
+    return entry.bind(task, previous_errors, previous_vds_payload, overrides=overrides, extra=extra)
+
+
+def render_datasource_prompt(
+    task: str,
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    prompt: Dict[str, Any],
+    previous_errors: Optional[str] = None,
+    previous_vds_payload: Optional[str] = None
+) -> str:
+    """
+    Same as `augment_datasource_metadata` but returns the prompt as JSON text, appending the
+    per-request keys to the pre-rendered body instead of re-serializing it.
+    """
+    entry = get_datasource_prompt_entry(
+        api_key=api_key,
+        url=url,
+        datasource_luid=datasource_luid,
+        prompt=prompt
+    )
+    overrides, extra = task_prompt_overrides(entry, task, previous_vds_payload)
+    return entry.render(task, previous_errors, previous_vds_payload, overrides=overrides, extra=extra)
 
 
 def prepare_prompt_inputs(data: dict, user_string: str) -> dict:
@@ -0,0 +1,167 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.columnar import ColumnarResult
+from utils.local_ops import group_by
+from utils.vizql_data_service import field_column_names, resolve_column
+
+
+# Aggregations whose values can be rolled up from a finer result, and the function that does it
+REAGGREGATE = {"SUM": "SUM", "MIN": "MIN", "MAX": "MAX", "COUNT": "SUM"}
+AGGREGATIONS = ("SUM", "AVG", "MEDIAN", "COUNT", "COUNTD", "MIN", "MAX", "STDEV", "VAR", "ATTR", "AGG")
+
+
+def _key(field: Dict[str, Any]) -> tuple:
+    return field['fieldCaption'], field.get('function')
+
+
+def _split_fields(query: Dict[str, Any]) -> Optional[Tuple[Dict[tuple, Dict], Dict[tuple, Dict]]]:
+    """
+    Splits query fields into dimensions and measures keyed by (caption, function).
+    Date functions such as YEAR or TRUNC_MONTH count as part of a dimension's key.
+    Returns None for queries that cannot take part in subsumption (calculations, no fields).
+    """
+    fields = query.get('fields') if isinstance(query, dict) else None
+    if not fields:
+        return None
+    dimensions, measures = {}, {}
+    for field in fields:
+        if field.get('calculation') or not field.get('fieldCaption'):
+            return None
+        key = _key(field)
+        if field.get('function') in AGGREGATIONS:
+            measures[key] = field
+        else:
+            dimensions[key] = field
+    return dimensions, measures
+
+
+def _canonical(item: Dict[str, Any]) -> str:
+    return json.dumps(item, sort_keys=True, default=str)
+
+
+def _local_filters(query: Dict[str, Any], cached_query: Dict[str, Any], cached_dimensions: Dict[tuple, Dict]) -> Optional[List[Dict]]:
+    """
+    Returns the filters of `query` that must be applied locally on the cached result, or None if the
+    filters are not compatible. Every cached filter must also be in the query; the extra filters
+    must be SET filters on plain dimensions of the cached result.
+    """
+    wanted = {_canonical(f): f for f in query.get('filters') or []}
+    for cached_filter in cached_query.get('filters') or []:
+        if wanted.pop(_canonical(cached_filter), None) is None:
+            return None
+    extra = []
+    for item in wanted.values():
+        field = item.get('field') or {}
+        if item.get('filterType') != 'SET' or field.get('function') or field.get('calculation'):
+            return None
+        if (field.get('fieldCaption'), None) not in cached_dimensions:
+            return None
+        extra.append(item)
+    return extra
+
+
+def derive_result(query: Dict[str, Any], cached_query: Dict[str, Any], cached: ColumnarResult) -> Optional[ColumnarResult]:
+    """
+    Computes the result of `query` from the result of a finer cached query, if it is contained in it.
+
+    The query is contained when its dimensions are a subset of the cached dimensions, each of its
+    measures is in the cached query with a re-aggregatable function (SUM, MIN, MAX, COUNT; not
+    COUNTD, MEDIAN or AVG), and its filters are the cached filters plus optional SET filters on
+    cached dimensions. Filters on aggregated or calculated fields only carry over when the
+    dimensions are identical. Truncated cached results are never used.
+
+    Args:
+        query (Dict[str, Any]): The incoming VDS query.
+        cached_query (Dict[str, Any]): The query of the cached result.
+        cached (ColumnarResult): The cached result.
+
+    Returns:
+        Optional[ColumnarResult]: The derived result, or None if the query is not contained.
+    """
+    if cached.truncated:
+        return None
+    split, cached_split = _split_fields(query), _split_fields(cached_query)
+    if split is None or cached_split is None:
+        return None
+    (dimensions, measures), (cached_dimensions, cached_measures) = split, cached_split
+    if not set(dimensions) <= set(cached_dimensions):
+        return None
+    if any(key[1] not in REAGGREGATE or key not in cached_measures for key in measures):
+        return None
+    if set(dimensions) != set(cached_dimensions) and any(
+        (f.get('field') or {}).get('function') or (f.get('field') or {}).get('calculation')
+        for f in cached_query.get('filters') or []
+    ):
+        # a filter on an aggregate was applied at the cached level of detail; rolling up the rows
+        # that survived it does not give the totals of the coarser query
+        return None
+    extra_filters = _local_filters(query, cached_query, cached_dimensions)
+    if extra_filters is None:
+        return None
+
+    columns = cached.names
+    source_column = {
+        key: resolve_column(field, columns)
+        for key, field in list(cached_dimensions.items()) + list(cached_measures.items())
+    }
+    if any(name not in columns for name in source_column.values()):
+        return None
+
+    rows = list(range(len(cached)))
+    for item in extra_filters:
+        values = cached.column_values(source_column[(item['field']['fieldCaption'], None)])
+        members = {str(v) for v in item.get('values') or []}
+        exclude = item.get('exclude') in (True, 'true')
+        rows = [i for i in rows if (values[i] is not None and str(values[i]) in members) != exclude]
+    filtered = cached.take(rows) if extra_filters else cached
+
+    def output_name(key: tuple, field: Dict[str, Any]) -> str:
+        column = source_column[key]
+        if field.get('fieldAlias'):
+            return field['fieldAlias']
+        return column if column in field_column_names({**field, 'fieldAlias': None}) else field_column_names(field)[0]
+
+    ordered = [(_key(field), field) for field in query['fields']]
+    derived = group_by(
+        filtered,
+        [source_column[key] for key, _ in ordered if key in dimensions],
+        [
+            {"column": source_column[key], "function": REAGGREGATE[key[1]], "as": output_name(key, field)}
+            for key, field in ordered if key in measures
+        ]
+    )
+    # group_by names dimension columns after the cached columns; rename and restore field order
+    data = {}
+    for key, field in ordered:
+        name = output_name(key, field)
+        data[name] = derived.column_values(source_column[key] if key in dimensions else name)
+    result = ColumnarResult.from_columns(data)
+
+    sort_fields = sorted((f for f in query['fields'] if f.get('sortPriority') is not None), key=lambda f: f['sortPriority'])
+    if sort_fields:
+        result = result.take(result.sort_indices(
+            [output_name(_key(f), f) for f in sort_fields],
+            [f.get('sortDirection', 'ASC') == 'DESC' for f in sort_fields]
+        ))
+    return result
+
+
+def find_subsuming(query: Dict[str, Any], candidates: Sequence[Any]) -> Optional[Tuple[Any, ColumnarResult]]:
+    """
+    Finds the smallest cached result that contains `query` and derives the answer from it.
+
+    Args:
+        query (Dict[str, Any]): The incoming VDS query.
+        candidates (Sequence[StoredResult]): Cached results of the same datasource.
+
+    Returns:
+        Optional[Tuple[StoredResult, ColumnarResult]]: The cached result used and the derived result.
+    """
+    if _split_fields(query) is None:
+        return None
+    for stored in sorted(candidates, key=lambda s: len(s.result)):
+        derived = derive_result(query, stored.query, stored.result)
+        if derived is not None:
+            return stored, derived
+    return None
@@ -0,0 +1,98 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "show", "than", "that", "the", "this", "to", "was", "what",
+    "which", "with", "give", "get", "list", "tell", "all", "per", "each", "do", "does", "we", "our"
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase word tokens with light plural stemming and stopword removal.
+
+    camelCase identifiers are split as well so that schema and field names match task words.
+
+    Args:
+        text (str): Free text, a field caption or a JSON snippet.
+
+    Returns:
+        List[str]: Normalized tokens in order of appearance.
+    """
+    if not text:
+        return []
+    text = _CAMEL_RE.sub(" ", str(text)).lower()
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of a free-text task: normalized tokens joined by single spaces.
+    """
+    return " ".join(tokenize(text))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough LLM token estimate for a piece of prompt text (about four characters per token).
+    """
+    return max(1, (len(text) + 3) // 4)
+
+
+class BM25Index:
+    """
+    Small in-memory BM25 index over pre-tokenized documents.
+
+    Built once (at import or when a datasource is cached) and then queried per task; scoring
+    only touches the postings of the query terms.
+    """
+
+    def __init__(self, documents: Iterable[List[str]], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_id, tokens in enumerate(documents):
+            self.doc_lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((doc_id, freq))
+        self.size = len(self.doc_lengths)
+        self.avg_length = (sum(self.doc_lengths) / self.size) if self.size else 0.0
+        self.idf = {
+            term: math.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def scores(self, query_tokens: Iterable[str]) -> List[float]:
+        scores = [0.0] * self.size
+        for term in set(query_tokens):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for doc_id, freq in docs:
+                norm = 1 - self.b + self.b * (self.doc_lengths[doc_id] / (self.avg_length or 1))
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + self.k1 * norm)
+        return scores
+
+    def top_k(self, query_tokens: Iterable[str], k: int) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (doc_id, score) pairs with a positive score, best first.
+        """
+        scored = [(doc_id, score) for doc_id, score in enumerate(self.scores(query_tokens)) if score > 0]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:k]
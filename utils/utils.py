@@ -1,4 +1,7 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Hashable
+from collections import OrderedDict
+import threading
+import time
 import aiohttp
 import json
 
@@ -44,6 +47,56 @@ async def http_post(endpoint: str, headers: Optional[Dict[str, str]] = None, pay
             }
 
 
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a time-to-live.
+
+    Args:
+        max_entries (int): Maximum number of entries kept; the least recently used is evicted first.
+        ttl_seconds (float): Seconds an entry stays valid after it was set.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 900):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is self._MISSING:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, self._MISSING) is not self._MISSING
+
+
 def json_to_markdown_table(json_data):
     if isinstance(json_data, str):
         json_data = json.loads(json_data)
@@ -1,8 +1,111 @@
-from typing import Dict, Any
+import os
+import re
+import copy
+import json
+import codecs
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional
 import requests
 
+from utils.columnar import ColumnarResult
+from utils.bulkhead import DatasourceBulkhead
+from utils.scheduler import UpstreamBusyError, UpstreamScheduler
 
-def query_vds(api_key: str, datasource_luid: str, url: str, query: Dict[str, Any]) -> Dict[str, Any]:
+
+VDS_STREAM_MAX_ROWS = int(os.getenv("VDS_STREAM_MAX_ROWS", "200000"))
+VDS_STREAM_MAX_BYTES = int(os.getenv("VDS_STREAM_MAX_BYTES", str(64 * 1024 * 1024)))
+VDS_STREAM_CHUNK_BYTES = 64 * 1024
+
+_DATA_ARRAY_RE = re.compile(r'"data"\s*:\s*\[')
+_json_decoder = json.JSONDecoder()
+
+
+class RowStream:
+    """
+    Incrementally decodes the rows of the `data` array of a VDS response body.
+
+    Iterating yields rows as soon as they are complete in the received bytes; only the current
+    undecoded tail is buffered. Reading stops (and the connection is released) once `max_rows`
+    rows or `max_bytes` bytes have been consumed, in which case `truncated` is set.
+
+    Args:
+        chunks (Iterable[bytes]): The response body, e.g. `response.iter_content(...)`.
+        max_rows (Optional[int]): Maximum rows to yield.
+        max_bytes (Optional[int]): Maximum body bytes to read.
+        on_close (Optional[Callable[[], None]]): Called when reading stops early or finishes.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[bytes],
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        on_close: Optional[Callable[[], None]] = None
+    ):
+        self.chunks = chunks
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.on_close = on_close
+        self.truncated = False
+        self.bytes_read = 0
+        self.rows = 0
+
+    def __iter__(self) -> Iterator[Any]:
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        position = 0
+        in_array = False
+        finished = False
+        try:
+            for chunk in self.chunks:
+                if not chunk:
+                    continue
+                self.bytes_read += len(chunk)
+                buffer = buffer[position:] + decoder.decode(chunk)
+                position = 0
+
+                if not in_array:
+                    match = _DATA_ARRAY_RE.search(buffer)
+                    if match is None:
+                        if self.max_bytes and self.bytes_read > self.max_bytes:
+                            self.truncated = True
+                            return
+                        continue
+                    in_array = True
+                    position = match.end()
+
+                while True:
+                    while position < len(buffer) and buffer[position] in " \t\r\n,":
+                        position += 1
+                    if position >= len(buffer):
+                        break
+                    if buffer[position] == "]":
+                        finished = True
+                        return
+                    try:
+                        row, end = _json_decoder.raw_decode(buffer, position)
+                    except json.JSONDecodeError:
+                        break  # row incomplete, wait for more bytes
+                    position = end
+                    if self.max_rows is not None and self.rows >= self.max_rows:
+                        self.truncated = True
+                        return
+                    self.rows += 1
+                    yield row
+
+                if self.max_bytes and self.bytes_read > self.max_bytes:
+                    self.truncated = True
+                    return
+            if in_array and not finished:
+                raise RuntimeError("VizQL Data Service response ended before the data array was complete.")
+        finally:
+            if self.on_close:
+                self.on_close()
+
+
+def _post_query(api_key: str, datasource_luid: str, url: str, query: Dict[str, Any], options: Optional[Dict[str, Any]] = None):
     full_url = f"{url}/api/v1/vizql-data-service/query-datasource"
 
     payload = {
@@ -11,22 +114,155 @@ def query_vds(api_key: str, datasource_luid: str, url: str, query: Dict[str, Any
         },
         "query": query
     }
+    if options:
+        payload["options"] = options
 
     headers = {
         'X-Tableau-Auth': api_key,
         'Content-Type': 'application/json'
     }
 
-    response = requests.post(full_url, headers=headers, json=payload)
+    with DatasourceBulkhead.slot(datasource_luid) as call, UpstreamScheduler.slot():
+        call.begin()
+        response = requests.post(full_url, headers=headers, json=payload, stream=True)
+        call.ok = response.status_code < 500
 
-    if response.status_code == 200:
-        return response.json()
-    else:
+    if response.status_code != 200:
         error_message = (
             f"Failed to query data source via Tableau VizQL Data Service. "
             f"Status code: {response.status_code}. Response: {response.text}"
         )
+        response.close()
         raise RuntimeError(error_message)
+    return response
+
+
+def is_query_rejected(error: Exception) -> bool:
+    """
+    True when VDS rejected the query itself (HTTP 400), as opposed to the upstream being busy,
+    failing or unreachable; only a rejection is worth retrying with a different query.
+    """
+    return (
+        isinstance(error, RuntimeError)
+        and not isinstance(error, UpstreamBusyError)
+        and "Status code: 400" in str(error)
+    )
+
+
+def stream_vds(
+    api_key: str,
+    datasource_luid: str,
+    url: str,
+    query: Dict[str, Any],
+    max_rows: Optional[int] = VDS_STREAM_MAX_ROWS,
+    max_bytes: Optional[int] = VDS_STREAM_MAX_BYTES
+) -> RowStream:
+    """
+    Sends a VDS query and returns a RowStream over its result rows.
+
+    The upstream read is lazy: rows are decoded while iterating and the connection is closed as
+    soon as a cap is hit, so peak memory is bounded by the caps rather than the result size.
+    """
+    response = _post_query(api_key, datasource_luid, url, query)
+    return RowStream(
+        response.iter_content(chunk_size=VDS_STREAM_CHUNK_BYTES),
+        max_rows=max_rows,
+        max_bytes=max_bytes,
+        on_close=response.close
+    )
+
+
+def query_vds(
+    api_key: str,
+    datasource_luid: str,
+    url: str,
+    query: Dict[str, Any],
+    max_rows: Optional[int] = VDS_STREAM_MAX_ROWS,
+    max_bytes: Optional[int] = VDS_STREAM_MAX_BYTES
+) -> Dict[str, Any]:
+    """
+    Runs a VDS query, decoding the response as a stream bounded by row and byte caps.
+
+    Returns:
+        Dict[str, Any]: {"data": [rows]}; "truncated" is set to True when a cap cut the result short.
+    """
+    rows = stream_vds(api_key, datasource_luid, url, query, max_rows=max_rows, max_bytes=max_bytes)
+    result = {'data': list(rows)}
+    if rows.truncated:
+        result['truncated'] = True
+    return result
+
+
+VDS_RETURN_FORMAT = os.getenv("VDS_RETURN_FORMAT", "AUTO").upper()  # AUTO | ARRAYS | OBJECTS
+
+# Tableau domains that rejected the ARRAYS return format; they get OBJECTS from then on
+_arrays_unsupported = set()
+
+
+def choose_return_format(url: str, query: Dict[str, Any], preferred: str = VDS_RETURN_FORMAT) -> str:
+    """
+    Picks the VDS return format for one query.
+
+    ARRAYS drops the per-row field names, which pays off as soon as a query has more than one
+    field; it needs distinct column names to map values back to the query fields.
+    """
+    if preferred == "OBJECTS" or url in _arrays_unsupported:
+        return "OBJECTS"
+    fields = query.get('fields') or []
+    names = [field_column_names(field)[0] for field in fields]
+    if len(set(names)) != len(names):
+        return "OBJECTS"
+    if preferred == "ARRAYS":
+        return "ARRAYS"
+    return "ARRAYS" if len(fields) > 1 else "OBJECTS"
+
+
+def query_vds_columnar(
+    api_key: str,
+    datasource_luid: str,
+    url: str,
+    query: Dict[str, Any],
+    max_rows: Optional[int] = VDS_STREAM_MAX_ROWS,
+    max_bytes: Optional[int] = VDS_STREAM_MAX_BYTES,
+    return_format: Optional[str] = None
+) -> ColumnarResult:
+    """
+    Runs a VDS query and builds a ColumnarResult directly from the response stream, without
+    materializing the per-row dicts.
+
+    With the ARRAYS return format each row is a list in query field order and columns are named
+    after the fields (alias, "FUNCTION(Caption)" or caption). If the service rejects the option,
+    the query is retried with OBJECTS and that domain is not asked for ARRAYS again.
+
+    Args:
+        return_format (Optional[str]): "ARRAYS" or "OBJECTS"; chosen per query when omitted.
+
+    Returns:
+        ColumnarResult: The result; its `truncated` attribute tells whether a cap cut it short.
+    """
+    return_format = return_format or choose_return_format(url, query)
+    names = None
+    options = None
+    if return_format == "ARRAYS":
+        names = [field_column_names(field)[0] for field in query.get('fields') or []]
+        options = {"returnFormat": "ARRAYS"}
+    try:
+        response = _post_query(api_key, datasource_luid, url, query, options=options)
+    except RuntimeError as e:
+        if options is None or not is_query_rejected(e) or "returnFormat" not in str(e):
+            raise
+        _arrays_unsupported.add(url)
+        return query_vds_columnar(api_key, datasource_luid, url, query, max_rows, max_bytes, return_format="OBJECTS")
+
+    rows = RowStream(
+        response.iter_content(chunk_size=VDS_STREAM_CHUNK_BYTES),
+        max_rows=max_rows,
+        max_bytes=max_bytes,
+        on_close=response.close
+    )
+    result = ColumnarResult.from_rows(rows, names=names)
+    result.truncated = rows.truncated
+    return result
 
 
 def query_vds_metadata(api_key: str, datasource_luid: str, url: str) -> Dict[str, Any]:
@@ -43,7 +279,10 @@ def query_vds_metadata(api_key: str, datasource_luid: str, url: str) -> Dict[str
         'Content-Type': 'application/json'
     }
 
-    response = requests.post(full_url, headers=headers, json=payload)
+    with DatasourceBulkhead.slot(datasource_luid) as call, UpstreamScheduler.slot():
+        call.begin()
+        response = requests.post(full_url, headers=headers, json=payload)
+        call.ok = response.status_code < 500
 
     if response.status_code == 200:
         return response.json()
@@ -53,3 +292,206 @@ def query_vds_metadata(api_key: str, datasource_luid: str, url: str) -> Dict[str
             f"Status code: {response.status_code}. Response: {response.text}"
         )
         raise RuntimeError(error_message)
+
+
+VDS_PARTITION_MAX_WORKERS = int(os.getenv("VDS_PARTITION_MAX_WORKERS", "4"))
+
+_TRUNC_MONTHS = {"TRUNC_YEAR": 12, "TRUNC_QUARTER": 3, "TRUNC_MONTH": 1, "TRUNC_DAY": 1}
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _date_partitions(query: Dict[str, Any], partitions: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Splits a QUANTITATIVE_DATE RANGE filter into consecutive date ranges.
+
+    Only done when the filtered date is also a query field, untruncated or truncated to day,
+    month, quarter or year, and the ranges are aligned to that period so every output row comes
+    from exactly one partition.
+    """
+    filters = query.get('filters') or []
+    for position, query_filter in enumerate(filters):
+        if query_filter.get('filterType') != 'QUANTITATIVE_DATE' or query_filter.get('quantitativeFilterType') != 'RANGE':
+            continue
+        caption = (query_filter.get('field') or {}).get('fieldCaption')
+        grouping = [f for f in query.get('fields', []) if f.get('fieldCaption') == caption and not f.get('calculation')]
+        if not grouping or any(f.get('function') not in (None, *_TRUNC_MONTHS) for f in grouping):
+            continue
+        try:
+            start = date.fromisoformat(query_filter['minDate'][:10])
+            end = date.fromisoformat(query_filter['maxDate'][:10])
+        except (KeyError, ValueError):
+            continue
+
+        step = max(_TRUNC_MONTHS.get(f.get('function'), 1) for f in grouping)
+        boundaries = [start]
+        cursor = _add_months(date(start.year, ((start.month - 1) // step) * step + 1, 1), step)
+        while cursor <= end:
+            boundaries.append(cursor)
+            cursor = _add_months(cursor, step)
+        if len(boundaries) < 2:
+            return None
+
+        # merge period boundaries into the requested number of partitions
+        chunk = -(-len(boundaries) // partitions)
+        starts = boundaries[::chunk]
+        result = []
+        for i, part_start in enumerate(starts):
+            part_end = (starts[i + 1] - timedelta(days=1)) if i + 1 < len(starts) else end
+            part = copy.deepcopy(query)
+            part['filters'][position]['minDate'] = part_start.isoformat()
+            part['filters'][position]['maxDate'] = part_end.isoformat()
+            result.append(part)
+        return result
+    return None
+
+
+def _set_partitions(query: Dict[str, Any], partitions: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Splits the values of an including SET filter on a grouped dimension into chunks.
+    """
+    captions = {f.get('fieldCaption') for f in query.get('fields', []) if not f.get('function') and not f.get('calculation')}
+    filters = query.get('filters') or []
+    for position, query_filter in enumerate(filters):
+        values = query_filter.get('values') or []
+        caption = (query_filter.get('field') or {}).get('fieldCaption')
+        if (query_filter.get('filterType') != 'SET' or query_filter.get('exclude') in (True, 'true')
+                or caption not in captions or len(values) < 2):
+            continue
+        chunk = -(-len(values) // partitions)
+        result = []
+        for i in range(0, len(values), chunk):
+            part = copy.deepcopy(query)
+            part['filters'][position]['values'] = values[i:i + chunk]
+            result.append(part)
+        return result
+    return None
+
+
+def partition_query(query: Dict[str, Any], partitions: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Splits a VDS query into disjoint partitions whose results can simply be concatenated.
+
+    Date ranges of a QuantitativeDateFilter are preferred, then the members of a SetFilter. Queries
+    with a TopN filter are never split, since a per-partition top N is not the global top N.
+
+    Args:
+        query (Dict[str, Any]): The VDS query.
+        partitions (int): Desired number of partitions.
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: The partition queries, or None if the query cannot be split.
+    """
+    if partitions < 2 or any(f.get('filterType') == 'TOP' for f in query.get('filters') or []):
+        return None
+    return _date_partitions(query, partitions) or _set_partitions(query, partitions)
+
+
+def field_column_names(field: Dict[str, Any]) -> List[str]:
+    """
+    Candidate names of the result column produced by a query field, most specific first.
+
+    VDS names a column after its alias if one is given; aggregated columns may otherwise be
+    named either "FUNCTION(Caption)" or just the caption.
+    """
+    names = []
+    if field.get('fieldAlias'):
+        names.append(field['fieldAlias'])
+    if field.get('function'):
+        names.append(f"{field['function']}({field['fieldCaption']})")
+    names.append(field['fieldCaption'])
+    return names
+
+
+def resolve_column(field: Dict[str, Any], columns) -> str:
+    """
+    Returns the name of the result column for a query field given the columns actually returned.
+    """
+    names = field_column_names(field)
+    return next((name for name in names if name in columns), names[-1])
+
+
+def _concat(results: List[ColumnarResult]) -> ColumnarResult:
+    results = [result for result in results if len(result)]
+    if len(results) == 1:
+        return results[0]
+    if not results:
+        return ColumnarResult.from_rows([])
+    names = results[0].names
+    return ColumnarResult.from_columns({
+        name: [value for result in results for value in result.column_values(name)] for name in names
+    })
+
+
+def query_vds_partitioned(
+    api_key: str,
+    datasource_luid: str,
+    url: str,
+    query: Dict[str, Any],
+    partitions: int = VDS_PARTITION_MAX_WORKERS,
+    max_workers: int = VDS_PARTITION_MAX_WORKERS,
+    max_rows: int = VDS_STREAM_MAX_ROWS
+) -> ColumnarResult:
+    """
+    Runs a large query as disjoint partitions in parallel and merges the results.
+
+    Partitions are read with `query_vds_columnar` and share one row budget of `max_rows`. For
+    unsorted queries any rows will do: each partition is capped at the budget left when it
+    starts, and partitions not yet started are skipped once the budget is used up. Sorted
+    queries need every partition's leading rows, so each is capped at `max_rows` and the merged
+    result is re-sorted by the query's sortPriority fields and cut to the budget. Queries that
+    cannot be partitioned run as a single request.
+
+    Args:
+        api_key (str): The API key for authentication.
+        datasource_luid (str): The LUID of the datasource.
+        url (str): The Tableau domain.
+        query (Dict[str, Any]): The VDS query.
+        partitions (int): Desired number of partitions.
+        max_workers (int): Maximum number of concurrent partition requests.
+        max_rows (int): Row budget for the whole result.
+
+    Returns:
+        ColumnarResult: The merged result; `truncated` is set when the budget cut it short.
+    """
+    parts = partition_query(query, partitions)
+    if not parts:
+        return query_vds_columnar(api_key=api_key, datasource_luid=datasource_luid, url=url, query=query, max_rows=max_rows)
+
+    sort_fields = sorted(
+        (f for f in query.get('fields', []) if f.get('sortPriority') is not None),
+        key=lambda f: f['sortPriority']
+    )
+    lock = threading.Lock()
+    collected = [0]
+    skipped = [False]
+
+    def run(part: Dict[str, Any]) -> ColumnarResult:
+        with lock:
+            budget = max_rows if sort_fields else max_rows - collected[0]
+            if budget <= 0:
+                skipped[0] = True
+                return ColumnarResult.from_rows([])
+        result = query_vds_columnar(api_key=api_key, datasource_luid=datasource_luid, url=url, query=part, max_rows=budget)
+        with lock:
+            collected[0] += len(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(parts))) as executor:
+        results = list(executor.map(run, parts))
+
+    merged = _concat(results)
+    truncated = skipped[0] or any(result.truncated for result in results)
+    if sort_fields and len(merged):
+        merged = merged.take(merged.sort_indices(
+            [resolve_column(f, merged.names) for f in sort_fields],
+            [f.get('sortDirection', 'ASC') == 'DESC' for f in sort_fields]
+        ))
+    if len(merged) > max_rows:
+        merged = merged[:max_rows]
+        truncated = True
+    merged.truncated = truncated
+    return merged